@@ -0,0 +1,99 @@
+# Copyright (c) 2015-2019 Mitch Garnaat
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Create many short-lived clients in a session with a Pill attached and
+report how memory, and the time to switch modes, change as they are
+created.  Both should stay flat because a Pill only keeps track of
+clients that are still alive.
+
+    $ python -m benchmarks.bench_clients --clients 100000
+"""
+
+import argparse
+import gc
+import resource
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+import boto3
+
+from placebo.pill import Pill
+
+from benchmarks.common import write_report
+
+
+def run(clients, samples, trace_memory=False):
+    data_path = tempfile.mkdtemp()
+    try:
+        session = boto3.Session(aws_access_key_id='AKIAEXAMPLE',
+                                aws_secret_access_key='secret',
+                                region_name='us-east-1')
+        pill = Pill()
+        pill.attach(session, data_path)
+        # Warm up botocore's own caches before measuring.
+        session.client('ec2')
+        gc.collect()
+        if trace_memory:
+            tracemalloc.start()
+            baseline = tracemalloc.get_traced_memory()[0]
+        every = max(clients // samples, 1)
+        results = []
+        start = time.perf_counter()
+        for i in range(1, clients + 1):
+            session.client('ec2')
+            if i % every == 0 or i == clients:
+                gc.collect()
+                switch_start = time.perf_counter()
+                pill.record()
+                pill.playback()
+                pill.stop()
+                switch_time = time.perf_counter() - switch_start
+                result = {
+                    'benchmark': 'clients', 'clients': i,
+                    'live_clients': len(pill.clients),
+                    'max_rss': resource.getrusage(
+                        resource.RUSAGE_SELF).ru_maxrss,
+                    'mode_switch_seconds': switch_time,
+                    'elapsed_seconds': time.perf_counter() - start}
+                if trace_memory:
+                    result['traced_bytes'] = (
+                        tracemalloc.get_traced_memory()[0] - baseline)
+                results.append(result)
+        if trace_memory:
+            tracemalloc.stop()
+    finally:
+        shutil.rmtree(data_path)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--clients', type=int, default=100000,
+                        help='number of clients to create')
+    parser.add_argument('--samples', type=int, default=10,
+                        help='number of times to measure memory')
+    parser.add_argument('--trace-memory', action='store_true',
+                        help='also measure allocations with tracemalloc, '
+                             'which is much slower')
+    parser.add_argument('--output', help='write the report to this file')
+    args = parser.parse_args()
+    write_report(run(args.clients, args.samples, args.trace_memory),
+                 args.output)
+
+
+if __name__ == '__main__':
+    main()
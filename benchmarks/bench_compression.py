@@ -0,0 +1,93 @@
+# Copyright (c) 2015-2019 Mitch Garnaat
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Compare disk size, record time and playback time of the compressed
+formats against plain JSON.
+
+    $ python -m benchmarks.bench_compression --responses 200
+"""
+
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+
+from placebo.pill import Pill
+from placebo.serializer import Format
+
+from benchmarks.common import Session, describe_instances
+
+FORMATS = [Format.JSON, Format.JSON_GZ, Format.JSON_XZ, Format.JSON_BZ2,
+           Format.PICKLE, Format.PICKLE_GZ]
+
+
+def run(record_format, responses, response, compression_level):
+    data_path = tempfile.mkdtemp()
+    try:
+        pill = Pill(record_format=record_format,
+                    compression_level=compression_level)
+        pill.attach(Session(), data_path)
+        start = time.perf_counter()
+        for _ in range(responses):
+            pill.save_response('ec2', 'DescribeInstances', response)
+        record_time = time.perf_counter() - start
+        size = sum(os.path.getsize(os.path.join(data_path, name))
+                   for name in os.listdir(data_path))
+        pill.playback()
+        start = time.perf_counter()
+        for _ in range(responses):
+            pill.load_response('ec2', 'DescribeInstances')
+        playback_time = time.perf_counter() - start
+        pill.stop()
+    finally:
+        shutil.rmtree(data_path)
+    return {'format': record_format, 'bytes': size,
+            'record_seconds': record_time,
+            'playback_seconds': playback_time}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--responses', type=int, default=100,
+                        help='number of responses to record')
+    parser.add_argument('--instances', type=int, default=200,
+                        help='instances in each response')
+    parser.add_argument('--compression-level', type=int, default=None)
+    parser.add_argument('--json', action='store_true',
+                        help='print results as JSON')
+    args = parser.parse_args()
+    response = describe_instances(args.instances)
+    results = [run(f, args.responses, response, args.compression_level)
+               for f in FORMATS]
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    baseline = results[0]
+    print('{0:<12} {1:>12} {2:>8} {3:>10} {4:>8} {5:>10} {6:>8}'.format(
+        'format', 'bytes', 'ratio', 'record s', 'ratio', 'playback s',
+        'ratio'))
+    for r in results:
+        print('{0:<12} {1:>12} {2:>8.3f} {3:>10.3f} {4:>8.2f} {5:>10.3f} '
+              '{6:>8.2f}'.format(
+                  r['format'], r['bytes'], r['bytes'] / baseline['bytes'],
+                  r['record_seconds'],
+                  r['record_seconds'] / baseline['record_seconds'],
+                  r['playback_seconds'],
+                  r['playback_seconds'] / baseline['playback_seconds']))
+
+
+if __name__ == '__main__':
+    main()
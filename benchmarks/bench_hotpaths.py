@@ -0,0 +1,245 @@
+# Copyright (c) 2015-2019 Mitch Garnaat
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Measure placebo's own overhead on the record and playback hot paths.
+
+Nothing goes over the network: responses are recorded with
+save_response and played back through real boto3 clients.  Results are
+written as JSON so runs can be compared across versions.
+
+    $ python -m benchmarks.bench_hotpaths --output before.json
+    $ python -m benchmarks.bench_hotpaths --compare before.json
+"""
+
+import argparse
+import json
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+import boto3
+from botocore.stub import Stubber
+
+from placebo.pill import Pill
+
+from benchmarks.common import (Session, describe_instances, summarize,
+                               timed, write_report)
+
+REGIONS = {'Regions': [{'RegionName': 'us-east-1',
+                        'Endpoint': 'ec2.us-east-1.amazonaws.com'},
+                       {'RegionName': 'us-west-2',
+                        'Endpoint': 'ec2.us-west-2.amazonaws.com'}]}
+
+
+def _session():
+    return boto3.Session(aws_access_key_id='AKIAEXAMPLE',
+                         aws_secret_access_key='secret',
+                         region_name='us-east-1')
+
+
+def bench_directory_growth(sizes, calls):
+    """
+    save_response, get_new_file_path and get_next_file_path with
+    ``size`` responses already in the data directory.
+    """
+    response = describe_instances(1)
+    results = []
+    for size in sizes:
+        data_path = tempfile.mkdtemp()
+        try:
+            pill = Pill()
+            pill.attach(Session(), data_path)
+            for _ in range(size):
+                pill.save_response('ec2', 'DescribeInstances', response)
+            params = {'directory_size': size}
+            results.append(dict(params, benchmark='get_new_file_path',
+                                **summarize(timed(
+                                    lambda: pill.get_new_file_path(
+                                        'ec2', 'DescribeInstances'),
+                                    calls))))
+            results.append(dict(params, benchmark='save_response',
+                                **summarize(timed(
+                                    lambda: pill.save_response(
+                                        'ec2', 'DescribeInstances',
+                                        response),
+                                    calls))))
+            pill.playback()
+            results.append(dict(params, benchmark='get_next_file_path',
+                                **summarize(timed(
+                                    lambda: pill.get_next_file_path(
+                                        'ec2', 'DescribeInstances'),
+                                    calls))))
+            pill.stop()
+        finally:
+            shutil.rmtree(data_path)
+    return results
+
+
+def bench_load_response(formats, responses, instances):
+    """
+    load_response latency for each format.
+    """
+    response = describe_instances(instances)
+    results = []
+    for record_format in formats:
+        data_path = tempfile.mkdtemp()
+        try:
+            pill = Pill(record_format=record_format)
+            pill.attach(Session(), data_path)
+            for _ in range(responses):
+                pill.save_response('ec2', 'DescribeInstances', response)
+            pill.playback()
+            results.append(dict(
+                benchmark='load_response', format=record_format,
+                instances=instances,
+                **summarize(timed(lambda: pill.load_response(
+                    'ec2', 'DescribeInstances'), responses))))
+            pill.stop()
+        finally:
+            shutil.rmtree(data_path)
+    return results
+
+
+def bench_mock_request(calls):
+    """
+    A DescribeRegions call played back by placebo compared with the same
+    call answered by a botocore Stubber.
+    """
+    results = []
+    data_path = tempfile.mkdtemp()
+    try:
+        session = _session()
+        pill = Pill()
+        pill.attach(session, data_path)
+        pill.save_response('ec2', 'DescribeRegions', REGIONS)
+        pill.playback()
+        client = session.client('ec2')
+        results.append(dict(benchmark='mock_request', **summarize(
+            timed(client.describe_regions, calls))))
+        pill.stop()
+    finally:
+        shutil.rmtree(data_path)
+    client = _session().client('ec2')
+    with Stubber(client) as stubber:
+        for _ in range(calls):
+            stubber.add_response('describe_regions', REGIONS)
+        results.append(dict(benchmark='stubber', **summarize(
+            timed(client.describe_regions, calls))))
+    return results
+
+
+def bench_threads(clients, threads, calls):
+    """
+    Playback throughput with ``threads`` threads sharing ``clients``
+    clients, each thread making ``calls`` calls.
+    """
+    results = []
+    for client_count in clients:
+        for thread_count in threads:
+            data_path = tempfile.mkdtemp()
+            try:
+                session = _session()
+                pill = Pill()
+                pill.attach(session, data_path)
+                pill.save_response('ec2', 'DescribeRegions', REGIONS)
+                pill.playback()
+                start = time.perf_counter()
+                pool = [session.client('ec2') for _ in range(client_count)]
+                create_time = time.perf_counter() - start
+
+                def worker(i):
+                    client = pool[i % client_count]
+                    for _ in range(calls):
+                        client.describe_regions()
+
+                workers = [threading.Thread(target=worker, args=(i,))
+                           for i in range(thread_count)]
+                start = time.perf_counter()
+                for t in workers:
+                    t.start()
+                for t in workers:
+                    t.join()
+                elapsed = time.perf_counter() - start
+                pill.stop()
+            finally:
+                shutil.rmtree(data_path)
+            total = thread_count * calls
+            results.append({
+                'benchmark': 'threads', 'clients': client_count,
+                'threads': thread_count, 'calls': total,
+                'client_create_seconds': create_time,
+                'total_seconds': elapsed,
+                'per_second': total / elapsed})
+    return results
+
+
+def _key(result):
+    return tuple(sorted((k, v) for k, v in result.items()
+                        if not isinstance(v, float) and k != 'calls'))
+
+
+def compare(results, baseline_path):
+    """
+    Print how each result's mean (or total) time compares with the
+    matching result in a previous report.
+    """
+    with open(baseline_path) as fp:
+        baseline = dict((_key(r), r) for r in json.load(fp)['results'])
+    for result in results:
+        old = baseline.get(_key(result))
+        if old is None:
+            continue
+        metric = ('mean_seconds' if 'mean_seconds' in result
+                  else 'total_seconds')
+        sys.stderr.write('{0:<56} {1:>6.2f}x\n'.format(
+            ' '.join('{0}={1}'.format(k, v) for k, v in _key(result)),
+            result[metric] / old[metric]))
+
+
+def _ints(value):
+    return [int(v) for v in value.split(',')]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=_ints, default=[0, 1000, 5000],
+                        help='directory sizes for the growth benchmark')
+    parser.add_argument('--calls', type=int, default=500,
+                        help='calls to time in each benchmark')
+    parser.add_argument('--formats', default='json,pickle',
+                        help='formats for the load_response benchmark')
+    parser.add_argument('--instances', type=int, default=20,
+                        help='instances in each load_response response')
+    parser.add_argument('--clients', type=_ints, default=[1, 8])
+    parser.add_argument('--threads', type=_ints, default=[1, 4, 8])
+    parser.add_argument('--output', help='write the report to this file')
+    parser.add_argument('--compare', metavar='REPORT',
+                        help='print ratios against a previous report')
+    args = parser.parse_args()
+    results = []
+    results.extend(bench_directory_growth(args.sizes, args.calls))
+    results.extend(bench_load_response(
+        args.formats.split(','), args.calls, args.instances))
+    results.extend(bench_mock_request(args.calls))
+    results.extend(bench_threads(args.clients, args.threads, args.calls))
+    write_report(results, args.output)
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
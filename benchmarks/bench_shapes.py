@@ -0,0 +1,79 @@
+# Copyright (c) 2015-2019 Mitch Garnaat
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Compare loading large DescribeInstances responses saved as plain JSON,
+which converts objects with a hook on every JSON object, with the
+json-shape format, which converts only the members the output shape
+says are timestamps or blobs.
+
+    $ python -m benchmarks.bench_shapes --instances 10000
+"""
+
+import argparse
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+from placebo.pill import Pill
+from placebo.serializer import Format
+
+from benchmarks.common import (Session, describe_instances, summarize,
+                               timed, write_report)
+
+FORMATS = [Format.JSON, Format.JSON_SHAPE]
+
+
+def run(record_format, response, repeat):
+    data_path = tempfile.mkdtemp()
+    try:
+        pill = Pill(record_format=record_format)
+        pill.attach(Session(), data_path)
+        start = time.perf_counter()
+        pill.save_response('ec2', 'DescribeInstances', response)
+        record_time = time.perf_counter() - start
+        pill.playback()
+        # Load once so the shape is resolved before timing.
+        pill.load_response('ec2', 'DescribeInstances')
+        result = summarize(timed(
+            lambda: pill.load_response('ec2', 'DescribeInstances'), repeat))
+        tracemalloc.start()
+        pill.load_response('ec2', 'DescribeInstances')
+        result['peak_bytes'] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        pill.stop()
+    finally:
+        shutil.rmtree(data_path)
+    result.update({'benchmark': 'load_response', 'format': record_format,
+                   'record_seconds': record_time})
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--instances', type=int, default=10000,
+                        help='instances in the response')
+    parser.add_argument('--repeat', type=int, default=10,
+                        help='times to load the response')
+    parser.add_argument('--output', help='write the report to this file')
+    args = parser.parse_args()
+    response = describe_instances(args.instances)
+    results = [dict(run(f, response, args.repeat), instances=args.instances)
+               for f in FORMATS]
+    write_report(results, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+# Copyright (c) 2015-2019 Mitch Garnaat
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Helpers shared by the benchmarks.
+"""
+
+import datetime
+import json
+import math
+import platform
+import statistics
+import time
+
+from placebo.serializer import utc
+
+
+def describe_instances(instances):
+    """
+    A DescribeInstances response with ``instances`` similar instances.
+    """
+    launched = datetime.datetime(2019, 5, 1, 12, 0, 0, tzinfo=utc)
+    return {
+        'Reservations': [{
+            'ReservationId': 'r-{0:017x}'.format(i),
+            'OwnerId': '123456789012',
+            'Instances': [{
+                'InstanceId': 'i-{0:017x}'.format(i),
+                'ImageId': 'ami-0123456789abcdef0',
+                'InstanceType': 'm5.large',
+                'LaunchTime': launched,
+                'PrivateIpAddress': '10.0.{0}.{1}'.format(i // 256, i % 256),
+                'State': {'Code': 16, 'Name': 'running'},
+                'SubnetId': 'subnet-0123456789abcdef0',
+                'VpcId': 'vpc-0123456789abcdef0',
+                'SecurityGroups': [{'GroupId': 'sg-0123456789abcdef0',
+                                    'GroupName': 'default'}],
+                'Tags': [{'Key': 'Name', 'Value': 'web-{0}'.format(i)},
+                         {'Key': 'Environment', 'Value': 'production'}],
+            }],
+        } for i in range(instances)]
+    }
+
+
+class Events(object):
+
+    def register(self, *args, **kwargs):
+        pass
+
+    def unregister(self, *args, **kwargs):
+        pass
+
+
+class Session(object):
+    """
+    Stands in for a boto3 session when a benchmark only calls the pill
+    directly.
+    """
+    events = Events()
+
+
+def timed(fn, repeat):
+    """
+    Call ``fn`` ``repeat`` times and return the duration of each call.
+    """
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def summarize(durations):
+    """
+    Summary statistics, in seconds, for a list of durations.
+    """
+    ordered = sorted(durations)
+    return {
+        'calls': len(ordered),
+        'total_seconds': sum(ordered),
+        'mean_seconds': statistics.mean(ordered),
+        'median_seconds': statistics.median(ordered),
+        # Nearest rank
+        'p95_seconds': ordered[max(0, math.ceil(0.95 * len(ordered)) - 1)],
+        'per_second': len(ordered) / sum(ordered) if sum(ordered) else 0,
+    }
+
+
+def placebo_version():
+    try:
+        from importlib.metadata import version, PackageNotFoundError
+    except ImportError:
+        return None
+    try:
+        return version('placebo')
+    except PackageNotFoundError:
+        return None
+
+
+def report(results):
+    """
+    A machine-readable report of benchmark results, with enough about
+    the environment to compare runs across placebo versions.
+    """
+    return {
+        'placebo_version': placebo_version(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'timestamp': datetime.datetime.now(utc).isoformat(),
+        'results': results,
+    }
+
+
+def write_report(results, path=None):
+    text = json.dumps(report(results), indent=2, sort_keys=True)
+    if path is None:
+        print(text)
+    else:
+        with open(path, 'w') as fp:
+            fp.write(text + '\n')
@@ -16,7 +16,9 @@ from placebo.pill import Pill
 from placebo.serializer import Format
 
 
-def attach(session, data_path, prefix=None, debug=False, record_format=Format.JSON):
-    pill = Pill(prefix=prefix, debug=debug, record_format=record_format)
+def attach(session, data_path, prefix=None, debug=False,
+           record_format=Format.JSON, **kwargs):
+    pill = Pill(prefix=prefix, debug=debug, record_format=record_format,
+                **kwargs)
     pill.attach(session, data_path)
     return pill
@@ -0,0 +1,183 @@
+# Copyright (c) 2015-2019 Mitch Garnaat
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import io
+import asyncio
+import logging
+import time
+
+from botocore.response import StreamingBody
+
+from placebo.pages import ANY_PAGE
+from placebo.pill import Pill
+from placebo.serializer import Format
+from placebo.streams import is_async_body
+
+LOG = logging.getLogger(__name__)
+
+
+class AsyncBody(object):
+    """
+    A streaming body for aiobotocore callers that reads from a stream
+    already in memory, or memory-mapped, such as a recorded body.
+    """
+
+    _DEFAULT_CHUNK_SIZE = 1024
+
+    def __init__(self, raw_stream, content_length=None):
+        self._raw_stream = raw_stream
+        self._content_length = content_length
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    async def read(self, amt=None):
+        if amt is None:
+            return self._raw_stream.read()
+        return self._raw_stream.read(amt)
+
+    async def readlines(self):
+        return [line async for line in self.iter_lines()]
+
+    def __aiter__(self):
+        return self.iter_chunks(self._DEFAULT_CHUNK_SIZE)
+
+    async def iter_lines(self, chunk_size=_DEFAULT_CHUNK_SIZE,
+                         keepends=False):
+        pending = b''
+        async for chunk in self.iter_chunks(chunk_size):
+            lines = (pending + chunk).splitlines(True)
+            for line in lines[:-1]:
+                yield line.splitlines(keepends)[0]
+            pending = lines[-1]
+        if pending:
+            yield pending.splitlines(keepends)[0]
+
+    async def iter_chunks(self, chunk_size=_DEFAULT_CHUNK_SIZE):
+        while True:
+            chunk = await self.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+    def close(self):
+        self._raw_stream.close()
+
+    async def aclose(self):
+        self.close()
+
+
+class AioPill(Pill):
+    """
+    A Pill for aiobotocore sessions that keeps disk access off the event
+    loop.
+
+    Responses are always recorded in the background, as with
+    ``async_record``, and responses played back are read on
+    ``executor``, or the loop's default executor if it is None.  The
+    response a call gets is chosen before anything is read, so
+    concurrent calls to the same operation are played back in the order
+    they were made.
+    """
+
+    def __init__(self, executor=None, **kwargs):
+        kwargs['async_record'] = True
+        super(AioPill, self).__init__(**kwargs)
+        self._executor = executor
+
+    def _before_call(self, **kwargs):
+        # aiobotocore awaits whatever a handler returns that is awaitable
+        if self._mode == 'playback':
+            return self._mock_request_async(**kwargs)
+
+    def _record_data(self, http_response, parsed, model, **kwargs):
+        if not model.has_streaming_output:
+            return super(AioPill, self)._record_data(
+                http_response, parsed, model, **kwargs)
+        return self._record_streaming(http_response, parsed, model,
+                                      **kwargs)
+
+    async def _record_streaming(self, http_response, parsed, model,
+                                **kwargs):
+        # aiobotocore bodies can only be read on the event loop.  The
+        # caller gets a body reading the same bytes back from memory.
+        recorded = dict(parsed)
+        for key, value in parsed.items():
+            if is_async_body(value):
+                body = await value.read()
+                parsed[key] = AsyncBody(io.BytesIO(body), len(body))
+                recorded[key] = StreamingBody(io.BytesIO(body), len(body))
+        super(AioPill, self)._record_data(http_response, recorded, model,
+                                          **kwargs)
+
+    async def _mock_request_async(self, model, **kwargs):
+        service, operation, args = self._request_args(model, **kwargs)
+        if self._tracer is None:
+            response = await self._load_response_async(
+                service, operation, self._new_timings(), *args)
+        else:
+            start = time.perf_counter()
+            timings = self._new_timings()
+            response = await self._load_response_async(
+                service, operation, timings, *args)
+            self._tracer.span('playback', service, operation, start,
+                              time.perf_counter(), timings)
+        if model.has_streaming_output:
+            # Recorded bodies are read like any other aiobotocore body
+            data = response[1]
+            for key, value in data.items():
+                if (isinstance(value, (StreamingBody, io.IOBase)) and
+                        not is_async_body(value)):
+                    data[key] = AsyncBody(value)
+        return response
+
+    async def _load_response_async(self, service, operation, timings,
+                                   digest=None, page_token=ANY_PAGE):
+        LOG.debug('load_response: %s.%s', service, operation)
+        if self._pending_pages:
+            page = self._next_page(service, operation, page_token)
+            if page is not None:
+                return self._serve_page(service, operation, timings, *page)
+        entry = self._locate_response(service, operation, timings, digest)
+        loop = asyncio.get_event_loop()
+        response = await loop.run_in_executor(
+            self._executor, self._fetch_response, entry, timings)
+        return self._play_response(service, operation, timings, entry[0],
+                                   *response)
+
+    async def aflush(self):
+        """
+        Wait, without blocking the event loop, for recorded responses to
+        be written.
+        """
+        await asyncio.get_event_loop().run_in_executor(
+            self._executor, self.flush)
+
+    async def astop(self):
+        """
+        Stop recording or playing back without blocking the event loop.
+        """
+        await asyncio.get_event_loop().run_in_executor(
+            self._executor, self.stop)
+
+
+def attach(session, data_path, prefix=None, debug=False,
+           record_format=Format.JSON, **kwargs):
+    pill = AioPill(prefix=prefix, debug=debug, record_format=record_format,
+                   **kwargs)
+    pill.attach(session, data_path)
+    return pill
@@ -0,0 +1,117 @@
+# Copyright (c) 2015-2019 Mitch Garnaat
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import mmap
+import logging
+import threading
+
+from placebo.serializer import dumps, loads
+
+LOG = logging.getLogger(__name__)
+
+BUNDLE_NAME = 'placebo.bundle'
+INDEX_SUFFIX = '.idx'
+
+
+class Bundle(object):
+    """
+    All of the responses for a data directory stored in a single
+    append-only file.
+
+    Each record is a compact JSON document.  A sidecar index file holds
+    one line per record mapping the response (``base_name`` and
+    ``index``) to its byte offset and length in the bundle.  Records
+    are appended to the bundle before their index line is written, so
+    an interrupted write never leaves an index entry pointing at
+    missing data.  Reads ``mmap`` the bundle and only decode the record
+    that was asked for.
+    """
+
+    def __init__(self, data_path):
+        self.path = os.path.join(data_path, BUNDLE_NAME)
+        self.index_path = self.path + INDEX_SUFFIX
+        self._offsets = {}
+        self._mmap = None
+        self._data_fp = None
+        self._index_fp = None
+        self._lock = threading.Lock()
+
+    def exists(self):
+        return os.path.exists(self.index_path)
+
+    def load_index(self):
+        """
+        Read the sidecar index and return the list of
+        ``(base_name, index)`` keys it contains.
+        """
+        self._offsets = {}
+        if not self.exists():
+            return []
+        with open(self.index_path, 'r') as fp:
+            for line in fp:
+                fields = line.rstrip('\n').split('\t')
+                if len(fields) != 4:
+                    LOG.debug('skipping bad index line: %r', line)
+                    continue
+                base_name, index, offset, length = fields
+                self._offsets[(base_name, int(index))] = (
+                    int(offset), int(length))
+        return list(self._offsets)
+
+    def append(self, base_name, index, data):
+        """
+        Append a response to the bundle.
+        """
+        record = dumps(data)
+        with self._lock:
+            if self._data_fp is None:
+                self._data_fp = open(self.path, 'ab')
+                self._index_fp = open(self.index_path, 'a')
+            offset = self._data_fp.seek(0, os.SEEK_END)
+            self._data_fp.write(record)
+            self._data_fp.flush()
+            self._index_fp.write('{0}\t{1}\t{2}\t{3}\n'.format(
+                base_name, index, offset, len(record)))
+            self._index_fp.flush()
+            self._offsets[(base_name, index)] = (offset, len(record))
+
+    def read(self, base_name, index):
+        """
+        Decode and return a single response from the bundle.
+        """
+        offset, length = self._offsets[(base_name, index)]
+        end = offset + length
+        with self._lock:
+            if self._mmap is None or end > len(self._mmap):
+                self._remap()
+            record = self._mmap[offset:end]
+        return loads(record)
+
+    def _remap(self):
+        if self._mmap is not None:
+            self._mmap.close()
+        with open(self.path, 'rb') as fp:
+            self._mmap = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def close(self):
+        with self._lock:
+            if self._mmap is not None:
+                self._mmap.close()
+                self._mmap = None
+            if self._data_fp is not None:
+                self._data_fp.close()
+                self._index_fp.close()
+                self._data_fp = None
+                self._index_fp = None
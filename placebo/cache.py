@@ -0,0 +1,104 @@
+# Copyright (c) 2015-2019 Mitch Garnaat
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import pickle
+import logging
+import threading
+from collections import OrderedDict
+
+LOG = logging.getLogger(__name__)
+
+
+class ResponseCache(object):
+    """
+    A bounded LRU cache of parsed responses, keyed by file path.
+
+    Entries are invalidated when the file's modification time or size
+    changes.  Responses are stored pickled, so every ``get`` returns a
+    fresh copy and a caller mutating a response can't affect later
+    replays.  The cache can be bounded by number of entries
+    (``max_entries``), by total size of the pickled responses
+    (``max_bytes``) or both.
+    """
+
+    def __init__(self, max_entries=None, max_bytes=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _stamp(path):
+        st = os.stat(path)
+        return (st.st_mtime_ns, st.st_size)
+
+    def get(self, path, key=None):
+        """
+        Return a copy of the cached response for ``path`` or None if it
+        is not cached or the file has changed since it was cached.  A
+        ``key`` distinct from the path can be given when several
+        responses are stored in the same file.
+        """
+        key = key or path
+        stamp = self._stamp(path)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == stamp:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                blob = entry[1]
+            else:
+                self._remove(key)
+                self.misses += 1
+                return None
+        return pickle.loads(blob)
+
+    def put(self, path, response, key=None):
+        key = key or path
+        blob = pickle.dumps(response, pickle.HIGHEST_PROTOCOL)
+        if self.max_bytes is not None and len(blob) > self.max_bytes:
+            LOG.debug('response too large to cache: %s', key)
+            return
+        stamp = self._stamp(path)
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (stamp, blob)
+            self.size += len(blob)
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= len(entry[1])
+
+    def _evict(self):
+        while self._entries and (
+                (self.max_entries is not None and
+                 len(self._entries) > self.max_entries) or
+                (self.max_bytes is not None and self.size > self.max_bytes)):
+            key, (_, blob) = self._entries.popitem(last=False)
+            self.size -= len(blob)
+            LOG.debug('evicted from cache: %s', key)
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,106 @@
+# Copyright (c) 2015-2019 Mitch Garnaat
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import io
+import json
+import uuid
+import hashlib
+import logging
+
+LOG = logging.getLogger(__name__)
+
+
+class ContentStore(object):
+    """
+    A directory of serialized responses stored once each, named by the
+    SHA-256 of their contents.
+
+    Data directories that record into the same content store keep only a
+    small pointer file per response, so identical responses recorded
+    by many tests take up the space of one.  Objects are stored as
+    ``<sha256[:2]>/<sha256>.<extension>``.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def put(self, serializer, write_mode, extension, data):
+        """
+        Serialize ``data`` and store it if it isn't already in the store.
+        Returns the name of the object, relative to the store.
+        """
+        if 'b' in write_mode:
+            fp = io.BytesIO()
+            serializer(data, fp)
+            payload = fp.getvalue()
+        else:
+            fp = io.StringIO()
+            serializer(data, fp)
+            payload = fp.getvalue().encode('utf-8')
+        digest = hashlib.sha256(payload).hexdigest()
+        name = '{0}/{1}.{2}'.format(digest[:2], digest, extension)
+        path = self.object_path(name)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = '{0}.{1}.tmp'.format(path, uuid.uuid4())
+            try:
+                with open(tmp_path, 'wb') as fp:
+                    fp.write(payload)
+                os.replace(tmp_path, path)
+            except BaseException:
+                try:
+                    os.remove(tmp_path)
+                except FileNotFoundError:
+                    pass
+                raise
+            LOG.debug('stored object %s', name)
+        return name
+
+    def object_path(self, name):
+        return os.path.join(self.path, *name.split('/'))
+
+
+def write_pointer(pointer_path, store, name):
+    """
+    Write a pointer file referring to object ``name`` in ``store``.  The
+    store is recorded relative to the pointer so a tree of data
+    directories and their content store can be moved together.
+    """
+    store_path = os.path.relpath(store.path, os.path.dirname(pointer_path))
+    # Replaced in one step so a reader never sees a partial pointer
+    tmp_path = '{0}.{1}.tmp'.format(pointer_path, uuid.uuid4())
+    try:
+        with open(tmp_path, 'w') as fp:
+            json.dump({'store': store_path.replace(os.sep, '/'),
+                       'object': name}, fp)
+        os.replace(tmp_path, pointer_path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+def read_pointer(pointer_path):
+    """
+    Returns a tuple with the content store and the path of the object a
+    pointer file refers to.
+    """
+    with open(pointer_path, 'r') as fp:
+        pointer = json.load(fp)
+    store = ContentStore(os.path.normpath(os.path.join(
+        os.path.dirname(pointer_path), *pointer['store'].split('/'))))
+    return store, store.object_path(pointer['object'])
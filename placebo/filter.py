@@ -0,0 +1,67 @@
+# Copyright (c) 2015-2019 Mitch Garnaat
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from fnmatch import fnmatchcase
+
+
+class OperationFilter(object):
+    """
+    Decides which service and operation pairs to record.
+
+    Patterns are added as comma-separated lists of service and operation
+    names, as passed to ``Pill.record``, and may use shell-style globs
+    (``*``, ``?`` and ``[...]``).  The answer for each pair is
+    remembered, so checking a pair that has been seen before is a single
+    dictionary lookup however many patterns there are.
+    """
+
+    def __init__(self):
+        self._exact = set()
+        self._globs = []
+        self._match_all = False
+        self._matches = {}
+
+    def add(self, services='*', operations='*'):
+        """
+        Add every combination of ``services`` and ``operations``.
+        Returns the list of ``(service, operation)`` patterns added.
+        """
+        added = []
+        for service in services.split(','):
+            for operation in operations.split(','):
+                pattern = (service.strip(), operation.strip())
+                added.append(pattern)
+                if pattern == ('*', '*'):
+                    self._match_all = True
+                elif any(c in ''.join(pattern) for c in '*?['):
+                    self._globs.append(pattern)
+                else:
+                    self._exact.add(pattern)
+        self._matches = {}
+        return added
+
+    def clear(self):
+        self.__init__()
+
+    def matches(self, service, operation):
+        if self._match_all:
+            return True
+        key = (service, operation)
+        match = self._matches.get(key)
+        if match is None:
+            match = key in self._exact or any(
+                fnmatchcase(service, s) and fnmatchcase(operation, o)
+                for s, o in self._globs)
+            self._matches[key] = match
+        return match
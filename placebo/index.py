@@ -0,0 +1,174 @@
+# Copyright (c) 2015-2019 Mitch Garnaat
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import re
+import logging
+
+from placebo.serializer import Format
+
+LOG = logging.getLogger(__name__)
+
+
+def get_base_name(prefix, service, operation):
+    """
+    Return the name responses for an operation are stored under.
+    """
+    base_name = '{0}.{1}'.format(service, operation)
+    if prefix:
+        base_name = '{0}.{1}'.format(prefix, base_name)
+    return base_name
+
+
+class DirectoryIndex(object):
+    """
+    An in-memory index of the response files in a data directory.
+
+    The directory is scanned once and the index is then kept up to date
+    as new response files are written, so finding the next file to
+    record to or play back from is a dictionary lookup rather than a
+    glob or a series of ``os.path.exists`` calls.
+    """
+
+    def __init__(self, data_path):
+        self._data_path = data_path
+        extensions = Format.extensions() + [Format.REF]
+        self._filename_re = re.compile(
+            r'^(?P<base_name>.+)_(?P<index>\d+)\.(?P<format>{0})$'.format(
+                '|'.join(re.escape(e) for e in extensions)))
+        self._priority = dict(
+            (f, i) for i, f in
+            enumerate(extensions + Format.CONTAINER_FORMATS))
+        self._entries = {}
+        self._max_index = {}
+        self.formats = set()
+
+    @property
+    def data_path(self):
+        return self._data_path
+
+    def scan(self):
+        """
+        Rebuild the index from the contents of the data directory.
+        """
+        self._entries = {}
+        self._max_index = {}
+        self.formats = set()
+        LOG.debug('scanning: %s', self._data_path)
+        try:
+            with os.scandir(self._data_path) as it:
+                for entry in it:
+                    self.add(entry.name)
+        except (FileNotFoundError, NotADirectoryError):
+            LOG.debug('data path does not exist: %s', self._data_path)
+
+    def parse(self, file_name):
+        """
+        Returns a tuple of the base name, index and format of a response
+        file, or None if the name doesn't look like a response file.
+        """
+        m = self._filename_re.match(file_name)
+        if not m:
+            return None
+        return (m.group('base_name'), int(m.group('index')),
+                m.group('format'))
+
+    def add(self, file_name):
+        """
+        Add a single response file to the index.  Returns True if the
+        name looks like a response file, False otherwise.
+        """
+        parsed = self.parse(file_name)
+        if parsed is None:
+            return False
+        base_name, index, file_format = parsed
+        self.add_entry(base_name, index,
+                       os.path.join(self._data_path, file_name), file_format)
+        return True
+
+    def add_entry(self, base_name, index, path, file_format):
+        """
+        Add a response stored at ``path`` to the index.  ``file_format``
+        is the file extension, or the name of the format for a container
+        format.  Several responses may share a path when they are stored
+        in a container.
+        """
+        self.formats.add(file_format)
+        entries = self._entries.setdefault(base_name, {})
+        current = entries.get(index)
+        # When the same response exists in more than one format, prefer
+        # the format that was registered first.
+        if current is None or (self._priority[file_format] <
+                               self._priority[current[1]]):
+            entries[index] = (path, file_format)
+        key = (base_name, file_format)
+        if index > self._max_index.get(key, 0):
+            self._max_index[key] = index
+
+    def remove_entry(self, base_name, index, path):
+        """
+        Remove the response stored at ``path`` from the index.
+        """
+        entries = self._entries.get(base_name, {})
+        current = entries.get(index)
+        if current is None or current[0] != path:
+            return
+        del entries[index]
+        key = (base_name, current[1])
+        if self._max_index.get(key) == index:
+            self._max_index[key] = max(
+                [i for i, (_, file_format) in entries.items()
+                 if file_format == current[1]] or [0])
+
+    def next_index(self, base_name, index):
+        """
+        Return the lowest index above ``index`` with a response for
+        ``base_name``, or None if there isn't one.
+        """
+        following = [i for i in self._entries.get(base_name, {})
+                     if i > index]
+        return min(following) if following else None
+
+    def max_index(self, base_name, file_format):
+        """
+        Return the highest index recorded for ``base_name`` in
+        ``file_format``, or 0 if there are none.
+        """
+        return self._max_index.get((base_name, file_format), 0)
+
+    def lookup(self, base_name, index):
+        """
+        Returns a tuple with the file path and format for the given
+        response, or (None, None)
+        """
+        return self._entries.get(base_name, {}).get(index, (None, None))
+
+    def entries(self):
+        """
+        Yield a tuple of base name, index, path and format for every
+        indexed response.
+        """
+        for base_name, entries in list(self._entries.items()):
+            for index, (path, file_format) in sorted(entries.items()):
+                yield base_name, index, path, file_format
+
+    def files(self):
+        """
+        Return the paths of all indexed response files.
+        """
+        return sorted(set(path for entries in self._entries.values()
+                          for path, _ in entries.values()))
+
+    def __len__(self):
+        return sum(len(entries) for entries in self._entries.values())
@@ -0,0 +1,147 @@
+# Copyright (c) 2015-2019 Mitch Garnaat
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+import threading
+
+import jmespath
+from botocore.loaders import create_loader
+from botocore.paginate import PaginatorModel
+
+from placebo.writer import snapshot
+
+LOG = logging.getLogger(__name__)
+
+# Key the continuation token of a request is kept under in the botocore
+# request context.
+PAGE_TOKEN_KEY = 'placebo_page_token'
+
+# Stands in for the continuation token of a request when it isn't known,
+# so that whichever page is next is played back.
+ANY_PAGE = object()
+
+
+def _as_list(value):
+    return value if isinstance(value, list) else [value]
+
+
+class PageRecorder(object):
+    """
+    Collects the pages of paginated calls so that each run of pages can
+    be stored as a single response.
+
+    A page continues a run when the continuation token it was requested
+    with is the one the previous page returned, so several runs of the
+    same operation can be recorded at once.  A run is complete when a
+    page doesn't return a continuation token.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._configs = {}
+        self._runs = {}
+        self._loader = None
+
+    def _config(self, model):
+        service_model = model.service_model
+        key = (service_model.service_name, service_model.api_version,
+               model.name)
+        config = self._configs.get(key)
+        if config is None and key not in self._configs:
+            if self._loader is None:
+                self._loader = create_loader()
+            try:
+                paginators = PaginatorModel(self._loader.load_service_model(
+                    key[0], 'paginators-1', key[1]))
+                paginator = paginators.get_paginator(model.name)
+                config = (
+                    _as_list(paginator['input_token']),
+                    [jmespath.compile(e) for e in
+                     _as_list(paginator['output_token'])],
+                    jmespath.compile(paginator['more_results'])
+                    if 'more_results' in paginator else None)
+            except Exception:
+                # Not a paginated operation
+                config = None
+            with self._lock:
+                self._configs[key] = config
+        return config
+
+    def input_token(self, model, params):
+        """
+        Return the continuation token a request was made with, as a
+        list, or None for the first page or an operation that isn't
+        paginated.
+        """
+        config = self._config(model)
+        if config is None:
+            return None
+        token = [params.get(name) for name in config[0]]
+        return token if any(t is not None for t in token) else None
+
+    def _output_token(self, config, parsed):
+        if config[2] is not None and not config[2].search(parsed):
+            return None
+        token = [e.search(parsed) for e in config[1]]
+        return token if any(t is not None for t in token) else None
+
+    def add(self, service, operation, model, input_token, page,
+            extra=None):
+        """
+        Add a page recorded for ``model``.  Once a run of pages is
+        complete, returns a tuple of the response to store and the
+        ``extra`` value passed with its first page.  The response is the
+        page itself if the operation isn't paginated or the run is a
+        single page, and otherwise has a list of ``pages``.  Returns None
+        while the run is waiting for more pages.
+        """
+        config = self._config(model)
+        if config is None:
+            return page, extra
+        output_token = self._output_token(config, page['data'])
+        page['token'] = input_token
+        with self._lock:
+            run = None
+            if input_token is not None:
+                run = self._runs.pop(
+                    (service, operation, repr(input_token)), None)
+            if run is None:
+                run = ([], extra)
+            if output_token is not None:
+                # The caller may change the page before the rest of the
+                # run arrives.
+                page['data'] = snapshot(page['data'])
+                run[0].append(page)
+                self._runs[(service, operation, repr(output_token))] = run
+                return None
+            run[0].append(page)
+        return self._response(run[0]), run[1]
+
+    def drain(self):
+        """
+        Return a list of ``(service, operation, response, extra)`` for
+        every run that is still waiting for its next page.
+        """
+        with self._lock:
+            runs, self._runs = self._runs, {}
+        return [(service, operation, self._response(pages), extra)
+                for (service, operation, _), (pages, extra) in runs.items()]
+
+    @staticmethod
+    def _response(pages):
+        if len(pages) == 1:
+            page = pages[0]
+            del page['token']
+            return page
+        return {'status_code': pages[0]['status_code'], 'pages': pages}
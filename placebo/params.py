@@ -0,0 +1,138 @@
+# Copyright (c) 2015-2019 Mitch Garnaat
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import json
+import hashlib
+import logging
+import datetime
+import threading
+
+LOG = logging.getLogger(__name__)
+
+PARAMS_INDEX_NAME = 'placebo.params'
+# Key the hash of a request's parameters is kept under in the botocore
+# request context, between the parameters being provided and the
+# request being made.
+PARAMS_HASH_KEY = 'placebo_params_hash'
+
+
+def _default(obj):
+    if isinstance(obj, (bytes, bytearray)):
+        return {'__bytes__': hashlib.sha256(obj).hexdigest()}
+    if isinstance(obj, (datetime.datetime, datetime.date)):
+        return obj.isoformat()
+    # Streams and other objects can't be compared without consuming
+    # them, so only their type is taken into account.
+    return {'__type__': type(obj).__name__}
+
+
+def params_hash(params):
+    """
+    Return a hash of the parameters passed to a client method that
+    doesn't depend on the order of keys in any dictionaries.
+    """
+    normalized = json.dumps(params, sort_keys=True, separators=(',', ':'),
+                            default=_default)
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()[:32]
+
+
+class ParamsIndex(object):
+    """
+    The hash of the request parameters for each recorded response.
+
+    Stored as lines of ``base_name<TAB>index<TAB>hash`` appended to
+    ``placebo.params`` in the data directory.  Once loaded, the
+    responses recorded for a base name and hash are found with a
+    dictionary lookup and played back in order, starting again from the
+    first one when they run out.
+    """
+
+    def __init__(self, data_path):
+        self.path = os.path.join(data_path, PARAMS_INDEX_NAME)
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._positions = {}
+
+    def load(self):
+        entries = {}
+        try:
+            with open(self.path, 'r') as fp:
+                for line in fp:
+                    fields = line.rstrip('\n').split('\t')
+                    if len(fields) != 3:
+                        continue
+                    base_name, index, digest = fields
+                    entries.setdefault((base_name, digest), set()).add(
+                        int(index))
+        except FileNotFoundError:
+            pass
+        with self._lock:
+            self._entries = dict((key, sorted(indexes))
+                                 for key, indexes in entries.items())
+            self._positions = {}
+        LOG.debug('loaded %d request hashes from %s', len(entries),
+                  self.path)
+
+    def add(self, base_name, index, digest):
+        """
+        Record the parameter hash for a response.
+        """
+        line = '{0}\t{1}\t{2}\n'.format(base_name, index, digest)
+        with self._lock:
+            # Short appends are atomic, so several processes can record
+            # into the same index.
+            with open(self.path, 'a') as fp:
+                fp.write(line)
+            self._entries.setdefault((base_name, digest), []).append(index)
+
+    def renumber(self, mapping):
+        """
+        Rewrite the index for responses that have been renumbered.
+        ``mapping`` maps the ``(base_name, index)`` of each response that
+        is kept to its new index; the rest are dropped.
+        """
+        try:
+            with open(self.path, 'r') as fp:
+                lines = fp.readlines()
+        except FileNotFoundError:
+            return
+        kept = []
+        for line in lines:
+            fields = line.rstrip('\n').split('\t')
+            if len(fields) != 3:
+                continue
+            base_name, index, digest = fields
+            new_index = mapping.get((base_name, int(index)))
+            if new_index is not None:
+                kept.append('{0}\t{1}\t{2}\n'.format(
+                    base_name, new_index, digest))
+        with self._lock:
+            with open(self.path, 'w') as fp:
+                fp.write(''.join(kept))
+        self.load()
+
+    def next_index(self, base_name, digest):
+        """
+        Return the index of the next response to play back for a base
+        name and parameter hash, or None if none were recorded.
+        """
+        key = (base_name, digest)
+        with self._lock:
+            indexes = self._entries.get(key)
+            if not indexes:
+                return None
+            position = self._positions.get(key, 0) % len(indexes)
+            self._positions[key] = position + 1
+            return indexes[position]
@@ -12,13 +12,34 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import io
 import os
-import glob
-import re
+import time
 import uuid
+import weakref
 import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
+from placebo.bundle import Bundle
+from placebo.cache import ResponseCache
+from placebo.content import ContentStore, read_pointer, write_pointer
+from placebo.filter import OperationFilter
+from placebo.index import DirectoryIndex, get_base_name
+from placebo.pages import ANY_PAGE, PAGE_TOKEN_KEY, PageRecorder
+from placebo.params import PARAMS_HASH_KEY, ParamsIndex, params_hash
 from placebo.serializer import Format, get_deserializer, get_serializer
+from placebo.shapes import ShapeCache, revive
+from placebo.sidecar import detach_bodies, resolve_bodies
+from placebo.snapshot import (Snapshot, load_snapshot, snapshot_entry,
+                               snapshot_lock, write_snapshot)
+from placebo.sqlite import SQLiteStore
+from placebo.stats import Stats
+from placebo.trace import Tracer, TraceFormat
+from placebo.usage import UsageTracker
+from placebo.writer import (Backpressure, BackgroundWriter,
+                            check_backpressure, snapshot)
 
 LOG = logging.getLogger(__name__)
 DebugFmtString = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
@@ -32,9 +53,14 @@ class FakeHttpResponse(object):
 
 class Pill(object):
 
-    clients = []
-
-    def __init__(self, prefix=None, debug=False, record_format=Format.JSON):
+    def __init__(self, prefix=None, debug=False, record_format=Format.JSON,
+                 cache_size=None, cache_bytes=None, async_record=False,
+                 record_queue_size=1000,
+                 record_backpressure=Backpressure.BLOCK,
+                 compression_level=None, sidecar_threshold=None,
+                 content_store=None, collect_stats=False, trace_path=None,
+                 trace_format=TraceFormat.JSONL, match_params=False,
+                 page_streams=False, track_usage=False):
         if debug:
             self._set_logger(__name__, logging.DEBUG)
 
@@ -43,9 +69,20 @@ class Pill(object):
             LOG.warning("Record format not allowed. Falling back to default.")
             record_format = Format.DEFAULT
 
-        self._serializer = get_serializer(record_format)
-        self._filename_re = re.compile(r'.*\..*_(?P<index>\d+).{0}'.format(
-            record_format))
+        self._serializer = get_serializer(record_format, compression_level)
+        self._deserializer = get_deserializer(record_format)
+        self._extension = Format.extension(record_format)
+        self._content_store = None
+        if content_store is not None:
+            if record_format in Format.CONTAINER_FORMATS:
+                raise ValueError(
+                    'content_store can not be used with the {0} '
+                    'format'.format(record_format))
+            self._content_store = ContentStore(content_store)
+        # Extension of the files in the data path, which are pointers
+        # when responses are kept in a content store
+        self._file_extension = (Format.REF if self._content_store
+                                else self._extension)
         self._record_format = record_format
         self.prefix = prefix
         self._uuid = str(uuid.uuid4())
@@ -53,8 +90,46 @@ class Pill(object):
         self._mode = None
         self._session = None
         self._index = {}
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+        self._dir_index = None
+        self._bundle = None
+        self._sqlite = None
+        self._snapshot = None
+        self._preload_info = None
+        self._match_params = match_params
+        self._shapes = ShapeCache()
+        self._shape_extension = Format.extension(Format.JSON_SHAPE)
+        self._params = None
+        self._track_usage = track_usage
+        self._usage = None
+        self._pages = PageRecorder() if page_streams else None
+        # Pages still to be played back from the current run of each
+        # paginated operation
+        self._pending_pages = {}
+        self._cache = None
+        if cache_size is not None or cache_bytes is not None:
+            self._cache = ResponseCache(cache_size, cache_bytes)
+        self._sidecar_threshold = sidecar_threshold
+        self._stats = Stats() if collect_stats else None
+        self._tracer = None
+        if trace_path is not None:
+            self._tracer = Tracer(trace_path, trace_format)
+        # The background writer is only running while recording, so a
+        # stopped Pill doesn't keep a thread, or itself, alive.
+        self._writer = None
+        self._writer_options = None
+        self._dropped = 0
+        if async_record:
+            check_backpressure(record_backpressure)
+            self._writer_options = (record_queue_size, record_backpressure)
         self.events = []
-        self.clients = []
+        self._filter = OperationFilter()
+        # Clients are only tracked while they are alive, so creating
+        # many short-lived clients doesn't leak them or slow down
+        # switching modes.
+        self.clients = weakref.WeakSet()
+        self._shim_class = self._create_shim_class()
 
     @property
     def mode(self):
@@ -72,6 +147,44 @@ class Pill(object):
     def record_format(self):
         return self._record_format
 
+    @property
+    def dropped_responses(self):
+        return self._dropped + (self._writer.dropped if self._writer else 0)
+
+    @property
+    def cache_hits(self):
+        return self._cache.hits if self._cache else 0
+
+    @property
+    def cache_misses(self):
+        return self._cache.misses if self._cache else 0
+
+    @property
+    def preload_info(self):
+        """
+        What the last ``playback(preload=True)`` read, as a dictionary of
+        the number of ``responses``, the ``bytes`` they take up, the
+        ``seconds`` it took and whether it was ``complete``, or None.
+        """
+        return self._preload_info
+
+    def stats(self):
+        """
+        Return the counters and timings collected for each service and
+        operation, keyed on ``(service, operation)``.  Statistics are
+        only collected when the Pill is created with ``collect_stats``.
+        """
+        if self._stats is None:
+            return {}
+        return self._stats.as_dict()
+
+    def _new_timings(self):
+        # Timings are only gathered when something will use them, so
+        # the hot paths just check for None otherwise.
+        if self._stats is None and self._tracer is None:
+            return None
+        return {}
+
     @staticmethod
     def _set_logger(logger_name, level=logging.INFO):
         """
@@ -93,138 +206,419 @@ class Pill(object):
         log.addHandler(ch)
 
     def _create_shim_class(self):
-        # This is kind of tricky.  Maybe too tricky.
         # We want to know about all of the clients that are created within
-        # the session we are attached to.  To do that, we dynamically
-        # create a Class object that will become a superclass of each
-        # new client that gets created.  This superclass has an __init__
-        # method that appends the new client instance into this Pill
-        # instance's list of clients.  The ugly code messing around with
-        # mro() is there because we have to define an __init__ method in
-        # our dynamically created class so we have to make sure it
-        # calls it's superclass's __init__ methods.  We can't use
-        # super() because that needs the class (which we are in the process
-        # of creating) so we walk the method resolution order to find
-        # our superclass.  The funny business with foo is because the
-        # self inside _init_method stomps on the self defined in the
-        # scope of this method but we really just need a reference to
-        # the the method for adding a client.
-        foo = self.add_client
-
-        def _init_method(self, *args, **kwargs):
-            res_order = self.__class__.mro()
-            for i, cls in enumerate(res_order):
-                if cls.__name__ == 'PillShim':
-                    break
-            super_cls_index = i + 1
-            if len(res_order) >= super_cls_index + 1:
-                super_cls = res_order[super_cls_index]
-                super_cls.__init__(self, *args, **kwargs)
-            foo(self)
-
-        class_attributes = {'__init__': _init_method}
-        bases = []
-        class_name = 'PillShim'
-        cls = type(class_name, tuple(bases), class_attributes)
-        return cls
+        # the session we are attached to.  To do that, this class is made
+        # a superclass of each new client class, and its __init__ adds
+        # the new client to this Pill's clients.  The class is created
+        # once per Pill, and super() finds the next __init__ in whatever
+        # class it ends up in, even when several Pills are attached to
+        # the same session.
+        add_client = self.add_client
+
+        class PillShim(object):
+
+            def __init__(self, *args, **kwargs):
+                super(PillShim, self).__init__(*args, **kwargs)
+                add_client(self)
+
+        return PillShim
 
     def _create_client(self, class_attributes, base_classes, **kwargs):
         LOG.debug('_create_client')
-        base_classes.insert(0, self._create_shim_class())
+        base_classes.insert(0, self._shim_class)
 
     def add_client(self, client):
-        self.clients.append(client)
+        self.clients.add(client)
+        self._register(client.meta.events)
+
+    def _register(self, events):
+        # The handlers are registered once and check the current mode
+        # themselves, so switching modes doesn't touch any emitters.
+        events.register('after-call.*.*', self._after_call,
+                        'placebo-record-{0}'.format(self._uuid))
+        events.register('before-call.*.*', self._before_call,
+                        'placebo-playback-{0}'.format(self._uuid))
+        if self._match_params or self._pages is not None:
+            events.register('provide-client-params.*.*',
+                            self._provide_params,
+                            'placebo-params-{0}'.format(self._uuid))
 
     def attach(self, session, data_path):
         LOG.debug('attaching to session: %s', session)
-        LOG.debug('datapath: %s', data_path)
         self._session = session
+        self.open(data_path)
+        # boto3 sessions expose their events, while botocore sessions,
+        # such as aiobotocore's, only have them as a component
+        events = getattr(session, 'events', None)
+        if events is None:
+            events = session.get_component('event_emitter')
+        events.register('creating-client-class', self._create_client)
+        self._register(events)
+
+    def open(self, data_path):
+        """
+        Use the responses in ``data_path`` without attaching to a
+        session, e.g. to call ``save_response`` or ``compile``.
+        """
+        LOG.debug('datapath: %s', data_path)
         self._data_path = data_path
-        session.events.register('creating-client-class', self._create_client)
+        self._dir_index = DirectoryIndex(data_path)
+        self._bundle = Bundle(data_path)
+        self._sqlite = SQLiteStore(data_path)
+        self._snapshot = None
+        if self._match_params:
+            self._params = ParamsIndex(data_path)
+        if self._track_usage:
+            if self._usage is not None:
+                self._usage.close()
+            self._usage = UsageTracker(data_path)
+        self._scan()
 
     def record(self, services='*', operations='*'):
+        """
+        Record responses for the given services and operations.  Both
+        are comma-separated lists and may use shell-style globs, e.g.
+        ``pill.record('ec2,s3', 'Describe*')``.  Calling ``record``
+        again while recording adds to what is recorded.
+        """
         if self._mode == 'playback':
             self.stop()
         self._mode = 'record'
-        for service in services.split(','):
-            for operation in operations.split(','):
-                event = 'after-call.{0}.{1}'.format(
-                    service.strip(), operation.strip())
-                LOG.debug('recording: %s', event)
-                self.events.append(event)
-                self._session.events.register(
-                    event, self._record_data, 'placebo-record-mode')
-                for client in self.clients:
-                    client.meta.events.register(
-                        event, self._record_data, 'placebo-record-mode')
-
-    def playback(self):
+        if self._writer_options is not None and self._writer is None:
+            self._writer = BackgroundWriter(
+                self._write_queued, *self._writer_options,
+                discard=self._discard_queued)
+        self._scan()
+        for service, operation in self._filter.add(services, operations):
+            event = 'after-call.{0}.{1}'.format(service, operation)
+            LOG.debug('recording: %s', event)
+            self.events.append(event)
+
+    def playback(self, preload=False, preload_workers=None,
+                 preload_bytes=None, shared=False):
+        """
+        Play back recorded responses.  With ``preload``, every response
+        is read into memory now, by a pool of ``preload_workers``
+        threads, rather than when it is first played back.  Preloading
+        stops once the responses take up more than ``preload_bytes``, and
+        the rest are read as they are played back.
+
+        With ``shared``, the data path is compiled if its snapshot is
+        missing or out of date, by only one of the processes playing it
+        back at the same time, and every process plays back from the one
+        snapshot.
+        """
         if self.mode == 'record':
             self.stop()
         if self.mode is None:
-            event = 'before-call.*.*'
-            self.events.append(event)
-            self._session.events.register(
-                event, self._mock_request, 'placebo-playback-mode')
+            self._scan()
+            self._snapshot = self._load_snapshot()
+            if shared and self._snapshot is None:
+                self._snapshot = self._compile_shared()
+            if preload and self._snapshot is None:
+                self._snapshot = self._preload(preload_workers,
+                                               preload_bytes)
+            if self._params is not None:
+                self._params.load()
+            self.events.append('before-call.*.*')
             self._mode = 'playback'
-            for client in self.clients:
-                client.meta.events.register(
-                    event, self._mock_request, 'placebo-playback-mode')
 
     def stop(self):
         LOG.debug('stopping, mode=%s', self.mode)
-        if self.mode == 'record':
-            if self._session:
-                for event in self.events:
-                    self._session.events.unregister(
-                        event, unique_id='placebo-record-mode')
-                    for client in self.clients:
-                        client.meta.events.unregister(
-                            event, unique_id='placebo-record-mode')
-                self.events = []
-        elif self.mode == 'playback':
-            if self._session:
-                for event in self.events:
-                    self._session.events.unregister(
-                        event, unique_id='placebo-playback-mode')
-                    for client in self.clients:
-                        client.meta.events.unregister(
-                            event, unique_id='placebo-playback-mode')
-                self.events = []
+        if self._pages is not None:
+            # Runs whose last page was never requested are stored as far
+            # as they got.
+            for service, operation, data, digest in self._pages.drain():
+                self._store_response(service, operation, data,
+                                     self._new_timings(), digest)
+        self.flush()
+        if self._writer is not None:
+            self._writer.close()
+            self._dropped += self._writer.dropped
+            self._writer = None
+        self._pending_pages.clear()
+        self.events = []
+        self._filter.clear()
+        if self._bundle:
+            self._bundle.close()
+            self._sqlite.close()
+        if self._snapshot is not None:
+            self._snapshot.close()
+        self._snapshot = None
         self._mode = None
 
+    def _scan(self):
+        self._dir_index.scan()
+        for base_name, index in self._bundle.load_index():
+            self._dir_index.add_entry(
+                base_name, index, self._bundle.path, Format.BUNDLE)
+        for base_name, index in self._sqlite.keys():
+            self._dir_index.add_entry(
+                base_name, index, self._sqlite.path, Format.SQLITE)
+
+    def _load_snapshot(self):
+        keys = []
+        sources = []
+        for base_name, index, path, file_format in self._written():
+            keys.append((base_name, index))
+            # Containers are only ever appended to, which changes the
+            # keys, and SQLite can touch the database when just reading it.
+            if file_format not in Format.CONTAINER_FORMATS:
+                sources.append(path)
+        return load_snapshot(self._data_path, keys, sources)
+
+    def _preload(self, workers=None, max_bytes=None):
+        """
+        Read the responses in the data path with a pool of ``workers``
+        threads until they take up more than ``max_bytes``.  Returns a
+        Snapshot of the responses read.
+        """
+        start = time.perf_counter()
+        if workers is None:
+            workers = min(32, (os.cpu_count() or 1) + 4)
+        entries = {}
+        total = 0
+        complete = True
+        responses = self._written()
+        pending = deque()
+        with ThreadPoolExecutor(workers) as pool:
+
+            def submit():
+                # Only a few responses are read ahead, so no more than
+                # that are held beyond the budget.
+                for base_name, index, path, file_format in responses:
+                    pending.append(((base_name, index), pool.submit(
+                        self._preload_entry, base_name, index, path,
+                        file_format)))
+                    return
+
+            for _ in range(workers):
+                submit()
+            # Responses are kept in the order of the directory index, so
+            # the same ones are preloaded each time.
+            while pending:
+                key, future = pending.popleft()
+                try:
+                    entry = future.result()
+                except Exception:
+                    # It will fail again if it is played back
+                    LOG.warning('could not preload %s_%s', *key,
+                                exc_info=True)
+                    entry = None
+                # Only ``entries`` holds on to the response from here on
+                del future
+                if entry is None:
+                    submit()
+                    continue
+                if max_bytes is not None and total + len(entry[0]) > max_bytes:
+                    complete = False
+                    for _, future in pending:
+                        future.cancel()
+                    pending.clear()
+                    break
+                total += len(entry[0])
+                entries[key] = entry
+                submit()
+        self._preload_info = {'responses': len(entries), 'bytes': total,
+                              'seconds': time.perf_counter() - start,
+                              'complete': complete}
+        LOG.info('preloaded %d responses (%d bytes) in %.3fs%s',
+                 len(entries), total, self._preload_info['seconds'],
+                 '' if complete else ', the rest will be read lazily')
+        return Snapshot(self._data_path, entries)
+
+    def _written(self):
+        for entry in self._dir_index.entries():
+            if not self._claimed(entry[2], entry[3]):
+                yield entry
+
+    def _claimed(self, path, file_format):
+        # Scanning only looks at names, so a file can have been claimed
+        # by a recording that hasn't written it yet, or that failed to.
+        if file_format in Format.CONTAINER_FORMATS:
+            return False
+        try:
+            return os.path.getsize(path) == 0
+        except FileNotFoundError:
+            return True
+
+    def _preload_entry(self, base_name, index, path, file_format):
+        return snapshot_entry(self._data_path, *self._read_response(
+            base_name, index, path, file_format))
+
+    def _compile_shared(self):
+        with snapshot_lock(self._data_path):
+            # Another process may have compiled it while we waited
+            snapshot = self._load_snapshot()
+            if snapshot is None:
+                self.compile()
+                snapshot = self._load_snapshot()
+        return snapshot
+
+    def compile(self):
+        """
+        Write a snapshot of every response in the data path to a single
+        file.  While it is newer than the responses, ``playback`` loads
+        the snapshot instead of reading each response separately.
+        Returns the number of responses in the snapshot.
+        """
+        self.flush()
+        self._scan()
+        responses = {}
+        for base_name, index, path, file_format in self._written():
+            responses[(base_name, index)] = self._read_response(
+                base_name, index, path, file_format)
+        write_snapshot(self._data_path, responses)
+        return len(responses)
+
+    def flush(self):
+        """
+        Wait for any responses queued by an asynchronous recording to be
+        written, and write out any buffered trace spans and usage.
+        """
+        if self._writer is not None:
+            self._writer.flush()
+        if self._tracer is not None:
+            self._tracer.flush()
+        if self._usage is not None:
+            self._usage.flush()
+
+    def _after_call(self, model, **kwargs):
+        if self._mode == 'record' and self._filter.matches(
+                model.service_model.service_id.hyphenize(), model.name):
+            return self._record_data(model=model, **kwargs)
+
+    def _before_call(self, **kwargs):
+        if self._mode == 'playback':
+            return self._mock_request(**kwargs)
+
+    def _provide_params(self, params, model, context, **kwargs):
+        # Hash the parameters as the caller passed them, before botocore
+        # fills in things like idempotency tokens, and keep the hash in
+        # the request context for _record_data and _mock_request.
+        if self._mode is None:
+            return
+        if self._match_params:
+            context[PARAMS_HASH_KEY] = params_hash(params)
+        if self._pages is not None:
+            context[PAGE_TOKEN_KEY] = self._pages.input_token(model, params)
+
     def _record_data(self, http_response, parsed, model, **kwargs):
         LOG.debug('_record_data')
+        if self._tracer is not None:
+            start = time.perf_counter()
         service_name = model.service_model.endpoint_prefix
         operation_name = model.name
-        self.save_response(service_name, operation_name, parsed,
-                           http_response.status_code)
+        if self.record_format == Format.JSON_SHAPE:
+            self._shapes.remember(model)
+        timings = self._new_timings()
+        context = kwargs.get('context', {})
+        digest = None
+        if self._params is not None:
+            digest = context.get(PARAMS_HASH_KEY)
+        if self._pages is None:
+            if self._writer is None:
+                self._save_response(service_name, operation_name, parsed,
+                                    http_response.status_code, timings,
+                                    digest)
+            elif self._writer.admit():
+                data = self._make_response(
+                    parsed, http_response.status_code)
+                data['data'] = snapshot(data['data'])
+                self._store_response(service_name, operation_name, data,
+                                     timings, digest)
+        elif self._writer is None or self._writer.admit():
+            data = self._make_response(parsed, http_response.status_code)
+            if self._writer is not None:
+                data['data'] = snapshot(data['data'])
+            run = self._pages.add(service_name, operation_name, model,
+                                  context.get(PAGE_TOKEN_KEY), data, digest)
+            if run is not None:
+                self._store_response(service_name, operation_name, run[0],
+                                     timings, run[1])
+        if self._tracer is not None:
+            self._tracer.span('record', service_name, operation_name,
+                              start, time.perf_counter(), timings)
 
-    def get_new_file_path(self, service, operation):
-        base_name = '{0}.{1}'.format(service, operation)
-        if self.prefix:
-            base_name = '{0}.{1}'.format(self.prefix, base_name)
-        LOG.debug('get_new_file_path: %s', base_name)
-        index = 0
-        glob_pattern = os.path.join(self._data_path, base_name + '_*')
-        for file_path in glob.glob(glob_pattern):
-            file_name = os.path.basename(file_path)
-            m = self._filename_re.match(file_name)
-            if m:
-                i = int(m.group('index'))
-                if i > index:
-                    index = i
-        index += 1
+    def _store_response(self, service, operation, data, timings,
+                        digest=None):
+        if self._writer is None:
+            self._write_claimed(service, operation, data,
+                                *self._reserve_response(
+                                    service, operation, timings),
+                                timings=timings, digest=digest)
+        else:
+            # The sequence number is reserved now, so the order responses
+            # are recorded in doesn't depend on when they are written.
+            self._writer.put(service, operation, data,
+                             *self._reserve_response(
+                                 service, operation, timings),
+                             timings, digest)
+
+    def _write_queued(self, service, operation, *args):
+        if self._tracer is not None:
+            start = time.perf_counter()
+        self._write_response(service, operation, *args)
+        if self._tracer is not None:
+            # Recording spans only cover queueing the response, so the
+            # write gets a span of its own.
+            self._tracer.span('write', service, operation, start,
+                              time.perf_counter(), args[-2])
+
+    def _get_sidecar_path(self):
+        if self._content_store is not None:
+            os.makedirs(self._content_store.path, exist_ok=True)
+            return self._content_store.path
+        return self._data_path
+
+    def _make_response(self, response_data, http_response):
+        data = {'status_code': http_response,
+                'data': response_data}
+        if self._sidecar_threshold is not None:
+            sidecars = []
+            data['data'] = detach_bodies(
+                response_data, self._get_sidecar_path(),
+                self._sidecar_threshold, sidecars)
+            if sidecars:
+                data['sidecars'] = sidecars
+        return data
+
+    def _get_base_name(self, service, operation):
+        return get_base_name(self.prefix, service, operation)
+
+    def _get_lock(self, base_name):
+        # Each operation gets its own lock so that threads calling
+        # different operations never wait on each other.
+        lock = self._locks.get(base_name)
+        if lock is None:
+            with self._locks_lock:
+                lock = self._locks.setdefault(base_name, threading.Lock())
+        return lock
+
+    def _get_new_index(self, base_name):
+        return self._dir_index.max_index(
+            base_name, self._file_extension) + 1
+
+    def _get_file_path(self, base_name, index):
+        if self.record_format == Format.BUNDLE:
+            return self._bundle.path
+        if self.record_format == Format.SQLITE:
+            return self._sqlite.path
         return os.path.join(
             self._data_path, '{0}_{1}.{2}'.format(
-                base_name, index, self.record_format))
+                base_name, index, self._file_extension))
+
+    def get_new_file_path(self, service, operation):
+        base_name = self._get_base_name(service, operation)
+        LOG.debug('get_new_file_path: %s', base_name)
+        return self._get_file_path(base_name, self._get_new_index(base_name))
 
     @staticmethod
     def find_file_format(file_name):
         """
         Returns a tuple with the file path and format found, or (None, None)
         """
-        for file_format in Format.ALLOWED:
+        for file_format in Format.extensions():
             file_path = '.'.join((file_name, file_format))
             if os.path.exists(file_path):
                 return file_path, file_format
@@ -235,28 +629,66 @@ class Pill(object):
         Returns a tuple with the next file to read and the serializer
         format used
         """
-        base_name = '{0}.{1}'.format(service, operation)
-        if self.prefix:
-            base_name = '{0}.{1}'.format(self.prefix, base_name)
+        _, _, next_file, serializer_format = self._get_next_response(
+            service, operation)
+        return next_file, serializer_format
+
+    def _get_next_response(self, service, operation, timings=None,
+                           digest=None):
+        """
+        Returns a tuple with the base name and index of the next response
+        to play back, along with the file it is stored in and its format
+        """
+        base_name = self._get_base_name(service, operation)
         LOG.debug('get_next_file_path: %s', base_name)
+        if digest is not None:
+            # Responses recorded for the same parameters are played back
+            # whatever order the calls are made in.
+            index = self._params.next_index(base_name, digest)
+            if index is not None:
+                next_file, serializer_format = self._dir_index.lookup(
+                    base_name, index)
+                if next_file and not self._claimed(
+                        next_file, serializer_format):
+                    return base_name, index, next_file, serializer_format
+        with self._get_lock(base_name):
+            if timings is None:
+                return self._advance(base_name)
+            position = self._index.get(base_name, 1)
+            response = self._advance(base_name)
+            if response[1] < position:
+                timings['wraparounds'] = 1
+            return response
+
+    def _advance(self, base_name):
         next_file = None
         serializer_format = None
         index = self._index.setdefault(base_name, 1)
+        wrapped = index == 1
 
         while not next_file:
-            file_name = os.path.join(
-                self._data_path, base_name + '_{0}'.format(index))
-            next_file, serializer_format = self.find_file_format(file_name)
-            if next_file:
-                self._index[base_name] += 1
-            elif index != 1:
+            next_file, serializer_format = self._dir_index.lookup(
+                base_name, index)
+            if next_file and not self._claimed(next_file, serializer_format):
+                self._index[base_name] = index + 1
+                break
+            next_file = None
+            # A response that failed to be written leaves a gap, and one
+            # still being written is skipped until it has been
+            following = self._dir_index.next_index(base_name, index)
+            if following is not None:
+                index = following
+            elif not wrapped:
+                wrapped = True
                 index = 1
                 self._index[base_name] = 1
             else:
+                file_name = os.path.join(
+                    self._data_path, base_name + '_{0}'.format(index))
                 raise IOError('response file ({0}.[{1}]) not found'.format(
-                    file_name, "|".join(Format.ALLOWED)))
+                    file_name, "|".join(Format.extensions())))
 
-        return next_file, serializer_format
+        return base_name, index, next_file, serializer_format
 
     def save_response(self, service, operation, response_data,
                       http_response=200):
@@ -270,30 +702,369 @@ class Pill(object):
         returned in order.
         """
         LOG.debug('save_response: %s.%s', service, operation)
-        filepath = self.get_new_file_path(service, operation)
+        self._save_response(service, operation, response_data,
+                            http_response, self._new_timings())
+
+    def _save_response(self, service, operation, response_data,
+                       http_response, timings, digest=None):
+        data = self._make_response(response_data, http_response)
+        self._write_claimed(service, operation, data,
+                            *self._reserve_response(
+                                service, operation, timings),
+                            timings=timings, digest=digest)
+
+    def _reserve_response(self, service, operation, timings=None):
+        """
+        Allocate the index and path of a new response and add it to the
+        directory index.  Returns a tuple of prefix, base name, index and
+        path.
+        """
+        if timings is not None:
+            start = time.perf_counter()
+        prefix = self.prefix
+        base_name = get_base_name(prefix, service, operation)
+        with self._get_lock(base_name):
+            index = self._get_new_index(base_name)
+            filepath = self._get_file_path(base_name, index)
+            if self.record_format in Format.FILE_FORMATS:
+                # Another process recording into the same directory may
+                # have taken this index since we scanned it, so claim the
+                # file and move on to the next index if it already exists.
+                while not self._claim_file(filepath):
+                    self._dir_index.add_entry(
+                        base_name, index, filepath, self._file_extension)
+                    index += 1
+                    filepath = self._get_file_path(base_name, index)
+            if self.record_format != Format.SQLITE:
+                self._dir_index.add_entry(
+                    base_name, index, filepath, self._file_extension)
+        if timings is not None:
+            timings['path_seconds'] = time.perf_counter() - start
+            timings['index'] = index
+            timings['path'] = filepath
+        return prefix, base_name, index, filepath
+
+    @staticmethod
+    def _claim_file(filepath):
+        """
+        Atomically create an empty file at ``filepath``.  Returns False if
+        the file already exists.
+        """
+        try:
+            fd = os.open(filepath, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return False
+        os.close(fd)
+        return True
+
+    def _write_claimed(self, service, operation, data, prefix, base_name,
+                       index, filepath, timings=None, digest=None):
+        try:
+            self._write_response(service, operation, data, prefix,
+                                 base_name, index, filepath, timings, digest)
+        except Exception:
+            self._release_claim(base_name, index, filepath)
+            raise
+
+    def _discard_queued(self, service, operation, data, prefix, base_name,
+                        index, filepath, *args):
+        self._release_claim(base_name, index, filepath)
+
+    def _release_claim(self, base_name, index, filepath):
+        """
+        Remove the file claimed by ``_reserve_response`` for a response
+        that couldn't be written, so that it isn't left empty.
+        """
+        if self.record_format not in Format.FILE_FORMATS:
+            return
+        with self._get_lock(base_name):
+            self._dir_index.remove_entry(base_name, index, filepath)
+        try:
+            os.remove(filepath)
+        except FileNotFoundError:
+            pass
+
+    def _write_response(self, service, operation, data, prefix, base_name,
+                        index, filepath, timings=None, digest=None):
         LOG.debug('save_response: path=%s', filepath)
-        data = {'status_code': http_response,
-                'data': response_data}
-        with open(filepath, Format.write_mode(self.record_format)) as fp:
-            self._serializer(data, fp)
+        if timings is not None:
+            start = time.perf_counter()
+        if self.record_format == Format.JSON_SHAPE:
+            data = self._encode_shape(service, operation, data)
+        if self.record_format == Format.BUNDLE:
+            self._bundle.append(base_name, index, data)
+        elif self.record_format == Format.SQLITE:
+            # The database allocates the sequence number itself so that
+            # it is consistent with other writers.
+            index = self._sqlite.append(prefix, service, operation, data)
+            self._dir_index.add_entry(
+                base_name, index, filepath, self.record_format)
+        elif self._content_store is not None:
+            name = self._content_store.put(
+                self._serializer, Format.write_mode(self.record_format),
+                self._extension, data)
+            write_pointer(filepath, self._content_store, name)
+        else:
+            # Write to a temporary file and rename it into place so that
+            # readers never see a partially written response.
+            tmp_path = os.path.join(
+                os.path.dirname(filepath), '.{0}.{1}.tmp'.format(
+                    os.path.basename(filepath), self._uuid))
+            try:
+                with open(tmp_path,
+                          Format.write_mode(self.record_format)) as fp:
+                    if timings is None:
+                        self._serializer(data, fp)
+                    else:
+                        self._timed_serialize(data, fp, timings)
+                os.replace(tmp_path, filepath)
+            except Exception:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+        if digest is not None:
+            self._params.add(base_name, index, digest)
+        if timings is not None:
+            timings['records'] = 1
+            timings['io_seconds'] = (time.perf_counter() - start -
+                                     timings.get('serialize_seconds', 0))
+            if self.record_format == Format.SQLITE:
+                timings['index'] = index
+            if self._stats is not None:
+                self._stats.add(service, operation, timings)
+
+    def _encode_shape(self, service, operation, data):
+        # Store timestamps and blobs as plain strings, along with what is
+        # needed to find the output shape that says which members they
+        # are in.
+        description = self._shapes.describe(service, operation)
+        data = dict(data, shape=description)
+        if description is not None:
+            encode = self._shapes.get_codec(description).encode
+            if 'pages' in data:
+                data['pages'] = [dict(page, data=encode(page['data']))
+                                 for page in data['pages']]
+            else:
+                data['data'] = encode(data['data'])
+        return data
+
+    def _decode_shape(self, response_data):
+        description = response_data.pop('shape', None)
+        decode = revive
+        if description is not None:
+            codec = self._shapes.get_codec(description)
+            if codec is not None:
+                decode = codec.decode
+        for page in response_data.get('pages', [response_data]):
+            page['data'] = decode(page['data'])
+        return response_data
+
+    def _timed_serialize(self, data, fp, timings):
+        # Serialize to memory first so that the time taken to serialize
+        # can be told apart from the time taken to write the file.
+        start = time.perf_counter()
+        if 'b' in Format.write_mode(self.record_format):
+            buf = io.BytesIO()
+            self._serializer(data, buf)
+            payload = buf.getvalue()
+            timings['bytes_written'] = len(payload)
+        else:
+            buf = io.StringIO()
+            self._serializer(data, buf)
+            payload = buf.getvalue()
+            timings['bytes_written'] = len(payload.encode('utf-8'))
+        timings['serialize_seconds'] = time.perf_counter() - start
+        fp.write(payload)
+
+    @staticmethod
+    def _timed_deserialize(path, read_mode, deserializer, timings):
+        with open(path, read_mode) as fp:
+            content = fp.read()
+            timings['bytes_read'] = os.fstat(fp.fileno()).st_size
+        start = time.perf_counter()
+        if 'b' in read_mode:
+            response_data = deserializer(io.BytesIO(content))
+        else:
+            response_data = deserializer(io.StringIO(content))
+        timings['deserialize_seconds'] = time.perf_counter() - start
+        return response_data
 
     def load_response(self, service, operation):
+        return self._load_response(service, operation, self._new_timings())
+
+    def _load_response(self, service, operation, timings, digest=None,
+                       page_token=ANY_PAGE):
         LOG.debug('load_response: %s.%s', service, operation)
-        (response_file, file_format) = self.get_next_file_path(
-            service, operation)
-        LOG.debug('load_responses: %s', response_file)
-        with open(response_file, Format.read_mode(file_format)) as fp:
-            response_data = get_deserializer(file_format)(fp)
+        if self._pending_pages:
+            page = self._next_page(service, operation, page_token)
+            if page is not None:
+                return self._serve_page(service, operation, timings, *page)
+        entry = self._locate_response(service, operation, timings, digest)
+        return self._play_response(service, operation, timings, entry[0],
+                                   *self._fetch_response(entry, timings))
+
+    def _locate_response(self, service, operation, timings, digest=None):
+        """
+        Choose the next response to play back.  Returns a tuple of its
+        base name, index, file and format.
+        """
+        if timings is not None:
+            start = time.perf_counter()
+        entry = self._get_next_response(service, operation, timings, digest)
+        LOG.debug('load_responses: %s', entry[2])
+        if self._usage is not None:
+            self._usage.add(entry[0], entry[1])
+        if timings is not None:
+            timings['path_seconds'] = time.perf_counter() - start
+            timings['index'] = entry[1]
+            timings['path'] = entry[2]
+        return entry
+
+    def _fetch_response(self, entry, timings=None):
+        """
+        Read the response chosen by ``_locate_response``.  Returns a
+        tuple of the response and the directory its sidecar files are in.
+        """
+        base_name, index, response_file, file_format = entry
+        if (self._snapshot is not None and
+                (base_name, index) in self._snapshot):
+            if timings is not None:
+                start = time.perf_counter()
+            response = self._snapshot.get(base_name, index)
+            if timings is not None:
+                timings['deserialize_seconds'] = time.perf_counter() - start
+            return response
+        return self._read_response(
+            base_name, index, response_file, file_format, timings)
+
+    def _play_response(self, service, operation, timings, base_name,
+                       response_data, sidecar_path):
+        if 'pages' in response_data:
+            # Play back the first page of the run now, and the rest as
+            # they are requested.
+            pages = deque(response_data['pages'])
+            response_data = pages.popleft()
+            with self._get_lock(base_name):
+                self._pending_pages[base_name] = (pages, sidecar_path)
+        return self._serve_page(service, operation, timings, response_data,
+                                sidecar_path)
+
+    def _next_page(self, service, operation, page_token):
+        """
+        Return the next page of the run being played back for an
+        operation, with the directory its sidecar files are in, or None
+        if the request isn't for the next page of a run.
+        """
+        base_name = self._get_base_name(service, operation)
+        with self._get_lock(base_name):
+            pending = self._pending_pages.get(base_name)
+            if pending is None:
+                return None
+            pages, sidecar_path = pending
+            if (page_token is not ANY_PAGE and
+                    page_token != pages[0]['token']):
+                # Not the page the run continues with, so the caller has
+                # started over or moved on to another run.
+                del self._pending_pages[base_name]
+                return None
+            page = pages.popleft()
+            if not pages:
+                del self._pending_pages[base_name]
+        return page, sidecar_path
+
+    def _serve_page(self, service, operation, timings, response_data,
+                    sidecar_path):
+        if 'sidecars' in response_data:
+            resolve_bodies(response_data, sidecar_path)
+        if timings is not None:
+            timings['playbacks'] = 1
+            if self._stats is not None:
+                self._stats.add(service, operation, timings)
         return (FakeHttpResponse(response_data['status_code']),
                 response_data['data'])
 
+    def _read_response(self, base_name, index, response_file, file_format,
+                       timings=None):
+        """
+        Read a stored response.  Returns a tuple of the response and the
+        directory its sidecar files are in.
+        """
+        if timings is not None:
+            start = time.perf_counter()
+        sidecar_path = self._data_path
+        if file_format == Format.REF:
+            # Identical responses share an object in the content store, and
+            # the cache, so they are only parsed once.
+            store, response_file = read_pointer(response_file)
+            file_format = os.path.basename(response_file).split('.', 1)[1]
+            sidecar_path = store.path
+        cache_key = response_file
+        if file_format in (Format.BUNDLE, Format.SQLITE):
+            cache_key = '{0}#{1}_{2}'.format(response_file, base_name, index)
+        response_data = None
+        if self._cache is not None:
+            response_data = self._cache.get(response_file, cache_key)
+        if response_data is None:
+            if file_format == Format.BUNDLE:
+                response_data = self._bundle.read(base_name, index)
+            elif file_format == Format.SQLITE:
+                response_data = self._sqlite.read_entry(base_name, index)
+            else:
+                if file_format == self._extension:
+                    # Files in the format being recorded are read with
+                    # its own deserializer, which may be faster than the
+                    # default one for the extension.
+                    read_mode = Format.read_mode(self.record_format)
+                    deserializer = self._deserializer
+                else:
+                    read_mode = Format.read_mode(file_format)
+                    deserializer = get_deserializer(file_format)
+                if timings is None:
+                    with open(response_file, read_mode) as fp:
+                        response_data = deserializer(fp)
+                else:
+                    response_data = self._timed_deserialize(
+                        response_file, read_mode, deserializer, timings)
+                if file_format == self._shape_extension:
+                    response_data = self._decode_shape(response_data)
+            if self._cache is not None:
+                self._cache.put(response_file, response_data, cache_key)
+        if timings is not None:
+            timings['io_seconds'] = (time.perf_counter() - start -
+                                     timings.get('deserialize_seconds', 0))
+        return response_data, sidecar_path
+
     def _mock_request(self, **kwargs):
         """
         A mocked out make_request call that bypasses all network calls
         and simply returns any mocked responses defined.
         """
-        model = kwargs.get('model')
+        service, operation, args = self._request_args(**kwargs)
+        if self._tracer is None:
+            return self._load_response(
+                service, operation, self._new_timings(), *args)
+        start = time.perf_counter()
+        timings = self._new_timings()
+        response = self._load_response(service, operation, timings, *args)
+        self._tracer.span('playback', service, operation, start,
+                          time.perf_counter(), timings)
+        return response
+
+    def _request_args(self, model, context=None, **kwargs):
+        """
+        Returns the service and operation of a request being played back,
+        along with the parameters hash and page token to choose its
+        response by.
+        """
         service = model.service_model.endpoint_prefix
         operation = model.name
         LOG.debug('_make_request: %s.%s', service, operation)
-        return self.load_response(service, operation)
+        self._shapes.remember(model)
+        context = context or {}
+        digest = None
+        if self._params is not None:
+            digest = context.get(PARAMS_HASH_KEY)
+        page_token = ANY_PAGE
+        if self._pages is not None:
+            page_token = context.get(PAGE_TOKEN_KEY)
+        return service, operation, (digest, page_token)
@@ -12,7 +12,11 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import io
+import bz2
+import gzip
 import json
+import lzma
 import pickle
 import datetime
 import base64
@@ -20,6 +24,19 @@ from io import BytesIO
 
 from botocore.response import StreamingBody
 
+from placebo.sidecar import SidecarBody
+from placebo.streams import Base64Body, check_sync_body
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
 
 class UTC(datetime.tzinfo):
     """UTC"""
@@ -41,17 +58,62 @@ class Format:
     Serialization formats
     """
     JSON = "json"
+    JSON_COMPACT = "json-compact"
+    # JSON with timestamps and blobs converted using the operation's
+    # output shape
+    JSON_SHAPE = "json-shape"
+    ORJSON = "orjson"
+    UJSON = "ujson"
     PICKLE = "pickle"
+    JSON_GZ = "json.gz"
+    JSON_XZ = "json.xz"
+    JSON_BZ2 = "json.bz2"
+    PICKLE_GZ = "pickle.gz"
+    PICKLE_XZ = "pickle.xz"
+    PICKLE_BZ2 = "pickle.bz2"
+    BUNDLE = "bundle"
+    SQLITE = "sqlite"
+    # Pointer files referring to responses in a content store
+    REF = "ref"
 
     DEFAULT = JSON
-    ALLOWED = [JSON, PICKLE]
+    # Formats that store one response per file.  These are filled in by
+    # register_format.
+    FILE_FORMATS = []
+    # Formats that store all responses for a data path in a single file
+    CONTAINER_FORMATS = [BUNDLE, SQLITE]
+    ALLOWED = list(CONTAINER_FORMATS)
+
+    @classmethod
+    def extension(cls, format):
+        """
+        Return the file extension used for this format.
+        """
+        if format in _FORMATS:
+            return _FORMATS[format].extension
+        return format
+
+    @classmethod
+    def extensions(cls):
+        """
+        Return the file extensions of all per-file formats, in order of
+        preference.
+        """
+        extensions = []
+        for format in cls.FILE_FORMATS:
+            extension = _FORMATS[format].extension
+            if extension not in extensions:
+                extensions.append(extension)
+        return extensions
 
     @classmethod
     def read_mode(cls, format):
         """
         Return the correct read mode for this type of format.
         """
-        if format == cls.PICKLE:
+        if format in _FORMATS:
+            return _FORMATS[format].read_mode
+        elif format == cls.BUNDLE:
             return 'rb'
         else:
             return 'r'
@@ -61,12 +123,73 @@ class Format:
         """
         Return the correct write mode for this type of format.
         """
-        if format == cls.PICKLE:
-            return 'wb'
+        if format in _FORMATS:
+            return _FORMATS[format].write_mode
+        elif format == cls.BUNDLE:
+            return 'ab'
         else:
             return 'w'
 
 
+class Compression:
+    """
+    Compression codecs for compressed formats
+    """
+    GZIP = "gz"
+    LZMA = "xz"
+    BZIP2 = "bz2"
+
+    ALLOWED = [GZIP, LZMA, BZIP2]
+    DEFAULT_LEVELS = {GZIP: 6, LZMA: 6, BZIP2: 9}
+
+
+class SerializationFormat(object):
+    """
+    A registered per-file serialization format.
+    """
+
+    def __init__(self, name, serializer, deserializer, extension,
+                 read_mode, write_mode, base=None, compression=None):
+        self.name = name
+        self.serializer = serializer
+        self.deserializer = deserializer
+        self.extension = extension
+        self.read_mode = read_mode
+        self.write_mode = write_mode
+        self.base = base
+        self.compression = compression
+
+
+_FORMATS = {}
+
+
+def register_format(name, serializer, deserializer, extension=None,
+                    read_mode='r', write_mode='w', base=None,
+                    compression=None):
+    """
+    Register a format that stores one response per file.
+
+    ``serializer`` is called with the response and an open file and
+    ``deserializer`` with an open file, which is opened with
+    ``read_mode`` or ``write_mode``.  Response files are named with
+    ``extension``, which defaults to the name of the format.  Several
+    formats can share an extension, in which case files with that
+    extension are read by the first format registered with it, unless
+    the reader is recording in one of the others.  Compressed formats
+    record the ``base`` format they compress and their ``compression``
+    codec.
+    """
+    name = name.lower()
+    if name in Format.CONTAINER_FORMATS:
+        raise ValueError('{0} is a reserved format name'.format(name))
+    _FORMATS[name] = SerializationFormat(
+        name, serializer, deserializer, extension or name,
+        read_mode, write_mode, base, compression)
+    if name not in Format.FILE_FORMATS:
+        Format.FILE_FORMATS.append(name)
+        Format.ALLOWED.insert(len(Format.FILE_FORMATS) - 1, name)
+
+
 def deserialize(obj):
     """Convert JSON dicts back into objects."""
     # Be careful of shallow copy here
@@ -79,16 +202,24 @@ def deserialize(obj):
     # Use getattr(module, class_name) for custom types if needed
     if class_name == 'datetime':
         return datetime.datetime(tzinfo=utc, **target)
+    if class_name == 'StreamingBody' and 'sidecar' in obj:
+        return SidecarBody(obj['sidecar'], obj['length'], obj['sha256'])
     if class_name == 'StreamingBody':
-        b64_body = obj['body']
-        decoded_body = base64.b64decode(b64_body)
-        return BytesIO(decoded_body)
+        # The body is decoded as it is read rather than all at once
+        return Base64Body(obj['body'])
     # Return unrecognized structures as-is
     return obj
 
 
 def serialize(obj):
     """Convert objects into JSON structures."""
+    if isinstance(obj, SidecarBody):
+        # Bodies stored in a sidecar file are played back as a
+        # StreamingBody just like inline ones.
+        return {'__class__': 'StreamingBody',
+                '__module__': 'botocore.response',
+                'sidecar': obj.name, 'length': obj.length,
+                'sha256': obj.sha256}
     # Record class and module information for deserialization
     result = {'__class__': obj.__class__.__name__}
     try:
@@ -96,8 +227,6 @@ def serialize(obj):
     except AttributeError:
         pass
     # Convert objects to dictionary representation based on type
-    print('+++++ %s' % obj)
-    print('+++++ %s' % type(obj))
     if isinstance(obj, datetime.datetime):
         result['year'] = obj.year
         result['month'] = obj.month
@@ -108,6 +237,7 @@ def serialize(obj):
         result['microsecond'] = obj.microsecond
         return result
     if isinstance(obj, StreamingBody):
+        check_sync_body(obj)
         result['body'] = obj.read()
         obj._raw_stream = BytesIO(result['body'])
         obj._amount_read = 0
@@ -115,10 +245,42 @@ def serialize(obj):
     if isinstance(obj, bytes):
         encoded = base64.b64encode(obj)
         return encoded.decode('utf-8')
+    check_sync_body(obj)
     # Raise a TypeError if the object isn't recognized
     raise TypeError("Type not serializable")
 
 
+def _decode(obj):
+    """
+    Apply ``deserialize`` to every dict in a decoded JSON document,
+    innermost first, the way the ``object_hook`` of ``json.load`` does.
+    """
+    if isinstance(obj, dict):
+        for key, value in obj.items():
+            if isinstance(value, (dict, list)):
+                obj[key] = _decode(value)
+        return deserialize(obj)
+    if isinstance(obj, list):
+        for i, value in enumerate(obj):
+            if isinstance(value, (dict, list)):
+                obj[i] = _decode(value)
+    return obj
+
+
+def _encode(obj):
+    """
+    Convert ``obj`` to plain JSON types, using ``serialize`` for anything
+    else.
+    """
+    if isinstance(obj, dict):
+        return {key: _encode(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_encode(value) for value in obj]
+    if obj is None or isinstance(obj, (str, int, float)):
+        return obj
+    return _encode(serialize(obj))
+
+
 def _serialize_json(obj, fp):
     """ Serialize ``obj`` as a JSON formatted stream to ``fp`` """
     json.dump(obj, fp, indent=4, default=serialize)
@@ -129,6 +291,50 @@ def _deserialize_json(fp):
     return json.load(fp, object_hook=deserialize)
 
 
+def _serialize_json_compact(obj, fp):
+    """ Serialize ``obj`` as a compact JSON formatted stream to ``fp`` """
+    json.dump(obj, fp, separators=(',', ':'), default=serialize)
+
+
+def _deserialize_json_plain(fp):
+    """ Deserialize ``fp`` JSON content without converting any objects."""
+    return json.load(fp)
+
+
+def _serialize_orjson(obj, fp):
+    """ Serialize ``obj`` as a JSON formatted stream to ``fp`` with orjson """
+    # Let serialize handle datetimes so they round trip like the other
+    # JSON formats.
+    fp.write(orjson.dumps(obj, default=serialize,
+                          option=orjson.OPT_PASSTHROUGH_DATETIME))
+
+
+def _deserialize_orjson(fp):
+    """ Deserialize ``fp`` JSON content to a Python object with orjson."""
+    return _decode(orjson.loads(fp.read()))
+
+
+def _serialize_ujson(obj, fp):
+    """ Serialize ``obj`` as a JSON formatted stream to ``fp`` with ujson """
+    fp.write(ujson.dumps(_encode(obj)))
+
+
+def _deserialize_ujson(fp):
+    """ Deserialize ``fp`` JSON content to a Python object with ujson."""
+    return _decode(ujson.loads(fp.read()))
+
+
+def dumps(obj):
+    """ Serialize ``obj`` to compact JSON encoded as UTF-8 bytes """
+    return json.dumps(
+        obj, default=serialize, separators=(',', ':')).encode('utf-8')
+
+
+def loads(data):
+    """ Deserialize UTF-8 encoded JSON ``data`` to a Python object."""
+    return json.loads(data.decode('utf-8'), object_hook=deserialize)
+
+
 def _serialize_pickle(obj, fp):
     """ Serialize ``obj`` as a PICKLE formatted stream to ``fp`` """
     pickle.dump(obj, fp)
@@ -139,17 +345,112 @@ def _deserialize_pickle(fp):
     return pickle.load(fp)
 
 
-def get_serializer(serializer_format):
-    """ Get the serializer for a specific format """
-    if serializer_format == Format.JSON:
-        return _serialize_json
-    if serializer_format == Format.PICKLE:
-        return _serialize_pickle
+def _open_compressed(fp, compression, mode, level=None):
+    if compression == Compression.GZIP:
+        # Without a name or timestamp in the header, the same response
+        # always compresses to the same bytes.
+        return gzip.GzipFile(filename='', fileobj=fp, mode=mode, mtime=0,
+                             compresslevel=9 if level is None else level)
+    if compression == Compression.LZMA:
+        preset = level if 'w' in mode else None
+        return lzma.LZMAFile(fp, mode, preset=preset)
+    if compression == Compression.BZIP2:
+        return bz2.BZ2File(fp, mode, compresslevel=level or 9)
+    raise ValueError('unknown compression: {0}'.format(compression))
+
+
+def compress_serializer(serializer, compression, level=None, text=True):
+    """
+    Wrap ``serializer`` so that it writes through the ``compression``
+    codec.  ``text`` serializers are given a UTF-8 text stream.
+    """
+    if level is None:
+        level = Compression.DEFAULT_LEVELS[compression]
+
+    def _serialize(obj, fp):
+        with _open_compressed(fp, compression, 'wb', level) as cfp:
+            if text:
+                with io.TextIOWrapper(cfp, encoding='utf-8') as tfp:
+                    serializer(obj, tfp)
+            else:
+                serializer(obj, cfp)
+    return _serialize
+
+
+def decompress_deserializer(deserializer, compression, text=True):
+    """
+    Wrap ``deserializer`` so that it reads through the ``compression``
+    codec.  The data is decompressed as it is read.
+    """
+    def _deserialize(fp):
+        with _open_compressed(fp, compression, 'rb') as cfp:
+            if text:
+                return deserializer(io.TextIOWrapper(cfp, encoding='utf-8'))
+            return deserializer(cfp)
+    return _deserialize
+
+
+def register_compressed_format(base, compression):
+    """
+    Register a compressed variant of the ``base`` format, named and with
+    the extension ``<base>.<compression>``.
+    """
+    entry = _FORMATS[base]
+    text = 'b' not in entry.write_mode
+    name = '{0}.{1}'.format(base, compression)
+    register_format(
+        name, compress_serializer(entry.serializer, compression, text=text),
+        decompress_deserializer(entry.deserializer, compression, text=text),
+        extension='{0}.{1}'.format(entry.extension, compression),
+        read_mode='rb', write_mode='wb', base=base, compression=compression)
+
+
+def _get_format(serializer_format):
+    if serializer_format in _FORMATS:
+        return _FORMATS[serializer_format]
+    # Fall back to the first format that uses this as its extension
+    for name in Format.FILE_FORMATS:
+        if _FORMATS[name].extension == serializer_format:
+            return _FORMATS[name]
+    return None
+
+
+def get_serializer(serializer_format, compression_level=None):
+    """
+    Get the serializer for a specific format.  ``compression_level``
+    overrides the default level of compressed formats.
+    """
+    entry = _get_format(serializer_format)
+    if entry is None:
+        return None
+    if entry.compression and compression_level is not None:
+        base = _FORMATS[entry.base]
+        return compress_serializer(
+            base.serializer, entry.compression, compression_level,
+            text='b' not in base.write_mode)
+    return entry.serializer
 
 
 def get_deserializer(serializer_format):
     """ Get the deserializer for a specific format """
-    if serializer_format == Format.JSON:
-        return _deserialize_json
-    if serializer_format == Format.PICKLE:
-        return _deserialize_pickle
+    entry = _get_format(serializer_format)
+    if entry is not None:
+        return entry.deserializer
+
+
+register_format(Format.JSON, _serialize_json, _deserialize_json)
+register_format(Format.PICKLE, _serialize_pickle, _deserialize_pickle,
+                read_mode='rb', write_mode='wb')
+register_format(Format.JSON_COMPACT, _serialize_json_compact,
+                _deserialize_json, extension='json')
+register_format(Format.JSON_SHAPE, _serialize_json, _deserialize_json_plain,
+                extension='shape.json')
+if orjson is not None:
+    register_format(Format.ORJSON, _serialize_orjson, _deserialize_orjson,
+                    extension='json', read_mode='rb', write_mode='wb')
+if ujson is not None:
+    register_format(Format.UJSON, _serialize_ujson, _deserialize_ujson,
+                    extension='json')
+for _base in (Format.JSON, Format.PICKLE):
+    for _compression in Compression.ALLOWED:
+        register_compressed_format(_base, _compression)
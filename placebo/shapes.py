@@ -0,0 +1,289 @@
+# Copyright (c) 2015-2019 Mitch Garnaat
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import base64
+import logging
+import datetime
+import threading
+from io import BytesIO
+
+from botocore.loaders import create_loader
+from botocore.model import ServiceModel
+from botocore.response import StreamingBody
+
+from placebo.serializer import deserialize, serialize, utc
+from placebo.sidecar import SidecarBody
+from placebo.streams import Base64Body
+
+LOG = logging.getLogger(__name__)
+
+TIMESTAMP_FORMAT = '%Y-%m-%dT%H:%M:%S.%f+00:00'
+
+try:
+    _fromisoformat = datetime.datetime.fromisoformat
+except AttributeError:
+    def _fromisoformat(value):
+        return datetime.datetime.strptime(
+            value[:-6], TIMESTAMP_FORMAT[:-6]).replace(tzinfo=utc)
+
+
+def revive(obj):
+    """
+    Convert the objects in a response that was saved without a known
+    output shape, the same way the JSON format does as it loads them.
+    """
+    if isinstance(obj, dict):
+        for k, v in obj.items():
+            if isinstance(v, (dict, list)):
+                obj[k] = revive(v)
+        if '__class__' in obj:
+            return deserialize(obj)
+    elif isinstance(obj, list):
+        for i, v in enumerate(obj):
+            if isinstance(v, (dict, list)):
+                obj[i] = revive(v)
+    return obj
+
+
+class ShapeCodec(object):
+    """
+    Converts the timestamp and blob members of a response to and from
+    plain JSON values, using the operation's output shape.
+
+    Which members of each shape hold timestamps or blobs, directly or
+    further down, is worked out once per shape, so only those parts of a
+    response are visited.
+    """
+
+    def __init__(self, output_shape):
+        self._output_shape = output_shape
+        self._plans = {}
+        self._decoders = {}
+
+    def _plan(self, shape):
+        """
+        Return what needs converting in values of ``shape``: for a
+        structure, the members; for a list, its member; for a map, its
+        value; for a timestamp or blob, the shape itself.  Returns None
+        if nothing does.
+        """
+        name = shape.name
+        if name in self._plans:
+            return self._plans[name]
+        # Recursive shapes refer back to themselves, so assume this one
+        # needs converting while it is being worked out.  At worst that
+        # means visiting a member for nothing.
+        self._plans[name] = shape
+        type_name = shape.type_name
+        if type_name in ('timestamp', 'blob'):
+            plan = shape
+        elif type_name == 'structure':
+            plan = tuple((member_name, member) for member_name, member
+                         in shape.members.items()
+                         if self._plan(member) is not None) or None
+        elif type_name == 'list':
+            plan = (shape.member if self._plan(shape.member) is not None
+                    else None)
+        elif type_name == 'map':
+            plan = (shape.value if self._plan(shape.value) is not None
+                    else None)
+        else:
+            plan = None
+        self._plans[name] = plan
+        return plan
+
+    def encode(self, data):
+        """
+        Return a copy of ``data`` with timestamps and blobs replaced by
+        strings.  Only containers that hold them are copied.
+        """
+        if self._output_shape is None:
+            return data
+        return self._encode(data, self._output_shape)
+
+    def _encode(self, value, shape):
+        plan = self._plan(shape)
+        if plan is None or value is None:
+            return value
+        type_name = shape.type_name
+        if type_name == 'structure':
+            value = dict(value)
+            for member_name, member in plan:
+                if member_name in value:
+                    value[member_name] = self._encode(
+                        value[member_name], member)
+            return value
+        if type_name == 'list':
+            return [self._encode(v, plan) for v in value]
+        if type_name == 'map':
+            return dict((k, self._encode(v, plan)) for k, v in value.items())
+        if isinstance(value, datetime.datetime):
+            if value.tzinfo is not None:
+                value = value.astimezone(utc)
+            return value.strftime(TIMESTAMP_FORMAT)
+        if isinstance(value, StreamingBody):
+            body = value.read()
+            value._raw_stream = BytesIO(body)
+            value._amount_read = 0
+            return base64.b64encode(body).decode('ascii')
+        if isinstance(value, (bytes, bytearray)):
+            return base64.b64encode(value).decode('ascii')
+        if isinstance(value, SidecarBody):
+            return serialize(value)
+        return value
+
+    def decode(self, data):
+        """
+        Convert the timestamp and blob members of freshly loaded ``data``
+        back into objects, in place.
+        """
+        if self._output_shape is None:
+            return data
+        decoder = self._decoder(self._output_shape)
+        return data if decoder is None else decoder(data)
+
+    def _decoder(self, shape):
+        """
+        Return a function that converts values of ``shape``, or None if
+        there is nothing to convert.  Decoders are built once per shape
+        so loading a response doesn't have to look at the shapes again.
+        """
+        name = shape.name
+        if name in self._decoders:
+            return self._decoders[name]
+        if self._plan(shape) is None:
+            self._decoders[name] = None
+            return None
+        # A recursive shape refers to its own decoder before it is built
+        self._decoders[name] = lambda value: self._decoders[name](value)
+        type_name = shape.type_name
+        if type_name == 'structure':
+            members = [(member_name, self._decoder(member))
+                       for member_name, member in self._plan(shape)]
+            members = [(n, d) for n, d in members if d is not None]
+
+            def decoder(value):
+                for member_name, decode in members:
+                    member = value.get(member_name)
+                    if member is not None:
+                        value[member_name] = decode(member)
+                return value
+        elif type_name == 'list':
+            decode = self._decoder(shape.member)
+
+            def decoder(value):
+                return [decode(v) for v in value]
+        elif type_name == 'map':
+            decode = self._decoder(shape.value)
+
+            def decoder(value):
+                return dict((k, decode(v)) for k, v in value.items())
+        elif type_name == 'timestamp':
+            decoder = _fromisoformat
+        elif shape.serialization.get('streaming'):
+            def decoder(value):
+                if isinstance(value, dict):
+                    return _sidecar(value)
+                return Base64Body(value)
+        else:
+            def decoder(value):
+                if isinstance(value, dict):
+                    return _sidecar(value)
+                return base64.b64decode(value)
+        self._decoders[name] = decoder
+        return decoder
+
+
+def _sidecar(value):
+    return SidecarBody(value['sidecar'], value['length'], value['sha256'])
+
+
+class ShapeCache(object):
+    """
+    Codecs for the operations a Pill has seen, keyed on service name,
+    API version and operation name.
+
+    Models are remembered as clients call operations.  Responses saved
+    or loaded without a client fall back to loading the model with
+    botocore's loader.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._codecs = {}
+        self._descriptions = {}
+        self._loader = None
+
+    def remember(self, model):
+        """
+        Remember the operation ``model`` of a client call.
+        """
+        service_model = model.service_model
+        key = (service_model.endpoint_prefix, model.name)
+        if key not in self._descriptions:
+            description = {'service': service_model.service_name,
+                           'api_version': service_model.api_version,
+                           'operation': model.name}
+            with self._lock:
+                self._descriptions[key] = description
+                self._codecs[self._key(description)] = ShapeCodec(
+                    model.output_shape)
+
+    def describe(self, service, operation):
+        """
+        Return a description of the output shape of an operation, or
+        None if it isn't known.
+        """
+        key = (service, operation)
+        description = self._descriptions.get(key)
+        if description is None:
+            description = {'service': service, 'api_version': None,
+                           'operation': operation}
+            if self.get_codec(description) is None:
+                return None
+            self._descriptions[key] = description
+        return description
+
+    @staticmethod
+    def _key(description):
+        return (description['service'], description['api_version'],
+                description['operation'])
+
+    def get_codec(self, description):
+        """
+        Return the codec for a description from ``describe``, or None if
+        the model can't be found.
+        """
+        key = self._key(description)
+        codec = self._codecs.get(key)
+        if codec is None and key not in self._codecs:
+            codec = self._load_codec(*key)
+            with self._lock:
+                self._codecs[key] = codec
+        return codec
+
+    def _load_codec(self, service, api_version, operation):
+        if self._loader is None:
+            self._loader = create_loader()
+        try:
+            service_model = ServiceModel(
+                self._loader.load_service_model(
+                    service, 'service-2', api_version),
+                service_name=service)
+            return ShapeCodec(
+                service_model.operation_model(operation).output_shape)
+        except Exception:
+            LOG.warning('no model found for %s.%s (%s)', service,
+                        operation, api_version)
+            return None
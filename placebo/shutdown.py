@@ -0,0 +1,35 @@
+# Copyright (c) 2015-2019 Mitch Garnaat
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import atexit
+import weakref
+
+
+def call_at_exit(obj, name):
+    """
+    Call the method ``name`` of ``obj`` at interpreter exit, if ``obj``
+    is still alive then.  Only a weak reference to ``obj`` is kept, so
+    it can still be garbage collected, and the hook is unregistered when
+    it is.  Returns the hook, to pass to ``atexit.unregister``.
+    """
+    ref = weakref.ref(obj)
+
+    def hook():
+        target = ref()
+        if target is not None:
+            getattr(target, name)()
+
+    atexit.register(hook)
+    weakref.finalize(obj, atexit.unregister, hook)
+    return hook
@@ -0,0 +1,119 @@
+# Copyright (c) 2015-2019 Mitch Garnaat
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import uuid
+import hashlib
+import logging
+
+from botocore.response import StreamingBody
+
+from placebo.streams import FileBody, check_sync_body
+
+LOG = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1024 * 1024
+SIDECAR_SUFFIX = '.body'
+
+
+class SidecarBody(object):
+    """
+    A reference to a StreamingBody payload stored in a sidecar file in
+    the data directory, named by the SHA-256 of its contents.
+    """
+
+    def __init__(self, name, length, sha256):
+        self.name = name
+        self.length = length
+        self.sha256 = sha256
+
+    def __eq__(self, other):
+        return (isinstance(other, SidecarBody) and
+                (self.name, self.length, self.sha256) ==
+                (other.name, other.length, other.sha256))
+
+    def __repr__(self):
+        return 'SidecarBody({0!r}, {1!r}, {2!r})'.format(
+            self.name, self.length, self.sha256)
+
+
+def tee_body(body, data_path):
+    """
+    Copy the contents of a StreamingBody to a sidecar file in chunks and
+    point the StreamingBody at that file so it can still be read from
+    the start.  The file isn't opened again until the body is read.
+    Returns a SidecarBody referring to the file.
+    """
+    tmp_path = os.path.join(
+        data_path, '.{0}{1}.tmp'.format(uuid.uuid4(), SIDECAR_SUFFIX))
+    sha256 = hashlib.sha256()
+    length = 0
+    try:
+        with open(tmp_path, 'wb') as fp:
+            for chunk in iter(lambda: body.read(CHUNK_SIZE), b''):
+                sha256.update(chunk)
+                fp.write(chunk)
+                length += len(chunk)
+        name = sha256.hexdigest() + SIDECAR_SUFFIX
+        os.replace(tmp_path, os.path.join(data_path, name))
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    LOG.debug('wrote %d byte body to %s', length, name)
+    body.close()
+    body._raw_stream = FileBody(os.path.join(data_path, name), length)
+    body._amount_read = 0
+    return SidecarBody(name, length, sha256.hexdigest())
+
+
+def detach_bodies(obj, data_path, threshold, sidecars):
+    """
+    Return a copy of ``obj`` with every StreamingBody of at least
+    ``threshold`` bytes written to a sidecar file and replaced by a
+    SidecarBody.  Bodies of unknown length are always written out.  The
+    names of the sidecar files are appended to ``sidecars``.
+    """
+    if isinstance(obj, dict):
+        return {k: detach_bodies(v, data_path, threshold, sidecars)
+                for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [detach_bodies(v, data_path, threshold, sidecars)
+                for v in obj]
+    if isinstance(obj, StreamingBody):
+        check_sync_body(obj)
+        length = obj._content_length
+        if length is None or int(length) >= threshold:
+            ref = tee_body(obj, data_path)
+            sidecars.append(ref.name)
+            return ref
+    return obj
+
+
+def resolve_bodies(obj, data_path):
+    """
+    Replace every SidecarBody in ``obj`` with a stream of its contents.
+    The sidecar file isn't opened until the stream is read.
+    """
+    if isinstance(obj, dict):
+        for k, v in obj.items():
+            if isinstance(v, (dict, list, SidecarBody)):
+                obj[k] = resolve_bodies(v, data_path)
+    elif isinstance(obj, list):
+        for i, v in enumerate(obj):
+            if isinstance(v, (dict, list, SidecarBody)):
+                obj[i] = resolve_bodies(v, data_path)
+    elif isinstance(obj, SidecarBody):
+        return FileBody(os.path.join(data_path, obj.name), obj.length)
+    return obj
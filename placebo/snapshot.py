@@ -0,0 +1,253 @@
+# Copyright (c) 2015-2019 Mitch Garnaat
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import sys
+import mmap
+import uuid
+import pickle
+import struct
+import hashlib
+import logging
+import argparse
+import tempfile
+import contextlib
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+LOG = logging.getLogger(__name__)
+
+SNAPSHOT_NAME = 'placebo.snapshot'
+SNAPSHOT_VERSION = 2
+SNAPSHOT_MAGIC = b'PLACEBO\x00'
+# Magic, version and the length of the pickled offset index
+HEADER = struct.Struct('<8sIQ')
+
+
+def get_snapshot_path(data_path):
+    return os.path.join(data_path, SNAPSHOT_NAME)
+
+
+class Snapshot(object):
+    """
+    Every response in a data directory, already deserialized, in a
+    single file.
+
+    Each response is kept as its own pickle so that playing it back
+    returns a fresh copy which the caller is free to mutate.
+    """
+
+    def __init__(self, data_path, entries):
+        self._data_path = data_path
+        self._entries = entries
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def keys(self):
+        return self._entries.keys()
+
+    def get(self, base_name, index):
+        """
+        Returns a tuple of the response and the directory its sidecar
+        files are in.
+        """
+        entry = self._entries[(base_name, index)]
+        return (pickle.loads(self._blob(entry)),
+                os.path.normpath(os.path.join(self._data_path, entry[-1])))
+
+    def _blob(self, entry):
+        return entry[0]
+
+    def close(self):
+        pass
+
+
+class MappedSnapshot(Snapshot):
+    """
+    A snapshot file mapped into memory.
+
+    Only the offset index is read into each process; responses are
+    decoded straight from the mapping, so any number of processes
+    playing back the same snapshot share a single copy of it.
+    """
+
+    def __init__(self, data_path, entries, buf):
+        super(MappedSnapshot, self).__init__(data_path, entries)
+        self._buf = buf
+
+    def _blob(self, entry):
+        offset, length, _ = entry
+        return self._buf[offset:offset + length]
+
+    def close(self):
+        self._buf.close()
+
+
+def snapshot_entry(data_path, response_data, sidecar_path):
+    """
+    Return the entry a Snapshot keeps for a response and its sidecar
+    directory.
+    """
+    return (pickle.dumps(response_data, pickle.HIGHEST_PROTOCOL),
+            os.path.relpath(sidecar_path, data_path))
+
+
+def write_snapshot(data_path, responses):
+    """
+    Write a snapshot of ``responses``, a dictionary mapping a base name
+    and index to a tuple of the response and its sidecar directory.
+    """
+    blobs = []
+    offsets = {}
+    offset = 0
+    for key, (response_data, sidecar_path) in responses.items():
+        blob, sidecar_path = snapshot_entry(
+            data_path, response_data, sidecar_path)
+        blobs.append(blob)
+        offsets[key] = (offset, len(blob), sidecar_path)
+        offset += len(blob)
+    index = pickle.dumps(offsets, pickle.HIGHEST_PROTOCOL)
+    path = get_snapshot_path(data_path)
+    tmp_path = '{0}.{1}.tmp'.format(path, uuid.uuid4())
+    try:
+        with open(tmp_path, 'wb') as fp:
+            fp.write(HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION,
+                                 len(index)))
+            fp.write(index)
+            for blob in blobs:
+                fp.write(blob)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    LOG.debug('wrote %d responses to %s', len(offsets), path)
+    return path
+
+
+def load_snapshot(data_path, keys, sources):
+    """
+    Load the snapshot for a data directory.  Returns None if there isn't
+    one, or if it is out of date: when it doesn't hold exactly the
+    responses in ``keys`` or any of the ``sources`` has been modified
+    since it was written.
+    """
+    path = get_snapshot_path(data_path)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    for source in sources:
+        try:
+            if os.stat(source).st_mtime_ns > mtime:
+                LOG.info('snapshot is older than %s, ignoring it', source)
+                return None
+        except FileNotFoundError:
+            pass
+    with open(path, 'rb') as fp:
+        header = fp.read(HEADER.size)
+        if len(header) < HEADER.size:
+            LOG.info('snapshot %s is truncated, ignoring it', path)
+            return None
+        magic, version, index_length = HEADER.unpack(header)
+        if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+            LOG.info('snapshot version %s not supported, ignoring it',
+                     version if magic == SNAPSHOT_MAGIC else None)
+            return None
+        entries = pickle.loads(fp.read(index_length))
+        if set(entries) != set(keys):
+            LOG.info('snapshot responses do not match %s, ignoring it',
+                     data_path)
+            return None
+        buf = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+    # Offsets in the index are from the end of the index
+    start = HEADER.size + index_length
+    entries = dict(
+        (key, (start + offset, length, sidecar_path))
+        for key, (offset, length, sidecar_path) in entries.items())
+    LOG.debug('loaded %d responses from %s', len(entries), path)
+    return MappedSnapshot(data_path, entries, buf)
+
+
+@contextlib.contextmanager
+def snapshot_lock(data_path):
+    """
+    Hold an exclusive lock, across processes, on the snapshot for a
+    data directory.  The lock file is kept in the temporary directory so
+    that it doesn't end up alongside the responses.
+    """
+    name = hashlib.sha1(
+        os.path.abspath(data_path).encode('utf-8')).hexdigest()
+    path = os.path.join(tempfile.gettempdir(),
+                        'placebo-{0}.lock'.format(name))
+    with open(path, 'a') as fp:
+        if fcntl is not None:
+            fcntl.flock(fp.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(fp.fileno(), fcntl.LOCK_UN)
+
+
+def compile_data_path(data_path, skip_empty=False, **kwargs):
+    """
+    Write a snapshot for a data directory.  Any keyword arguments are
+    passed to the Pill used to read it.  Returns the number of responses
+    in the snapshot, or None if ``skip_empty`` is set and there are no
+    responses in the directory.
+    """
+    from placebo.pill import Pill
+
+    pill = Pill(**kwargs)
+    pill.open(data_path)
+    try:
+        if skip_empty and not len(pill._dir_index):
+            return None
+        return pill.compile()
+    finally:
+        pill.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='placebo-compile',
+        description='Compile placebo data directories into snapshots for '
+                    'faster playback.')
+    parser.add_argument('paths', nargs='+', metavar='DATA_PATH')
+    parser.add_argument('-r', '--recursive', action='store_true',
+                        help='compile every data directory below each path')
+    args = parser.parse_args(argv)
+    for path in args.paths:
+        if args.recursive:
+            data_paths = sorted(dirpath for dirpath, _, _ in os.walk(path))
+        else:
+            data_paths = [path]
+        for data_path in data_paths:
+            count = compile_data_path(data_path, skip_empty=args.recursive)
+            if count is not None:
+                sys.stdout.write(
+                    '{0}: {1} responses\n'.format(data_path, count))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,145 @@
+# Copyright (c) 2015-2019 Mitch Garnaat
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import sqlite3
+import logging
+import threading
+
+from placebo.index import get_base_name
+from placebo.serializer import dumps, loads
+
+LOG = logging.getLogger(__name__)
+
+DATABASE_NAME = 'placebo.sqlite'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    prefix TEXT NOT NULL,
+    service TEXT NOT NULL,
+    operation TEXT NOT NULL,
+    sequence INTEGER NOT NULL,
+    payload BLOB NOT NULL,
+    PRIMARY KEY (prefix, service, operation, sequence)
+) WITHOUT ROWID
+"""
+
+
+class SQLiteStore(object):
+    """
+    Responses for a data directory stored in a single SQLite database.
+
+    Each response is a row keyed on ``(prefix, service, operation,
+    sequence)`` with the serialized response as a blob.  New sequence
+    numbers are allocated inside a write transaction, so several
+    processes can record into the same database, and the database is
+    put in WAL mode so any number of readers can play it back
+    concurrently.
+    """
+
+    def __init__(self, data_path, timeout=30.0):
+        self.path = os.path.join(data_path, DATABASE_NAME)
+        self._timeout = timeout
+        self._conn = None
+        self._lock = threading.RLock()
+        self._names = {}
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    @property
+    def connection(self):
+        with self._lock:
+            if self._conn is None:
+                self._conn = sqlite3.connect(
+                    self.path, timeout=self._timeout, isolation_level=None,
+                    check_same_thread=False)
+                self._conn.execute('PRAGMA journal_mode=WAL')
+                self._conn.execute(SCHEMA)
+            return self._conn
+
+    def keys(self):
+        """
+        Return the list of ``(base_name, sequence)`` keys in the store.
+        """
+        if not self.exists():
+            return []
+        keys = []
+        with self._lock:
+            cursor = self.connection.execute(
+                'SELECT prefix, service, operation, sequence FROM responses')
+            for prefix, service, operation, sequence in cursor:
+                base_name = get_base_name(prefix, service, operation)
+                self._names[base_name] = (prefix, service, operation)
+                keys.append((base_name, sequence))
+        return keys
+
+    def append(self, prefix, service, operation, data):
+        """
+        Store a response and return the sequence number allocated to it.
+        """
+        payload = dumps(data)
+        prefix = prefix or ''
+        # The connection is shared by every thread using this store, so
+        # the transaction has to be serialized here as well.
+        with self._lock:
+            conn = self.connection
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                (sequence,) = conn.execute(
+                    'SELECT COALESCE(MAX(sequence), 0) + 1 FROM responses '
+                    'WHERE prefix = ? AND service = ? AND operation = ?',
+                    (prefix, service, operation)).fetchone()
+                conn.execute(
+                    'INSERT INTO responses '
+                    '(prefix, service, operation, sequence, payload) '
+                    'VALUES (?, ?, ?, ?, ?)',
+                    (prefix, service, operation, sequence, payload))
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+            conn.execute('COMMIT')
+        LOG.debug('stored %s.%s_%s', service, operation, sequence)
+        self._names[get_base_name(prefix, service, operation)] = (
+            prefix, service, operation)
+        return sequence
+
+    def read(self, prefix, service, operation, sequence):
+        """
+        Return a single response from the store.
+        """
+        with self._lock:
+            row = self.connection.execute(
+                'SELECT payload FROM responses WHERE prefix = ? AND '
+                'service = ? AND operation = ? AND sequence = ?',
+                (prefix or '', service, operation, sequence)).fetchone()
+        if row is None:
+            raise IOError('response {0}_{1} not found in {2}'.format(
+                get_base_name(prefix, service, operation), sequence,
+                self.path))
+        return loads(row[0])
+
+    def read_entry(self, base_name, sequence):
+        """
+        Return a single response from the store by the base name and
+        sequence number returned by ``keys``.
+        """
+        prefix, service, operation = self._names[base_name]
+        return self.read(prefix, service, operation, sequence)
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
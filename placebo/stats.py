@@ -0,0 +1,63 @@
+# Copyright (c) 2015-2019 Mitch Garnaat
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+
+COUNTERS = ('records', 'playbacks', 'bytes_written', 'bytes_read',
+            'path_seconds', 'io_seconds', 'serialize_seconds',
+            'deserialize_seconds', 'wraparounds')
+
+
+class Stats(object):
+    """
+    Counters and timings for each service and operation a Pill records
+    or plays back.
+
+    Time is split into resolving which response to use
+    (``path_seconds``), reading and writing storage (``io_seconds``) and
+    converting responses (``serialize_seconds`` and
+    ``deserialize_seconds``).  ``wraparounds`` counts how often playback
+    ran out of responses and started again from the first one, which
+    usually means a test makes more calls than were recorded.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._operations = {}
+
+    def add(self, service, operation, counters):
+        """
+        Add each of the ``counters`` to the totals for an operation.
+        Anything that isn't one of ``COUNTERS`` is ignored.
+        """
+        key = (service, operation)
+        with self._lock:
+            totals = self._operations.get(key)
+            if totals is None:
+                totals = self._operations[key] = dict.fromkeys(COUNTERS, 0)
+            for name, value in counters.items():
+                if name in totals:
+                    totals[name] += value
+
+    def as_dict(self):
+        """
+        Return a copy of the totals, keyed on ``(service, operation)``.
+        """
+        with self._lock:
+            return dict((key, dict(totals))
+                        for key, totals in self._operations.items())
+
+    def clear(self):
+        with self._lock:
+            self._operations = {}
@@ -0,0 +1,166 @@
+# Copyright (c) 2015-2019 Mitch Garnaat
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import io
+import os
+import mmap
+import base64
+import inspect
+
+
+def is_async_body(obj):
+    """
+    Return True if ``obj`` is a response body that has to be read with
+    ``await``, such as an aiobotocore StreamingBody.
+    """
+    return inspect.iscoroutinefunction(getattr(type(obj), 'read', None))
+
+
+def check_sync_body(obj):
+    """
+    Raise a TypeError if ``obj`` is a body that can't be read here.
+    """
+    if is_async_body(obj):
+        raise TypeError(
+            '{0} has to be read with await before it can be recorded, '
+            'use placebo.aio to record aiobotocore clients'.format(
+                type(obj).__name__))
+
+
+class _LazyBody(io.RawIOBase):
+    """
+    Base class for read-only, seekable response bodies that only do work
+    for the bytes that are actually read.
+    """
+
+    def __init__(self, length):
+        self._length = length
+        self._pos = 0
+
+    def __len__(self):
+        return self._length
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            pos = offset
+        elif whence == io.SEEK_CUR:
+            pos = self._pos + offset
+        elif whence == io.SEEK_END:
+            pos = self._length + offset
+        else:
+            raise ValueError('invalid whence: {0}'.format(whence))
+        if pos < 0:
+            raise ValueError('negative seek position {0}'.format(pos))
+        self._pos = pos
+        return pos
+
+    def read(self, size=-1):
+        # Like BytesIO, None reads the rest of the body, which is how a
+        # StreamingBody reads its raw stream.
+        if size is None:
+            size = -1
+        return super(_LazyBody, self).read(size)
+
+    def readinto(self, b):
+        start = self._pos
+        end = min(start + len(b), self._length)
+        if end <= start:
+            return 0
+        data = self._read_range(start, end)
+        b[:len(data)] = data
+        self._pos = end
+        return len(data)
+
+    def readall(self):
+        start = self._pos
+        if start >= self._length:
+            return b''
+        self._pos = self._length
+        return self._read_range(start, self._length)
+
+    def getvalue(self):
+        return self._read_range(0, self._length)
+
+    def _read_range(self, start, end):
+        raise NotImplementedError()
+
+
+class FileBody(_LazyBody):
+    """
+    A response body stored in a file.  The file isn't opened until the
+    body is first read, and is then memory-mapped.
+    """
+
+    def __init__(self, path, length=None):
+        if length is None:
+            length = os.path.getsize(path)
+        super(FileBody, self).__init__(length)
+        self.path = path
+        self._mmap = None
+
+    def _read_range(self, start, end):
+        # An empty file can't be memory-mapped
+        if self._length == 0:
+            return b''
+        if self._mmap is None:
+            with open(self.path, 'rb') as fp:
+                self._mmap = mmap.mmap(
+                    fp.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._mmap[start:end]
+
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        super(FileBody, self).close()
+
+    def __getstate__(self):
+        return {'path': self.path, '_length': self._length,
+                '_pos': self._pos, '_mmap': None}
+
+
+class Base64Body(_LazyBody):
+    """
+    A response body held as a base64 string.  Only the part of the
+    string covering the bytes being read is decoded.
+    """
+
+    def __init__(self, encoded):
+        if isinstance(encoded, str):
+            encoded = encoded.encode('ascii')
+        length = len(encoded) // 4 * 3
+        if encoded.endswith(b'=='):
+            length -= 2
+        elif encoded.endswith(b'='):
+            length -= 1
+        super(Base64Body, self).__init__(length)
+        self._encoded = encoded
+
+    def _read_range(self, start, end):
+        # Every 4 base64 characters decode to 3 bytes, so decode the
+        # smallest whole number of groups that covers the range.
+        first = start // 3
+        last = (end + 2) // 3
+        decoded = base64.b64decode(self._encoded[first * 4:last * 4])
+        offset = start - first * 3
+        return decoded[offset:offset + end - start]
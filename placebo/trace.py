@@ -0,0 +1,120 @@
+# Copyright (c) 2015-2019 Mitch Garnaat
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import json
+import time
+import atexit
+import logging
+import threading
+
+from placebo.shutdown import call_at_exit
+
+LOG = logging.getLogger(__name__)
+
+
+class TraceFormat:
+    """
+    Formats a trace can be written in
+    """
+    JSONL = "jsonl"
+    CHROME = "chrome"
+
+    ALLOWED = [JSONL, CHROME]
+
+
+class Tracer(object):
+    """
+    Collects a timed span for each response recorded or played back and
+    appends them to a file.
+
+    Spans are kept in memory and written in bulk, when ``buffer_size``
+    spans have been collected, on ``flush`` and at interpreter exit, so
+    writing the trace doesn't distort the timings in it.  With
+    ``TraceFormat.JSONL`` each line is a span.  ``TraceFormat.CHROME``
+    writes the JSON array form of the Chrome trace event format, which
+    can be opened in ``chrome://tracing`` or Perfetto.
+    """
+
+    def __init__(self, path, trace_format=TraceFormat.JSONL,
+                 buffer_size=10000):
+        if trace_format not in TraceFormat.ALLOWED:
+            raise ValueError(
+                'trace_format must be one of: {0}'.format(
+                    ', '.join(TraceFormat.ALLOWED)))
+        self.path = path
+        self._format = trace_format
+        self._buffer_size = buffer_size
+        self._spans = []
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        # Spans are timed with perf_counter, this converts them to
+        # wall clock time.
+        self._epoch = time.time() - time.perf_counter()
+        self._exit_hook = call_at_exit(self, 'flush')
+
+    def span(self, name, service, operation, start, end, fields=None):
+        """
+        Add a span that ran from ``start`` to ``end``, as returned by
+        ``time.perf_counter``.  ``fields`` are added to the span.
+        """
+        span = (name, service, operation, start, end,
+                threading.get_ident(), dict(fields) if fields else {})
+        with self._lock:
+            self._spans.append(span)
+            full = len(self._spans) >= self._buffer_size
+        if full:
+            self.flush()
+
+    def flush(self):
+        """
+        Append the buffered spans to the trace file.
+        """
+        with self._lock:
+            spans, self._spans = self._spans, []
+            if not spans:
+                return
+            if self._format == TraceFormat.CHROME:
+                lines = [json.dumps(self._chrome_event(*s)) + ',\n'
+                         for s in spans]
+                # The closing bracket is optional in the JSON array
+                # format, which lets later spans be appended.
+                if not os.path.exists(self.path):
+                    lines.insert(0, '[\n')
+            else:
+                lines = [json.dumps(self._event(*s)) + '\n' for s in spans]
+            with open(self.path, 'a') as fp:
+                fp.writelines(lines)
+        LOG.debug('wrote %d spans to %s', len(spans), self.path)
+
+    def close(self):
+        self.flush()
+        atexit.unregister(self._exit_hook)
+
+    def _event(self, name, service, operation, start, end, thread, fields):
+        event = {'name': name, 'service': service, 'operation': operation,
+                 'start': self._epoch + start, 'duration': end - start,
+                 'pid': self._pid, 'thread': thread}
+        event.update(fields)
+        return event
+
+    def _chrome_event(self, name, service, operation, start, end, thread,
+                      fields):
+        args = {'service': service, 'operation': operation}
+        args.update(fields)
+        return {'name': '{0} {1}.{2}'.format(name, service, operation),
+                'cat': 'placebo', 'ph': 'X',
+                'ts': (self._epoch + start) * 1000000,
+                'dur': (end - start) * 1000000,
+                'pid': self._pid, 'tid': thread, 'args': args}
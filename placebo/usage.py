@@ -0,0 +1,330 @@
+# Copyright (c) 2015-2019 Mitch Garnaat
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import sys
+import atexit
+import logging
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from placebo.index import DirectoryIndex
+from placebo.params import ParamsIndex
+from placebo.content import read_pointer
+from placebo.sidecar import SIDECAR_SUFFIX
+from placebo.serializer import Format
+from placebo.shutdown import call_at_exit
+from placebo.snapshot import get_snapshot_path
+
+LOG = logging.getLogger(__name__)
+
+USAGE_NAME = 'placebo.usage'
+
+
+def get_usage_path(data_path):
+    return os.path.join(data_path, USAGE_NAME)
+
+
+class UsageTracker(object):
+    """
+    Records which responses in a data directory are played back.
+
+    Each response is recorded once, as a line of ``base_name<TAB>index``
+    appended to ``placebo.usage`` in the data directory when ``flush``
+    is called, which also happens at interpreter exit.  Several processes
+    can track usage of the same data directory.
+    """
+
+    def __init__(self, data_path):
+        self.path = get_usage_path(data_path)
+        self._lock = threading.Lock()
+        self._seen = set()
+        self._pending = []
+        self._exit_hook = call_at_exit(self, 'flush')
+
+    def add(self, base_name, index):
+        key = (base_name, index)
+        if key in self._seen:
+            return
+        with self._lock:
+            if key not in self._seen:
+                self._seen.add(key)
+                self._pending.append(key)
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, []
+            if pending:
+                with open(self.path, 'a') as fp:
+                    fp.write(''.join('{0}\t{1}\n'.format(*key)
+                                     for key in pending))
+
+    def close(self):
+        self.flush()
+        atexit.unregister(self._exit_hook)
+
+
+def load_usage(data_path):
+    """
+    Return the set of ``(base_name, index)`` keys of the responses that
+    have been played back from a data directory, or None if usage was
+    never tracked for it.
+    """
+    used = set()
+    try:
+        with open(get_usage_path(data_path), 'r') as fp:
+            for line in fp:
+                fields = line.rstrip('\n').split('\t')
+                if len(fields) == 2:
+                    used.add((fields[0], int(fields[1])))
+    except FileNotFoundError:
+        return None
+    return used
+
+
+def _response_files(data_path):
+    """
+    Returns a dict mapping each base name to a dict mapping each index to
+    a list of the paths and formats of its files.  Unlike a
+    ``DirectoryIndex`` every file is listed, including a response kept in
+    more than one format and files claimed but never written.
+    """
+    index = DirectoryIndex(data_path)
+    files = {}
+    try:
+        with os.scandir(data_path) as it:
+            for entry in it:
+                parsed = index.parse(entry.name)
+                if parsed is not None:
+                    base_name, i, file_format = parsed
+                    files.setdefault(base_name, {}).setdefault(
+                        i, []).append((entry.path, file_format))
+    except (FileNotFoundError, NotADirectoryError):
+        pass
+    return files
+
+
+def _sidecar_files(path):
+    try:
+        return sorted(os.path.abspath(entry.path)
+                      for entry in os.scandir(path)
+                      if entry.name.endswith(SIDECAR_SUFFIX) and
+                      entry.is_file())
+    except (FileNotFoundError, NotADirectoryError):
+        return []
+
+
+def _references(reader, base_name, index, path, file_format):
+    """
+    Return the absolute paths of the sidecar files and content store
+    object a response uses, or None if it can't be read.
+    """
+    references = []
+    try:
+        if file_format == Format.REF:
+            references.append(read_pointer(path)[1])
+        response, sidecar_path = reader._read_response(
+            base_name, index, path, file_format)
+    except Exception:
+        LOG.warning('could not read response %s', path, exc_info=True)
+        return None
+    for page in response.get('pages', [response]):
+        references.extend(os.path.join(sidecar_path, name)
+                          for name in page.get('sidecars', ()))
+    return [os.path.abspath(path) for path in references]
+
+
+def prune_data_path(data_path, dry_run=False, references=None):
+    """
+    Remove the response files in a data directory that were never played
+    back and renumber the rest of each operation's responses from 1, in
+    the same order.  Sidecar files in the directory that no remaining
+    response uses are removed too.  Returns a tuple of the number of
+    responses removed and kept and of sidecar files removed, or None if
+    usage was never tracked for the directory.
+
+    The sidecar files and content store objects used by the responses
+    left in the directory are added to the set ``references``, if one is
+    given, whether or not usage was tracked.  None is added if any of
+    them couldn't be read.
+    """
+    from placebo.pill import Pill
+
+    used = load_usage(data_path)
+    sidecars = _sidecar_files(data_path)
+    reader = None
+    if references is not None or (used is not None and sidecars):
+        reader = Pill()
+        reader.open(data_path)
+    kept = set()
+    complete = True
+
+    def add_references(*args):
+        nonlocal complete
+        found = _references(reader, *args)
+        if found is None:
+            complete = False
+        else:
+            kept.update(found)
+
+    mapping = {}
+    removed = 0
+    renumbered = False
+    try:
+        if reader is not None:
+            # Responses in bundles and SQLite databases are never pruned
+            for entry in reader._dir_index.entries():
+                if entry[3] in Format.CONTAINER_FORMATS:
+                    add_references(*entry)
+        for base_name, responses in _response_files(data_path).items():
+            new_index = 1
+            # Files only ever move to a lower index, which has already
+            # been removed or moved, so nothing is overwritten.
+            for i, files in sorted(responses.items()):
+                if used is not None and (base_name, i) not in used:
+                    removed += 1
+                    if not dry_run:
+                        for path, _ in files:
+                            os.remove(path)
+                    continue
+                if reader is not None:
+                    for path, file_format in files:
+                        if os.path.getsize(path):
+                            add_references(base_name, i, path, file_format)
+                if used is None:
+                    continue
+                mapping[(base_name, i)] = new_index
+                if new_index != i:
+                    renumbered = True
+                    if not dry_run:
+                        for path, file_format in files:
+                            os.rename(path, os.path.join(
+                                data_path, '{0}_{1}.{2}'.format(
+                                    base_name, new_index, file_format)))
+                new_index += 1
+    finally:
+        if reader is not None:
+            reader.stop()
+    if references is not None:
+        references.update(kept if complete else [None])
+    if used is None:
+        return None
+    unused = []
+    # A response that can't be read may use any of them
+    if complete:
+        unused = [path for path in sidecars if path not in kept]
+    if not dry_run:
+        for path in unused:
+            os.remove(path)
+    if (removed or renumbered) and not dry_run:
+        ParamsIndex(data_path).renumber(mapping)
+        with open(get_usage_path(data_path), 'w') as fp:
+            fp.write(''.join(
+                '{0}\t{1}\n'.format(base_name, new_index)
+                for (base_name, i), new_index in sorted(mapping.items())))
+        # Its responses no longer match the directory
+        try:
+            os.remove(get_snapshot_path(data_path))
+        except FileNotFoundError:
+            pass
+    LOG.debug('pruned %d responses and %d sidecar files from %s',
+              removed, len(unused), data_path)
+    return removed, len(mapping), len(unused)
+
+
+def prune_content_store(store_path, references, dry_run=False):
+    """
+    Remove the objects and sidecar files in a content store that aren't
+    in ``references``, as collected by ``prune_data_path`` from every
+    data directory that records into the store.  Returns a tuple of the
+    number of files removed and kept.  Nothing is removed if a data
+    directory couldn't be read completely.
+    """
+    if None in references:
+        LOG.warning('not pruning content store %s, some responses could '
+                    'not be read', store_path)
+        return 0, 0
+    removed = kept = 0
+    for dirpath, _, filenames in os.walk(store_path):
+        for filename in filenames:
+            # Objects and sidecar files being written
+            if filename.endswith('.tmp'):
+                continue
+            path = os.path.abspath(os.path.join(dirpath, filename))
+            if path in references:
+                kept += 1
+                continue
+            removed += 1
+            if not dry_run:
+                os.remove(path)
+    LOG.debug('pruned %d files from content store %s', removed, store_path)
+    return removed, kept
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='placebo-prune',
+        description='Remove the responses in placebo data directories that '
+                    'were never played back with usage tracking on, and '
+                    'renumber the rest.')
+    parser.add_argument('paths', nargs='+', metavar='DATA_PATH')
+    parser.add_argument('-r', '--recursive', action='store_true',
+                        help='prune every data directory below each path')
+    parser.add_argument('-n', '--dry-run', action='store_true',
+                        help='only report what would be removed')
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help='number of directories to prune at once')
+    parser.add_argument('--content-store', metavar='PATH', default=None,
+                        help='also remove the objects in this content '
+                             'store that no response uses; every data '
+                             'directory using it must be given')
+    args = parser.parse_args(argv)
+    data_paths = []
+    for path in args.paths:
+        if args.recursive:
+            data_paths.extend(
+                sorted(dirpath for dirpath, _, _ in os.walk(path)))
+        else:
+            data_paths.append(path)
+    references = None
+    if args.content_store is not None:
+        store_path = os.path.abspath(args.content_store)
+        references = set()
+        # The store holds objects, not responses
+        data_paths = [
+            data_path for data_path in data_paths
+            if os.path.commonpath([store_path, os.path.abspath(
+                data_path)]) != store_path]
+    with ThreadPoolExecutor(args.jobs) as pool:
+        results = pool.map(
+            lambda data_path: prune_data_path(data_path, args.dry_run,
+                                              references),
+            data_paths)
+        for data_path, result in zip(data_paths, results):
+            if result is not None:
+                sys.stdout.write(
+                    '{0}: removed {1} of {2} responses and {3} sidecar '
+                    'files\n'.format(data_path, result[0],
+                                      result[0] + result[1], result[2]))
+    if references is not None:
+        removed, kept = prune_content_store(store_path, references,
+                                            args.dry_run)
+        sys.stdout.write('{0}: removed {1} of {2} files\n'.format(
+            args.content_store, removed, removed + kept))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -29,6 +29,8 @@ def placebo_session(function):
     PLACEBO_MODE: set to "record" to record AWS calls and save them
     PLACEBO_PROFILE: optionally set an AWS credential profile to record with
     PLACEBO_DIR: set the directory to record to / read from
+    PLACEBO_CONTENT_STORE: optionally set a directory to store responses
+    in once each, shared by all of the tests
     """
 
     @functools.wraps(function)
@@ -53,8 +55,9 @@ def placebo_session(function):
         if not os.path.exists(record_dir):
             os.makedirs(record_dir)
 
-        pill = placebo.attach(session, data_path=record_dir,
-                              record_format=record_format)
+        pill = placebo.attach(
+            session, data_path=record_dir, record_format=record_format,
+            content_store=os.environ.get('PLACEBO_CONTENT_STORE'))
 
         if os.environ.get('PLACEBO_MODE') == 'record':
             pill.record()
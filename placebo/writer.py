@@ -0,0 +1,141 @@
+# Copyright (c) 2015-2019 Mitch Garnaat
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import atexit
+import logging
+import queue
+import threading
+from io import BytesIO
+
+from botocore.response import StreamingBody
+
+from placebo.shutdown import call_at_exit
+from placebo.streams import check_sync_body
+
+LOG = logging.getLogger(__name__)
+
+
+class Backpressure:
+    """
+    What to do when the record queue is full
+    """
+    BLOCK = "block"
+    DROP = "drop"
+
+    ALLOWED = [BLOCK, DROP]
+
+
+def check_backpressure(backpressure):
+    if backpressure not in Backpressure.ALLOWED:
+        raise ValueError(
+            'backpressure must be one of: {0}'.format(
+                ', '.join(Backpressure.ALLOWED)))
+
+
+def snapshot(obj):
+    """
+    Return a copy of a parsed response that is safe to serialize later.
+
+    Containers are copied so the caller can keep mutating the response
+    it was handed, and any StreamingBody is read into memory and
+    replaced, in both the original and the copy, by one reading from
+    that buffer.
+    """
+    if isinstance(obj, dict):
+        return {k: snapshot(v) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [snapshot(v) for v in obj]
+    if isinstance(obj, StreamingBody):
+        check_sync_body(obj)
+        body = obj.read()
+        obj._raw_stream = BytesIO(body)
+        obj._amount_read = 0
+        return StreamingBody(BytesIO(body), len(body))
+    return obj
+
+
+class BackgroundWriter(object):
+    """
+    Writes recorded responses from a bounded queue on a worker thread.
+
+    ``write`` is called on the worker thread with the arguments passed
+    to ``put``.  When the queue is full, ``put`` either blocks until
+    there is room or, with ``Backpressure.DROP``, discards the response
+    and counts it in ``dropped``.  Anything still queued is written when
+    ``flush`` or ``close`` is called, and ``close`` is run automatically
+    at interpreter exit.  If ``write`` fails, ``discard`` is called with
+    the same arguments to clean up after it.
+    """
+
+    _STOP = object()
+
+    def __init__(self, write, max_size=1000, backpressure=Backpressure.BLOCK,
+                 discard=None):
+        check_backpressure(backpressure)
+        self._write = write
+        self._discard = discard
+        self._queue = queue.Queue(max_size)
+        self._backpressure = backpressure
+        self.dropped = 0
+        self.errors = 0
+        self._thread = threading.Thread(
+            target=self._run, name='placebo-writer')
+        self._thread.daemon = True
+        self._thread.start()
+        self._exit_hook = call_at_exit(self, 'close')
+
+    def admit(self):
+        """
+        Decide whether a new response can be queued.  Returns False, and
+        counts the response as dropped, if it has to be discarded.
+        """
+        if self._backpressure == Backpressure.DROP and self._queue.full():
+            self.dropped += 1
+            LOG.warning('record queue full, dropping response')
+            return False
+        return True
+
+    def put(self, *args):
+        self._queue.put(args)
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is self._STOP:
+                    return
+                self._write(*item)
+            except Exception:
+                self.errors += 1
+                LOG.exception('failed to write recorded response')
+                if self._discard is not None:
+                    try:
+                        self._discard(*item)
+                    except Exception:
+                        LOG.exception('failed to discard recorded response')
+            finally:
+                self._queue.task_done()
+
+    def flush(self):
+        """
+        Block until every queued response has been written.
+        """
+        if self._thread.is_alive():
+            self._queue.join()
+
+    def close(self):
+        if self._thread.is_alive():
+            self._queue.put(self._STOP)
+            self._thread.join()
+        atexit.unregister(self._exit_hook)
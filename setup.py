@@ -11,8 +11,14 @@ setup(
     author='Mitch Garnaat',
     author_email='mitch@garnaat.com',
     url='https://github.com/garnaat/placebo',
-    packages=find_packages(exclude=['tests*']),
+    packages=find_packages(exclude=['tests*', 'benchmarks*']),
     package_dir={'placebo': 'placebo'},
+    entry_points={
+        'console_scripts': [
+            'placebo-compile = placebo.snapshot:main',
+            'placebo-prune = placebo.usage:main',
+        ],
+    },
     license="Apache License 2.0",
     classifiers=[
         'Development Status :: 3 - Alpha',
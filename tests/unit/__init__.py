@@ -11,3 +11,45 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+
+import shutil
+import tempfile
+import unittest
+
+import boto3
+
+try:
+    import mock
+except ImportError:
+    import unittest.mock as mock
+
+from placebo.pill import Pill
+
+regions = {'Regions': [{'RegionName': 'us-east-1'},
+                       {'RegionName': 'us-west-2'}]}
+identity = {'Account': '123456789012', 'UserId': 'AIDAEXAMPLE'}
+credentials = {'aws_access_key_id': 'AKIAEXAMPLE',
+               'aws_secret_access_key': 'secret'}
+
+
+def make_session():
+    """
+    Return a boto3 session in us-west-2 with made up credentials.
+    """
+    return boto3.Session(region_name='us-west-2', **credentials)
+
+
+class PillTestCase(unittest.TestCase):
+    """
+    Base class for tests that record to and play back from a temporary
+    data path.
+    """
+
+    def setUp(self):
+        self.data_path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.data_path)
+
+    def _pill(self, **kwargs):
+        pill = Pill(**kwargs)
+        pill.attach(mock.Mock(), self.data_path)
+        return pill
@@ -0,0 +1,236 @@
+# Copyright (c) 2015-2019 Mitch Garnaat
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+import asyncio
+import os
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from botocore.stub import Stubber
+
+try:
+    import aiobotocore
+    from aiobotocore.response import AioStreamingBody
+    from aiobotocore.session import get_session
+    from aiobotocore.stub import AioStubber
+except ImportError:
+    aiobotocore = None
+
+try:
+    import mock
+except ImportError:
+    import unittest.mock as mock
+
+import placebo.aio
+from placebo.aio import AsyncBody
+from placebo.pill import Pill
+
+from tests.unit import credentials, make_session
+
+
+def _run(coro):
+    # asyncio.run needs Python 3.7
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+
+def _tags(name):
+    return {'Tags': [{'Key': 'Name', 'Value': name,
+                      'ResourceId': 'i-0123456789abcdef0',
+                      'ResourceType': 'instance'}]}
+
+
+class _Content(object):
+
+    def __init__(self, data):
+        self._stream = BytesIO(data)
+
+    async def read(self, amt=-1):
+        return self._stream.read(amt)
+
+
+class _AsyncBody(object):
+    """
+    Stands in for an aiobotocore StreamingBody
+    """
+
+    def __init__(self, data):
+        self._content = _Content(data)
+
+    async def read(self, amt=-1):
+        return await self._content.read(amt)
+
+
+class _RawStream(object):
+    """
+    Stands in for the aiohttp response behind an aiobotocore body
+    """
+
+    url = 'https://example.com/'
+
+    def __init__(self, data):
+        self.content = _Content(data)
+
+    def close(self):
+        pass
+
+
+class TestAioPill(unittest.TestCase):
+
+    def setUp(self):
+        self.data_path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.data_path)
+        self.session = make_session()
+        self.executor = ThreadPoolExecutor(4)
+        self.addCleanup(self.executor.shutdown)
+
+    def _model(self, client):
+        return client.meta.service_model.operation_model('DescribeTags')
+
+    def test_record(self):
+        pill = placebo.aio.attach(self.session, self.data_path,
+                                  executor=self.executor)
+        pill.record()
+        ec2 = self.session.client('ec2')
+        with Stubber(ec2) as stubber:
+            for name in ['web', 'db']:
+                stubber.add_response('describe_tags', _tags(name))
+                ec2.describe_tags()
+        _run(pill.astop())
+        self.assertEqual(sorted(os.listdir(self.data_path)),
+                         ['ec2.DescribeTags_1.json',
+                          'ec2.DescribeTags_2.json'])
+
+    def test_playback_order(self):
+        pill = Pill()
+        pill.open(self.data_path)
+        names = ['web-{0}'.format(i) for i in range(8)]
+        for name in names:
+            pill.save_response('ec2', 'DescribeTags', _tags(name))
+        pill = placebo.aio.attach(self.session, self.data_path,
+                                  executor=self.executor)
+        pill.playback()
+        ec2 = self.session.client('ec2')
+        threads = set()
+        read_response = pill._read_response
+
+        def read(*args):
+            threads.add(threading.get_ident())
+            return read_response(*args)
+
+        async def play():
+            return await asyncio.gather(*[
+                pill._before_call(model=self._model(ec2), context={})
+                for _ in names])
+
+        with mock.patch.object(pill, '_read_response', side_effect=read):
+            responses = _run(play())
+        self.assertEqual([data['Tags'][0]['Value'] for _, data in responses],
+                         names)
+        self.assertNotIn(threading.get_ident(), threads)
+
+    def test_not_playing_back(self):
+        pill = placebo.aio.attach(self.session, self.data_path)
+        ec2 = self.session.client('ec2')
+        self.assertIsNone(
+            pill._before_call(model=self._model(ec2), context={}))
+
+    def test_threads_stopped(self):
+        threads = threading.active_count()
+        for _ in range(10):
+            pill = placebo.aio.AioPill()
+            pill.open(self.data_path)
+            pill.record()
+            _run(pill.astop())
+        self.assertEqual(threading.active_count(), threads)
+
+    def test_streaming_body(self):
+        content = b'x' * 4096
+        pill = placebo.aio.attach(self.session, self.data_path,
+                                  executor=self.executor)
+        pill.record()
+        s3 = self.session.client('s3')
+        model = s3.meta.service_model.operation_model('GetObject')
+        parsed = {'Body': _AsyncBody(content), 'ContentLength': 4096}
+        _run(pill._after_call(
+            model=model, http_response=mock.Mock(status_code=200),
+            parsed=parsed, context={}))
+        # The caller can still read the body
+        self.assertIsInstance(parsed['Body'], AsyncBody)
+        self.assertEqual(_run(parsed['Body'].read()), content)
+        _run(pill.astop())
+        pill.playback()
+
+        async def play():
+            _, data = await pill._before_call(model=model, context={})
+            async with data['Body'] as body:
+                return [chunk async for chunk in body.iter_chunks(1000)]
+
+        chunks = _run(play())
+        self.assertEqual(b''.join(chunks), content)
+        self.assertEqual(len(chunks), 5)
+
+
+@unittest.skipIf(aiobotocore is None, 'aiobotocore is not installed')
+class TestAiobotocore(unittest.TestCase):
+
+    def setUp(self):
+        self.data_path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.data_path)
+
+    def _client(self, session, service):
+        return session.create_client(
+            service, region_name='us-west-2', **credentials)
+
+    async def _record(self, content):
+        session = get_session()
+        pill = placebo.aio.attach(session, self.data_path)
+        pill.record()
+        async with self._client(session, 's3') as s3:
+            self.assertIn(s3, pill.clients)
+            with AioStubber(s3) as stubber:
+                for i, data in enumerate(content):
+                    stubber.add_response('get_object', {
+                        'Body': AioStreamingBody(_RawStream(data),
+                                                 len(data)),
+                        'ContentLength': len(data)})
+                    response = await s3.get_object(Bucket='b', Key='k')
+                    self.assertEqual(await response['Body'].read(), data)
+        await pill.astop()
+
+    async def _playback(self, count):
+        session = get_session()
+        pill = placebo.aio.attach(session, self.data_path)
+        pill.playback()
+        async with self._client(session, 's3') as s3:
+            responses = await asyncio.gather(*[
+                s3.get_object(Bucket='b', Key='k') for _ in range(count)])
+            bodies = [await response['Body'].read()
+                      for response in responses]
+        await pill.astop()
+        return bodies
+
+    def test_record_and_playback(self):
+        content = [b'first', b'second', b'third']
+        _run(self._record(content))
+        self.assertEqual(len(os.listdir(self.data_path)), 3)
+        # Concurrent calls are played back in the order they were made
+        self.assertEqual(_run(self._playback(3)), content)
@@ -0,0 +1,138 @@
+# Copyright (c) 2015-2019 Mitch Garnaat
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import datetime
+import unittest
+import os
+import shutil
+import tempfile
+
+import boto3
+
+try:
+    import mock
+except ImportError:
+    import unittest.mock as mock
+
+import placebo
+from placebo.bundle import Bundle, BUNDLE_NAME
+from placebo.serializer import Format, utc
+
+
+kp_result_one = {
+    "KeyPairs": [
+        {
+            "KeyName": "foo",
+            "KeyFingerprint": "ad:08:8a:b3:13:ea:6c:20:fa"
+        }
+    ]
+}
+
+kp_result_two = {
+    "KeyPairs": [
+        {
+            "KeyName": "bar",
+            "KeyFingerprint": ":27:21:b9:ce:b5:5a:a2:a3:bc"
+        }
+    ]
+}
+
+
+class TestBundle(unittest.TestCase):
+
+    def setUp(self):
+        self.data_path = tempfile.mkdtemp()
+        self.bundle = Bundle(self.data_path)
+
+    def tearDown(self):
+        self.bundle.close()
+        shutil.rmtree(self.data_path)
+
+    def test_append_and_read(self):
+        date = datetime.datetime(2015, 1, 4, 9, 1, 2, 0, tzinfo=utc)
+        self.bundle.append('iam.GetUser', 1, {'CreateDate': date})
+        self.bundle.append('iam.GetUser', 2, {'UserName': 'baz'})
+        self.assertEqual(self.bundle.read('iam.GetUser', 1),
+                         {'CreateDate': date})
+        self.assertEqual(self.bundle.read('iam.GetUser', 2),
+                         {'UserName': 'baz'})
+
+    def test_append_only(self):
+        self.bundle.append('iam.GetUser', 1, {'UserName': 'foo'})
+        with open(self.bundle.path, 'rb') as fp:
+            before = fp.read()
+        self.bundle.append('iam.GetUser', 2, {'UserName': 'bar'})
+        with open(self.bundle.path, 'rb') as fp:
+            after = fp.read()
+        self.assertTrue(after.startswith(before))
+        self.assertTrue(len(after) > len(before))
+
+    def test_load_index(self):
+        self.bundle.append('iam.GetUser', 1, {'UserName': 'foo'})
+        self.bundle.append('ec2.DescribeRegions', 1, {'Regions': []})
+        self.bundle.close()
+        bundle = Bundle(self.data_path)
+        self.assertEqual(sorted(bundle.load_index()),
+                         [('ec2.DescribeRegions', 1), ('iam.GetUser', 1)])
+        self.assertEqual(bundle.read('iam.GetUser', 1), {'UserName': 'foo'})
+        bundle.close()
+
+
+class TestBundleFormat(unittest.TestCase):
+
+    def setUp(self):
+        self.environ = {}
+        self.environ_patch = mock.patch('os.environ', self.environ)
+        self.environ_patch.start()
+        credential_path = os.path.join(os.path.dirname(__file__), 'cfg',
+                                       'aws_credentials')
+        self.environ['AWS_SHARED_CREDENTIALS_FILE'] = credential_path
+        self.data_path = tempfile.mkdtemp()
+        self.session = boto3.Session(profile_name='foobar',
+                                     region_name='us-west-2')
+        self.pill = placebo.attach(self.session, self.data_path,
+                                   record_format=Format.BUNDLE)
+
+    def tearDown(self):
+        self.pill.stop()
+        self.environ_patch.stop()
+        shutil.rmtree(self.data_path)
+
+    def test_save_and_playback(self):
+        self.pill.save_response('ec2', 'DescribeKeyPairs', kp_result_one)
+        self.pill.save_response('ec2', 'DescribeKeyPairs', kp_result_two)
+        self.assertEqual(sorted(os.listdir(self.data_path)),
+                         [BUNDLE_NAME, BUNDLE_NAME + '.idx'])
+        self.pill.playback()
+        ec2_client = self.session.client('ec2')
+        result = ec2_client.describe_key_pairs()
+        self.assertEqual(result['KeyPairs'][0]['KeyName'], 'foo')
+        result = ec2_client.describe_key_pairs()
+        self.assertEqual(result['KeyPairs'][0]['KeyName'], 'bar')
+        result = ec2_client.describe_key_pairs()
+        self.assertEqual(result['KeyPairs'][0]['KeyName'], 'foo')
+
+    def test_new_pill_reads_bundle(self):
+        self.pill.save_response('ec2', 'DescribeKeyPairs', kp_result_one)
+        self.pill.stop()
+        session = boto3.Session(profile_name='foobar',
+                                region_name='us-west-2')
+        pill = placebo.attach(session, self.data_path)
+        self.assertEqual(pill.get_next_file_path('ec2', 'DescribeKeyPairs'),
+                         (os.path.join(self.data_path, BUNDLE_NAME),
+                          Format.BUNDLE))
+        pill.playback()
+        result = session.client('ec2').describe_key_pairs()
+        self.assertEqual(result['KeyPairs'][0]['KeyName'], 'foo')
+        pill.stop()
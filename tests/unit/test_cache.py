@@ -0,0 +1,76 @@
+# Copyright (c) 2015-2019 Mitch Garnaat
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+import os
+import shutil
+import tempfile
+
+from placebo.cache import ResponseCache
+
+
+class TestResponseCache(unittest.TestCase):
+
+    def setUp(self):
+        self.data_path = tempfile.mkdtemp()
+        self.paths = []
+        for i in range(3):
+            path = os.path.join(self.data_path, 'file_{0}'.format(i))
+            with open(path, 'w') as fp:
+                fp.write(str(i))
+            self.paths.append(path)
+
+    def tearDown(self):
+        shutil.rmtree(self.data_path)
+
+    def test_copy_on_read(self):
+        cache = ResponseCache(max_entries=2)
+        cache.put(self.paths[0], {'data': {'Items': [1, 2]}})
+        first = cache.get(self.paths[0])
+        first['data']['Items'].append(3)
+        second = cache.get(self.paths[0])
+        self.assertEqual(second, {'data': {'Items': [1, 2]}})
+        self.assertEqual(cache.hits, 2)
+        self.assertEqual(cache.misses, 0)
+
+    def test_lru_eviction(self):
+        cache = ResponseCache(max_entries=2)
+        cache.put(self.paths[0], 0)
+        cache.put(self.paths[1], 1)
+        cache.get(self.paths[0])
+        cache.put(self.paths[2], 2)
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.get(self.paths[1]), None)
+        self.assertEqual(cache.get(self.paths[0]), 0)
+        self.assertEqual(cache.get(self.paths[2]), 2)
+
+    def test_byte_limit(self):
+        cache = ResponseCache(max_bytes=150)
+        cache.put(self.paths[0], 'x' * 200)
+        self.assertEqual(len(cache), 0)
+        cache.put(self.paths[0], 'x' * 40)
+        cache.put(self.paths[1], 'y' * 40)
+        cache.put(self.paths[2], 'z' * 40)
+        self.assertEqual(len(cache), 2)
+        self.assertTrue(cache.size <= 150)
+        self.assertEqual(cache.get(self.paths[0]), None)
+
+    def test_invalidate_on_change(self):
+        cache = ResponseCache(max_entries=2)
+        cache.put(self.paths[0], 0)
+        with open(self.paths[0], 'w') as fp:
+            fp.write('changed')
+        self.assertEqual(cache.get(self.paths[0]), None)
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.misses, 1)
@@ -0,0 +1,131 @@
+# Copyright (c) 2015-2019 Mitch Garnaat
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+import json
+import os
+import shutil
+import tempfile
+from io import BytesIO
+
+from botocore.response import StreamingBody
+
+try:
+    import mock
+except ImportError:
+    import unittest.mock as mock
+
+from placebo.content import ContentStore, write_pointer
+from placebo.pill import Pill
+from placebo.serializer import Format
+
+from tests.unit import identity, regions
+
+
+class TestContentStore(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.store_path = os.path.join(self.root, '.objects')
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def _pill(self, name, **kwargs):
+        data_path = os.path.join(self.root, name)
+        os.mkdir(data_path)
+        pill = Pill(content_store=self.store_path, **kwargs)
+        pill.attach(mock.Mock(), data_path)
+        return pill
+
+    def _objects(self):
+        return [name for _, _, names in os.walk(self.store_path)
+                for name in names]
+
+    def test_dedup(self):
+        one = self._pill('TestOne.test_one')
+        two = self._pill('TestTwo.test_two', cache_size=10)
+        for pill in (one, two):
+            pill.save_response('ec2', 'DescribeRegions', regions)
+            pill.save_response('ec2', 'DescribeRegions', regions)
+            pill.save_response('sts', 'GetCallerIdentity', identity)
+        self.assertEqual(len(self._objects()), 2)
+        self.assertEqual(sorted(os.listdir(two.data_path)),
+                         ['ec2.DescribeRegions_1.ref',
+                          'ec2.DescribeRegions_2.ref',
+                          'sts.GetCallerIdentity_1.ref'])
+        two.playback()
+        for _ in range(2):
+            _, data = two.load_response('ec2', 'DescribeRegions')
+            self.assertEqual(data, regions)
+        _, data = two.load_response('sts', 'GetCallerIdentity')
+        self.assertEqual(data, identity)
+        # Both DescribeRegions pointers share one parsed object
+        self.assertEqual(two.cache_misses, 2)
+        self.assertEqual(two.cache_hits, 1)
+
+    def test_moved_tree(self):
+        pill = self._pill('TestOne.test_one', record_format=Format.JSON_GZ)
+        pill.save_response('sts', 'GetCallerIdentity', identity)
+        moved = self.root + '.moved'
+        shutil.move(self.root, moved)
+        self.addCleanup(shutil.rmtree, moved)
+        os.mkdir(self.root)
+        pill = Pill()
+        pill.attach(mock.Mock(), os.path.join(moved, 'TestOne.test_one'))
+        pill.playback()
+        _, data = pill.load_response('sts', 'GetCallerIdentity')
+        self.assertEqual(data, identity)
+
+    def test_sidecar(self):
+        content = b'x' * 4096
+        pill = self._pill('TestOne.test_one', sidecar_threshold=1024)
+        pill.save_response('s3', 'GetObject', {
+            'Body': StreamingBody(BytesIO(content), len(content))})
+        self.assertEqual(len(self._objects()), 2)
+        pill.playback()
+        _, data = pill.load_response('s3', 'GetObject')
+        self.assertEqual(data['Body'].read(), content)
+
+    def test_container_format(self):
+        self.assertRaises(ValueError, Pill, record_format=Format.BUNDLE,
+                          content_store=self.store_path)
+
+    def test_failed_pointer(self):
+        pill = self._pill('TestOne.test_one')
+        pill.save_response('sts', 'GetCallerIdentity', identity)
+        path = os.path.join(pill.data_path, 'sts.GetCallerIdentity_1.ref')
+        with open(path) as fp:
+            pointer = fp.read()
+        with mock.patch('json.dump', side_effect=IOError('disk full')):
+            self.assertRaises(IOError, write_pointer, path,
+                              ContentStore(self.store_path), 'xx/xx.json')
+        with open(path) as fp:
+            self.assertEqual(fp.read(), pointer)
+        self.assertEqual(os.listdir(pill.data_path),
+                         ['sts.GetCallerIdentity_1.ref'])
+
+    def test_dedup_compressed(self):
+        pill = self._pill('TestOne.test_one', record_format=Format.JSON_GZ)
+        for now in (1000000000, 1000000001):
+            with mock.patch('time.time', return_value=now):
+                pill.save_response('sts', 'GetCallerIdentity', identity)
+        self.assertEqual(len(self._objects()), 1)
+
+    def test_failed_put(self):
+        store = ContentStore(self.store_path)
+        with mock.patch('os.replace', side_effect=IOError('disk full')):
+            self.assertRaises(IOError, store.put, json.dump, 'w', 'json',
+                              identity)
+        self.assertEqual(self._objects(), [])
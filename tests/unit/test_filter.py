@@ -0,0 +1,53 @@
+# Copyright (c) 2015-2019 Mitch Garnaat
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+
+from placebo.filter import OperationFilter
+
+
+class TestOperationFilter(unittest.TestCase):
+
+    def test_match_all(self):
+        f = OperationFilter()
+        self.assertFalse(f.matches('ec2', 'DescribeRegions'))
+        self.assertEqual(f.add(), [('*', '*')])
+        self.assertTrue(f.matches('ec2', 'DescribeRegions'))
+
+    def test_exact(self):
+        f = OperationFilter()
+        self.assertEqual(f.add('ec2, iam', 'ListUsers'),
+                         [('ec2', 'ListUsers'), ('iam', 'ListUsers')])
+        self.assertTrue(f.matches('iam', 'ListUsers'))
+        self.assertFalse(f.matches('iam', 'ListRoles'))
+        self.assertFalse(f.matches('s3', 'ListUsers'))
+
+    def test_globs(self):
+        f = OperationFilter()
+        f.add('ec2')
+        f.add('*', 'Describe*,Get?bject')
+        self.assertTrue(f.matches('ec2', 'RunInstances'))
+        self.assertTrue(f.matches('rds', 'DescribeDBInstances'))
+        self.assertTrue(f.matches('s3', 'GetObject'))
+        self.assertFalse(f.matches('s3', 'PutObject'))
+        self.assertFalse(f.matches('s3', 'GetObjects'))
+
+    def test_add_resets_matches(self):
+        f = OperationFilter()
+        f.add('ec2')
+        self.assertFalse(f.matches('iam', 'ListUsers'))
+        f.add('iam')
+        self.assertTrue(f.matches('iam', 'ListUsers'))
+        f.clear()
+        self.assertFalse(f.matches('ec2', 'RunInstances'))
@@ -0,0 +1,76 @@
+# Copyright (c) 2015-2019 Mitch Garnaat
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+import os
+import shutil
+import tempfile
+
+from placebo.index import DirectoryIndex
+
+
+class TestDirectoryIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.data_path = os.path.join(os.path.dirname(__file__), 'responses')
+        self.data_path = os.path.join(self.data_path, 'saved')
+        self.index = DirectoryIndex(self.data_path)
+        self.index.scan()
+
+    def test_scan(self):
+        self.assertEqual(len(self.index), 4)
+        self.assertEqual(self.index.formats, set(['json']))
+        self.assertEqual(
+            self.index.max_index('ec2.DescribeAddresses', 'json'), 2)
+        self.assertEqual(
+            self.index.max_index('foo.ec2.DescribeAddresses', 'json'), 1)
+        self.assertEqual(
+            self.index.max_index('ec2.DescribeAddresses', 'pickle'), 0)
+
+    def test_lookup(self):
+        path, file_format = self.index.lookup('ec2.DescribeKeyPairs', 1)
+        self.assertEqual(path, os.path.join(
+            self.data_path, 'ec2.DescribeKeyPairs_1.json'))
+        self.assertEqual(file_format, 'json')
+        self.assertEqual(self.index.lookup('ec2.DescribeKeyPairs', 2),
+                         (None, None))
+
+    def test_add(self):
+        self.assertFalse(self.index.add('README.md'))
+        self.assertTrue(self.index.add('ec2.DescribeKeyPairs_7.pickle'))
+        self.assertEqual(
+            self.index.max_index('ec2.DescribeKeyPairs', 'pickle'), 7)
+        # json is preferred over pickle for the same response
+        self.assertTrue(self.index.add('ec2.DescribeKeyPairs_1.pickle'))
+        _, file_format = self.index.lookup('ec2.DescribeKeyPairs', 1)
+        self.assertEqual(file_format, 'json')
+
+    def test_missing_directory(self):
+        index = DirectoryIndex(os.path.join(self.data_path, 'missing'))
+        index.scan()
+        self.assertEqual(len(index), 0)
+        self.assertEqual(index.files(), [])
+
+    def test_empty_file(self):
+        data_path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, data_path)
+        for name, content in [('ec2.DescribeKeyPairs_1.json', '{}'),
+                              ('ec2.DescribeKeyPairs_2.json', '')]:
+            with open(os.path.join(data_path, name), 'w') as fp:
+                fp.write(content)
+        index = DirectoryIndex(data_path)
+        index.scan()
+        # Only names are looked at, so a claimed file keeps its index
+        self.assertEqual(len(index), 2)
+        self.assertEqual(index.max_index('ec2.DescribeKeyPairs', 'json'), 2)
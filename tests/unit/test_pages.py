@@ -0,0 +1,131 @@
+# Copyright (c) 2015-2019 Mitch Garnaat
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+import json
+import os
+import shutil
+import tempfile
+
+from botocore.stub import Stubber
+
+from placebo.pill import Pill
+
+from tests.unit import make_session
+
+
+def _page(names, token=None):
+    page = {'Tags': [{'Key': 'Name', 'Value': name,
+                      'ResourceId': 'i-0123456789abcdef0',
+                      'ResourceType': 'instance'} for name in names]}
+    if token is not None:
+        page['NextToken'] = token
+    return page
+
+
+PAGES = [_page(['web', 'db'], 'one'), _page(['cache'], 'two'),
+         _page(['queue'])]
+
+
+class TestPageStreams(unittest.TestCase):
+
+    def setUp(self):
+        self.data_path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.data_path)
+
+    def _record(self, pages=PAGES, **kwargs):
+        session = make_session()
+        pill = Pill(page_streams=True, **kwargs)
+        pill.attach(session, self.data_path)
+        pill.record()
+        ec2 = session.client('ec2')
+        with Stubber(ec2) as stubber:
+            for page in pages:
+                stubber.add_response('describe_tags', page)
+            for _ in ec2.get_paginator('describe_tags').paginate():
+                pass
+        pill.stop()
+
+    def _playback(self, **kwargs):
+        session = make_session()
+        pill = Pill(**kwargs)
+        pill.attach(session, self.data_path)
+        pill.playback()
+        return session.client('ec2')
+
+    def _names(self, pages):
+        return [[tag['Value'] for tag in page['Tags']] for page in pages]
+
+    def test_one_response_per_run(self):
+        self._record()
+        self.assertEqual(os.listdir(self.data_path),
+                         ['ec2.DescribeTags_1.json'])
+        path = os.path.join(self.data_path, 'ec2.DescribeTags_1.json')
+        with open(path) as fp:
+            response = json.load(fp)
+        self.assertEqual([page['token'] for page in response['pages']],
+                         [None, ['one'], ['two']])
+        ec2 = self._playback(page_streams=True)
+        paginator = ec2.get_paginator('describe_tags')
+        for _ in range(2):
+            self.assertEqual(self._names(paginator.paginate()),
+                             [['web', 'db'], ['cache'], ['queue']])
+
+    def test_start_over(self):
+        self._record()
+        ec2 = self._playback(page_streams=True)
+        paginator = ec2.get_paginator('describe_tags')
+        self.assertEqual(self._names([next(iter(paginator.paginate()))]),
+                         [['web', 'db']])
+        # A new request for the first page starts the run again
+        self.assertEqual(self._names(paginator.paginate()),
+                         [['web', 'db'], ['cache'], ['queue']])
+
+    def test_without_page_streams(self):
+        self._record()
+        ec2 = self._playback()
+        paginator = ec2.get_paginator('describe_tags')
+        self.assertEqual(self._names(paginator.paginate()),
+                         [['web', 'db'], ['cache'], ['queue']])
+
+    def test_single_page(self):
+        self._record(pages=[_page(['web'])])
+        path = os.path.join(self.data_path, 'ec2.DescribeTags_1.json')
+        with open(path) as fp:
+            response = json.load(fp)
+        self.assertNotIn('pages', response)
+        self.assertNotIn('token', response)
+
+    def test_unfinished_run(self):
+        session = make_session()
+        pill = Pill(page_streams=True)
+        pill.attach(session, self.data_path)
+        pill.record()
+        ec2 = session.client('ec2')
+        with Stubber(ec2) as stubber:
+            stubber.add_response('describe_tags', PAGES[0])
+            next(iter(ec2.get_paginator('describe_tags').paginate()))
+        self.assertEqual(os.listdir(self.data_path), [])
+        pill.stop()
+        ec2 = self._playback(page_streams=True)
+        response = ec2.describe_tags()
+        self.assertEqual(self._names([response]), [['web', 'db']])
+        self.assertEqual(response['NextToken'], 'one')
+
+    def test_async_shapes(self):
+        self._record(record_format='json-shape', async_record=True)
+        ec2 = self._playback(page_streams=True, record_format='json-shape')
+        self.assertEqual(
+            self._names(ec2.get_paginator('describe_tags').paginate()),
+            [['web', 'db'], ['cache'], ['queue']])
@@ -0,0 +1,145 @@
+# Copyright (c) 2015-2019 Mitch Garnaat
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+import datetime
+import os
+import shutil
+import tempfile
+import threading
+
+from botocore.stub import Stubber
+
+from placebo.pill import Pill
+from placebo.params import PARAMS_INDEX_NAME, ParamsIndex, params_hash
+
+from tests.unit import make_session
+
+
+def _tags(name):
+    return {'Tags': [{'Key': 'Name', 'Value': name,
+                      'ResourceId': 'i-0123456789abcdef0',
+                      'ResourceType': 'instance'}]}
+
+
+class TestParamsHash(unittest.TestCase):
+
+    def test_key_order(self):
+        self.assertEqual(params_hash({'a': 1, 'b': [1, 2]}),
+                         params_hash({'b': [1, 2], 'a': 1}))
+        self.assertNotEqual(params_hash({'a': 1, 'b': [1, 2]}),
+                            params_hash({'a': 1, 'b': [2, 1]}))
+
+    def test_other_types(self):
+        when = datetime.datetime(2019, 5, 1)
+        self.assertEqual(params_hash({'Body': b'abc', 'Time': when}),
+                         params_hash({'Time': when, 'Body': b'abc'}))
+        self.assertNotEqual(params_hash({'Body': b'abc'}),
+                            params_hash({'Body': b'abd'}))
+
+
+class TestParamsIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.data_path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.data_path)
+
+    def test_next_index(self):
+        index = ParamsIndex(self.data_path)
+        index.add('ec2.DescribeTags', 1, 'aaa')
+        index.add('ec2.DescribeTags', 2, 'bbb')
+        index.add('ec2.DescribeTags', 3, 'aaa')
+        index = ParamsIndex(self.data_path)
+        index.load()
+        self.assertEqual([index.next_index('ec2.DescribeTags', 'aaa')
+                          for _ in range(3)], [1, 3, 1])
+        self.assertEqual(index.next_index('ec2.DescribeTags', 'bbb'), 2)
+        self.assertIsNone(index.next_index('ec2.DescribeTags', 'ccc'))
+
+
+class TestMatchParams(unittest.TestCase):
+
+    def setUp(self):
+        self.data_path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.data_path)
+
+    def _filters(self, name):
+        return [{'Name': 'tag:Name', 'Values': [name]}]
+
+    def _record(self, names):
+        session = make_session()
+        pill = Pill(match_params=True)
+        pill.attach(session, self.data_path)
+        pill.record()
+        ec2 = session.client('ec2')
+        with Stubber(ec2) as stubber:
+            for name in names:
+                stubber.add_response('describe_tags', _tags(name))
+                ec2.describe_tags(Filters=self._filters(name))
+        pill.stop()
+
+    def _playback(self):
+        session = make_session()
+        pill = Pill(match_params=True)
+        pill.attach(session, self.data_path)
+        pill.playback()
+        return pill, session.client('ec2')
+
+    def _name(self, response):
+        return response['Tags'][0]['Value']
+
+    def test_any_order(self):
+        self._record(['web', 'db', 'cache'])
+        self.assertTrue(
+            os.path.exists(os.path.join(self.data_path, PARAMS_INDEX_NAME)))
+        _, ec2 = self._playback()
+        for name in ['cache', 'web', 'db', 'web']:
+            response = ec2.describe_tags(Filters=self._filters(name))
+            self.assertEqual(self._name(response), name)
+
+    def test_fallback(self):
+        self._record(['web', 'db'])
+        _, ec2 = self._playback()
+        # Unknown parameters get the responses in the order recorded
+        self.assertEqual(self._name(ec2.describe_tags()), 'web')
+        self.assertEqual(self._name(ec2.describe_tags()), 'db')
+
+    def test_concurrent(self):
+        names = ['web-{0}'.format(i) for i in range(8)]
+        self._record(names)
+        _, ec2 = self._playback()
+        results = {}
+
+        def worker(name):
+            results[name] = [
+                self._name(ec2.describe_tags(Filters=self._filters(name)))
+                for _ in range(5)]
+
+        threads = [threading.Thread(target=worker, args=(name,))
+                   for name in reversed(names)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(results, dict((n, [n] * 5) for n in names))
+
+    def test_disabled(self):
+        self._record(['web', 'db'])
+        session = make_session()
+        pill = Pill()
+        pill.attach(session, self.data_path)
+        pill.playback()
+        ec2 = session.client('ec2')
+        response = ec2.describe_tags(Filters=self._filters('db'))
+        self.assertEqual(self._name(response), 'web')
@@ -13,9 +13,11 @@
 # limitations under the License.
 
 import unittest
+import gc
 import os
 
 import boto3
+from botocore.stub import Stubber
 
 try:
     import mock
@@ -78,3 +80,57 @@ class TestPill(unittest.TestCase):
         new_ec2 = session.client('ec2')
         self.assertEqual(len(self.pill.clients), 2)
         self.assertFalse(new_ec2 in self.pill.clients)
+
+    def test_clients_released(self):
+        ec2 = self.session.client('ec2')
+        self.session.client('iam')
+        gc.collect()
+        self.assertEqual(list(self.pill.clients), [ec2])
+
+    def test_shim_class_reused(self):
+        base_classes = []
+        self.pill._create_client({}, base_classes)
+        self.pill._create_client({}, base_classes)
+        self.assertIs(base_classes[0], base_classes[1])
+
+    def test_two_pills(self):
+        other = placebo.attach(self.session, self.data_path)
+        ec2 = self.session.client('ec2')
+        self.assertIn(ec2, self.pill.clients)
+        self.assertIn(ec2, other.clients)
+
+    def test_record_filter(self):
+        ec2 = self.session.client('ec2')
+        iam = self.session.client('iam')
+        self.pill.record('ec2', 'Describe*')
+        with mock.patch.object(self.pill, '_record_data') as record_data:
+            with Stubber(ec2) as stubber:
+                stubber.add_response('describe_regions', {'Regions': []})
+                stubber.add_response('describe_key_pairs', {'KeyPairs': []})
+                stubber.add_response('create_key_pair', {'KeyName': 'foo'})
+                ec2.describe_regions()
+                ec2.describe_key_pairs()
+                ec2.create_key_pair(KeyName='foo')
+            with Stubber(iam) as stubber:
+                stubber.add_response('list_users', {'Users': []})
+                iam.list_users()
+            self.assertEqual(
+                [c[1]['model'].name for c in record_data.call_args_list],
+                ['DescribeRegions', 'DescribeKeyPairs'])
+            self.pill.stop()
+            with Stubber(ec2) as stubber:
+                stubber.add_response('describe_regions', {'Regions': []})
+                ec2.describe_regions()
+            self.assertEqual(record_data.call_count, 2)
+
+    def test_switch_modes(self):
+        clients = [self.session.client('ec2') for _ in range(3)]
+        with mock.patch.object(self.session.events, 'register') as register:
+            for client in clients:
+                mock.patch.object(client.meta.events, 'register',
+                                  register).start()
+            self.pill.record()
+            self.pill.playback()
+            self.pill.stop()
+            mock.patch.stopall()
+            self.assertFalse(register.called)
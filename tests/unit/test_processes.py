@@ -0,0 +1,67 @@
+# Copyright (c) 2015-2019 Mitch Garnaat
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+import os
+import shutil
+import tempfile
+import multiprocessing
+
+try:
+    import mock
+except ImportError:
+    import unittest.mock as mock
+
+from placebo.pill import Pill
+
+PROCESSES = 4
+CALLS = 25
+
+
+def record(data_path, worker):
+    pill = Pill()
+    pill.attach(mock.Mock(), data_path)
+    for i in range(CALLS):
+        pill.save_response('ec2', 'DescribeRegions', {'id': [worker, i]})
+
+
+class TestMultiProcess(unittest.TestCase):
+
+    def setUp(self):
+        self.data_path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.data_path)
+
+    def test_record(self):
+        processes = [
+            multiprocessing.Process(target=record,
+                                    args=(self.data_path, worker))
+            for worker in range(PROCESSES)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+            self.assertEqual(process.exitcode, 0)
+        expected = ['ec2.DescribeRegions_{0}.json'.format(i)
+                    for i in range(1, PROCESSES * CALLS + 1)]
+        self.assertEqual(sorted(os.listdir(self.data_path)),
+                         sorted(expected))
+        pill = Pill()
+        pill.attach(mock.Mock(), self.data_path)
+        ids = set()
+        for _ in range(PROCESSES * CALLS):
+            _, data = pill.load_response('ec2', 'DescribeRegions')
+            ids.add(tuple(data['id']))
+        self.assertEqual(len(ids), PROCESSES * CALLS)
@@ -89,6 +89,35 @@ class TestPlacebo(unittest.TestCase):
         result = ec2_client.describe_addresses()
         self.assertEqual(result['Addresses'][0]['PublicIp'], '192.168.0.1')
 
+    def test_failed_save(self):
+        with self.assertRaises(TypeError):
+            self.pill.save_response(
+                'ec2', 'DescribeAddresses', {'Addresses': object()})
+        self.assertEqual(os.listdir(self.data_path), [])
+        self.pill.save_response(
+            'ec2', 'DescribeAddresses', addresses_result_one)
+        self.assertEqual(os.listdir(self.data_path),
+                         ['ec2.DescribeAddresses_1.json'])
+
+    def test_claimed_file(self):
+        self.pill.save_response('ec2', 'DescribeKeyPairs', kp_result_one)
+        # Claimed by another recording that hasn't written it yet
+        open(os.path.join(
+            self.data_path, 'ec2.DescribeKeyPairs_2.json'), 'w').close()
+        self.pill.save_response('ec2', 'DescribeKeyPairs', kp_result_two)
+        open(os.path.join(
+            self.data_path, 'ec2.DescribeAddresses_1.json'), 'w').close()
+        self.pill.playback()
+        ec2_client = self.session.client('ec2')
+        result = ec2_client.describe_key_pairs()
+        self.assertEqual(result['KeyPairs'][0]['KeyName'], 'foo')
+        result = ec2_client.describe_key_pairs()
+        self.assertEqual(result['KeyPairs'][0]['KeyName'], 'bar')
+        result = ec2_client.describe_key_pairs()
+        self.assertEqual(result['KeyPairs'][0]['KeyName'], 'foo')
+        with self.assertRaises(IOError):
+            ec2_client.describe_addresses()
+
     def test_ec2_multiple_responses(self):
         self.assertEqual(len(os.listdir(self.data_path)), 0)
         self.pill.save_response(
@@ -115,3 +144,64 @@ class TestPlacebo(unittest.TestCase):
         iam_client = self.session.client('iam')
         result = ec2_client.describe_addresses()
         self.assertEqual(len(os.listdir(self.data_path)), 1)
+
+    def test_response_cache(self):
+        session = boto3.Session(profile_name='foobar',
+                                region_name='us-west-2')
+        pill = placebo.attach(session, self.data_path, cache_size=8)
+        pill.save_response('ec2', 'DescribeKeyPairs', kp_result_one)
+        pill.save_response('ec2', 'DescribeKeyPairs', kp_result_two)
+        pill.playback()
+        ec2_client = session.client('ec2')
+        result = ec2_client.describe_key_pairs()
+        result['KeyPairs'][0]['KeyName'] = 'mutated'
+        ec2_client.describe_key_pairs()
+        result = ec2_client.describe_key_pairs()
+        self.assertEqual(result['KeyPairs'][0]['KeyName'], 'foo')
+        self.assertEqual(pill.cache_misses, 2)
+        self.assertEqual(pill.cache_hits, 1)
+
+    def test_compact_json(self):
+        session = boto3.Session(profile_name='foobar',
+                                region_name='us-west-2')
+        pill = placebo.attach(session, self.data_path,
+                              record_format='json-compact')
+        pill.save_response('ec2', 'DescribeKeyPairs', kp_result_one)
+        self.assertEqual(os.listdir(self.data_path),
+                         ['ec2.DescribeKeyPairs_1.json'])
+        pill.playback()
+        result = session.client('ec2').describe_key_pairs()
+        self.assertEqual(result['KeyPairs'][0]['KeyName'], 'foo')
+
+    def test_compressed(self):
+        session = boto3.Session(profile_name='foobar',
+                                region_name='us-west-2')
+        pill = placebo.attach(session, self.data_path,
+                              record_format='json.gz', compression_level=1)
+        pill.save_response('ec2', 'DescribeKeyPairs', kp_result_one)
+        pill.save_response('ec2', 'DescribeKeyPairs', kp_result_two)
+        self.assertEqual(sorted(os.listdir(self.data_path)),
+                         ['ec2.DescribeKeyPairs_1.json.gz',
+                          'ec2.DescribeKeyPairs_2.json.gz'])
+        pill.playback()
+        ec2_client = session.client('ec2')
+        result = ec2_client.describe_key_pairs()
+        self.assertEqual(result['KeyPairs'][0]['KeyName'], 'foo')
+        result = ec2_client.describe_key_pairs()
+        self.assertEqual(result['KeyPairs'][0]['KeyName'], 'bar')
+
+    def test_compressed_reproducible(self):
+        recorded = []
+        for name, now in (('one', 1000000000), ('two', 2000000000)):
+            data_path = os.path.join(self.data_path, name)
+            os.mkdir(data_path)
+            pill = placebo.attach(self.session, data_path,
+                                  record_format='json.gz')
+            with mock.patch('time.time', return_value=now):
+                pill.save_response('ec2', 'DescribeKeyPairs', kp_result_one)
+            with open(os.path.join(data_path,
+                                   'ec2.DescribeKeyPairs_1.json.gz'),
+                      'rb') as fp:
+                recorded.append(fp.read())
+        # Recording the same response again doesn't change the file
+        self.assertEqual(recorded[0], recorded[1])
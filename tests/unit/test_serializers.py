@@ -22,8 +22,20 @@ from botocore.response import StreamingBody
 
 from placebo.serializer import serialize, deserialize, utc, Format
 from placebo.serializer import get_serializer, get_deserializer
+from placebo.serializer import register_format
 from placebo.serializer import _serialize_json, _deserialize_json
 from placebo.serializer import _serialize_pickle, _deserialize_pickle
+from placebo.serializer import _serialize_json_compact
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
 
 
 date_sample = {
@@ -97,3 +109,98 @@ class TestSerializers(unittest.TestCase):
     def test_get_deserialize_pickle(self):
         ser = get_deserializer(Format.PICKLE)
         self.assertEqual(ser, _deserialize_pickle)
+
+    def test_roundtrip_json_compact(self):
+        ser = get_serializer(Format.JSON_COMPACT)
+        deser = get_deserializer(Format.JSON_COMPACT)
+        self.assertEqual(ser, _serialize_json_compact)
+        fp = StringIO()
+        ser(date_sample, fp)
+        self.assertNotIn('\n', fp.getvalue())
+        fp.seek(0)
+        self.assertEqual(deser(fp), date_sample)
+        self.assertEqual(Format.extension(Format.JSON_COMPACT), 'json')
+
+    @unittest.skipIf(orjson is None, 'orjson is not installed')
+    def test_roundtrip_orjson(self):
+        ser = get_serializer(Format.ORJSON)
+        deser = get_deserializer(Format.ORJSON)
+        fp = BytesIO()
+        ser(date_sample, fp)
+        fp.seek(0)
+        self.assertEqual(deser(fp), date_sample)
+        # Files written with orjson can be read by the stdlib reader
+        fp = StringIO(fp.getvalue().decode('utf-8'))
+        self.assertEqual(_deserialize_json(fp), date_sample)
+
+    @unittest.skipIf(orjson is None, 'orjson is not installed')
+    def test_streaming_body_orjson(self):
+        body = {'Body': StreamingBody(BytesIO(content), len(content))}
+        fp = BytesIO()
+        get_serializer(Format.ORJSON)(body, fp)
+        fp.seek(0)
+        response = get_deserializer(Format.ORJSON)(fp)
+        self.assertEqual(response['Body'].read(), content)
+
+    @unittest.skipIf(ujson is None, 'ujson is not installed')
+    def test_roundtrip_ujson(self):
+        ser = get_serializer(Format.UJSON)
+        deser = get_deserializer(Format.UJSON)
+        fp = StringIO()
+        ser(date_sample, fp)
+        fp.seek(0)
+        self.assertEqual(deser(fp), date_sample)
+
+    def test_register_format(self):
+        def ser(obj, fp):
+            fp.write(repr(obj))
+
+        def deser(fp):
+            return eval(fp.read())
+
+        register_format('repr', ser, deser, extension='txt')
+        self.addCleanup(Format.ALLOWED.remove, 'repr')
+        self.addCleanup(Format.FILE_FORMATS.remove, 'repr')
+        self.assertIn('repr', Format.ALLOWED)
+        self.assertIn('txt', Format.extensions())
+        self.assertEqual(Format.read_mode('repr'), 'r')
+        self.assertEqual(get_serializer('repr'), ser)
+        self.assertEqual(get_deserializer('txt'), deser)
+        self.assertEqual(Format.ALLOWED[-2:],
+                         [Format.BUNDLE, Format.SQLITE])
+
+    def test_register_reserved_format(self):
+        self.assertRaises(ValueError, register_format, Format.BUNDLE,
+                          _serialize_json, _deserialize_json)
+
+    def test_roundtrip_compressed(self):
+        for name in (Format.JSON_GZ, Format.JSON_XZ, Format.JSON_BZ2,
+                     Format.PICKLE_GZ, Format.PICKLE_XZ, Format.PICKLE_BZ2):
+            self.assertEqual(Format.read_mode(name), 'rb')
+            self.assertEqual(Format.write_mode(name), 'wb')
+            fp = BytesIO()
+            get_serializer(name)(date_sample, fp)
+            fp.seek(0)
+            self.assertEqual(get_deserializer(name)(fp), date_sample)
+
+    def test_compressed_streaming_body(self):
+        body = {'Body': StreamingBody(BytesIO(content), len(content))}
+        fp = BytesIO()
+        get_serializer(Format.JSON_XZ)(body, fp)
+        fp.seek(0)
+        response = get_deserializer(Format.JSON_XZ)(fp)
+        self.assertEqual(response['Body'].read(), content)
+
+    def test_compression_level(self):
+        sample = {'Items': [{'Name': 'item-{0}'.format(i % 7)}
+                            for i in range(2000)]}
+        for level in (1, 9):
+            fp = BytesIO()
+            get_serializer(Format.JSON_BZ2, compression_level=level)(
+                sample, fp)
+            fp.seek(0)
+            self.assertEqual(get_deserializer(Format.JSON_BZ2)(fp), sample)
+        fp = BytesIO()
+        get_serializer(Format.JSON_GZ, compression_level=1)(sample, fp)
+        # The gzip header records that the fastest level was used
+        self.assertEqual(fp.getvalue()[8], 4)
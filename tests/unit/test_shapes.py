@@ -0,0 +1,134 @@
+# Copyright (c) 2015-2019 Mitch Garnaat
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+import datetime
+import json
+import os
+import shutil
+import tempfile
+from io import BytesIO
+
+import botocore.session
+from botocore.response import StreamingBody
+from botocore.stub import Stubber
+
+try:
+    import mock
+except ImportError:
+    import unittest.mock as mock
+
+from placebo.pill import Pill
+from placebo.serializer import Format, utc
+from placebo.shapes import ShapeCodec
+
+from tests.unit import make_session
+
+launched = datetime.datetime(2019, 5, 1, 12, 0, 0, 250, tzinfo=utc)
+instances = {'Reservations': [{'Instances': [
+    {'InstanceId': 'i-0123456789abcdef0', 'LaunchTime': launched,
+     'Tags': [{'Key': 'Name', 'Value': 'web'}]}]}]}
+
+
+def _model(service, operation):
+    session = botocore.session.get_session()
+    return session.get_service_model(service).operation_model(operation)
+
+
+class TestShapeCodec(unittest.TestCase):
+
+    def test_timestamps(self):
+        codec = ShapeCodec(_model('ec2', 'DescribeInstances').output_shape)
+        encoded = codec.encode(instances)
+        instance = encoded['Reservations'][0]['Instances'][0]
+        self.assertEqual(instance['LaunchTime'],
+                         '2019-05-01T12:00:00.000250+00:00')
+        # The original response is left alone
+        self.assertIs(instances['Reservations'][0]['Instances'][0][
+            'LaunchTime'], launched)
+        decoded = codec.decode(json.loads(json.dumps(encoded)))
+        self.assertEqual(decoded, instances)
+
+    def test_blobs(self):
+        codec = ShapeCodec(_model('kms', 'Decrypt').output_shape)
+        encoded = codec.encode({'Plaintext': b'secret', 'KeyId': 'k'})
+        self.assertEqual(encoded, {'Plaintext': 'c2VjcmV0', 'KeyId': 'k'})
+        self.assertEqual(codec.decode(encoded),
+                         {'Plaintext': b'secret', 'KeyId': 'k'})
+
+    def test_streaming(self):
+        codec = ShapeCodec(_model('s3', 'GetObject').output_shape)
+        body = StreamingBody(BytesIO(b'hello'), 5)
+        encoded = codec.encode({'Body': body, 'ContentLength': 5})
+        self.assertEqual(encoded['Body'], 'aGVsbG8=')
+        self.assertEqual(body.read(), b'hello')
+        self.assertEqual(codec.decode(encoded)['Body'].read(), b'hello')
+
+    def test_recursive(self):
+        codec = ShapeCodec(_model('dynamodb', 'GetItem').output_shape)
+        item = {'Item': {'a': {'M': {'b': {'L': [{'B': b'xy'}]}}}}}
+        encoded = codec.encode(item)
+        self.assertEqual(encoded['Item']['a']['M']['b']['L'][0]['B'], 'eHk=')
+        self.assertEqual(codec.decode(encoded), item)
+
+
+class TestShapeFormat(unittest.TestCase):
+
+    def setUp(self):
+        self.data_path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.data_path)
+
+    def test_client(self):
+        session = make_session()
+        pill = Pill(record_format=Format.JSON_SHAPE)
+        pill.attach(session, self.data_path)
+        pill.record()
+        ec2 = session.client('ec2')
+        with Stubber(ec2) as stubber:
+            stubber.add_response('describe_instances', instances)
+            ec2.describe_instances()
+        pill.stop()
+        path = os.path.join(self.data_path,
+                            'ec2.DescribeInstances_1.shape.json')
+        with open(path) as fp:
+            saved = json.load(fp)
+        self.assertEqual(saved['shape'], {'service': 'ec2',
+                                          'api_version': '2016-11-15',
+                                          'operation': 'DescribeInstances'})
+        self.assertEqual(
+            saved['data']['Reservations'][0]['Instances'][0]['LaunchTime'],
+            '2019-05-01T12:00:00.000250+00:00')
+        session = make_session()
+        pill = Pill()
+        pill.attach(session, self.data_path)
+        pill.playback()
+        response = session.client('ec2').describe_instances()
+        self.assertEqual(response['Reservations'], instances['Reservations'])
+
+    def test_save_response(self):
+        pill = Pill(record_format=Format.JSON_SHAPE)
+        pill.attach(mock.Mock(), self.data_path)
+        pill.save_response('ec2', 'DescribeInstances', instances)
+        pill.playback()
+        _, data = pill.load_response('ec2', 'DescribeInstances')
+        self.assertEqual(data, instances)
+
+    def test_unknown_model(self):
+        pill = Pill(record_format=Format.JSON_SHAPE)
+        pill.attach(mock.Mock(), self.data_path)
+        response = {'Created': launched}
+        pill.save_response('nosuchservice', 'Describe', response)
+        pill.playback()
+        _, data = pill.load_response('nosuchservice', 'Describe')
+        self.assertEqual(data, response)
@@ -0,0 +1,94 @@
+# Copyright (c) 2015-2019 Mitch Garnaat
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import hashlib
+import unittest
+import os
+import shutil
+import tempfile
+import tracemalloc
+from io import BytesIO
+
+from botocore.response import StreamingBody
+
+try:
+    import mock
+except ImportError:
+    import unittest.mock as mock
+
+from placebo.pill import Pill
+from placebo.sidecar import CHUNK_SIZE, SidecarBody, tee_body
+from placebo.streams import FileBody
+
+content = os.urandom(256) * 1024 * 16
+
+
+class TestSidecar(unittest.TestCase):
+
+    def setUp(self):
+        self.data_path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.data_path)
+
+    def test_tee_body(self):
+        body = StreamingBody(BytesIO(content), len(content))
+        tracemalloc.start()
+        ref = tee_body(body, self.data_path)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        self.assertTrue(peak < 3 * CHUNK_SIZE)
+        sha256 = hashlib.sha256(content).hexdigest()
+        self.assertEqual(ref, SidecarBody(sha256 + '.body', len(content),
+                                          sha256))
+        # The sidecar file isn't held open until the body is read
+        self.assertIsInstance(body._raw_stream, FileBody)
+        self.assertIsNone(body._raw_stream._mmap)
+        self.assertEqual(body.read(), content)
+        body.close()
+        self.assertEqual(os.listdir(self.data_path), [ref.name])
+
+    def test_record_and_playback(self):
+        pill = Pill(sidecar_threshold=1024)
+        pill.attach(mock.Mock(), self.data_path)
+        pill.save_response('s3', 'GetObject', {
+            'Body': StreamingBody(BytesIO(content), len(content)),
+            'ContentLength': len(content)})
+        pill.save_response('s3', 'GetObject', {
+            'Body': StreamingBody(BytesIO(b'small'), 5),
+            'ContentLength': 5})
+        with open(os.path.join(self.data_path,
+                               's3.GetObject_1.json')) as fp:
+            self.assertTrue(len(fp.read()) < 1024)
+        pill.playback()
+        _, data = pill.load_response('s3', 'GetObject')
+        self.assertEqual(data['Body'].read(), content)
+        _, data = pill.load_response('s3', 'GetObject')
+        self.assertEqual(data['Body'].read(), b'small')
+
+    def test_async_record(self):
+        pill = Pill(sidecar_threshold=0, async_record=True)
+        pill.attach(mock.Mock(), self.data_path)
+        pill.record()
+        model = mock.Mock()
+        model.service_model.endpoint_prefix = 's3'
+        model.name = 'GetObject'
+        body = StreamingBody(BytesIO(content), len(content))
+        pill._record_data(mock.Mock(status_code=200), {'Body': body}, model)
+        self.assertEqual(body.read(), content)
+        body.close()
+        pill.stop()
+        pill.playback()
+        _, data = pill.load_response('s3', 'GetObject')
+        self.assertEqual(data['Body'].read(), content)
@@ -0,0 +1,232 @@
+# Copyright (c) 2015-2019 Mitch Garnaat
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import pickle
+import threading
+import time
+from io import BytesIO
+
+from botocore.response import StreamingBody
+
+try:
+    import mock
+except ImportError:
+    import unittest.mock as mock
+
+from placebo.pill import Pill
+from placebo.serializer import Format
+from placebo.snapshot import SNAPSHOT_NAME, MappedSnapshot, main
+
+from tests.unit import PillTestCase, identity, regions
+
+
+class TestSnapshot(PillTestCase):
+
+    def _record(self, **kwargs):
+        pill = self._pill(**kwargs)
+        pill.save_response('ec2', 'DescribeRegions', regions)
+        pill.save_response('sts', 'GetCallerIdentity', identity, 403)
+        return pill
+
+    def test_compile(self):
+        pill = self._record()
+        self.assertEqual(pill.compile(), 2)
+        self.assertTrue(
+            os.path.exists(os.path.join(self.data_path, SNAPSHOT_NAME)))
+        pill = self._pill()
+        pill.playback()
+        self.assertEqual(len(pill._snapshot), 2)
+        with mock.patch.object(pill, '_read_response') as read:
+            _, data = pill.load_response('ec2', 'DescribeRegions')
+            self.assertEqual(data, regions)
+            # Responses are copies which can be changed freely
+            data['Regions'].pop()
+            _, data = pill.load_response('ec2', 'DescribeRegions')
+            self.assertEqual(data, regions)
+            response, data = pill.load_response('sts', 'GetCallerIdentity')
+            self.assertEqual(response.status_code, 403)
+            self.assertEqual(data, identity)
+            self.assertFalse(read.called)
+
+    def test_stale(self):
+        self._record().compile()
+        pill = self._pill()
+        pill.save_response('ec2', 'DescribeRegions', {'Regions': []})
+        pill.playback()
+        self.assertIsNone(pill._snapshot)
+        _, data = pill.load_response('ec2', 'DescribeRegions')
+        self.assertEqual(data, regions)
+        _, data = pill.load_response('ec2', 'DescribeRegions')
+        self.assertEqual(data, {'Regions': []})
+
+    def test_modified(self):
+        self._record().compile()
+        path = os.path.join(self.data_path, 'ec2.DescribeRegions_1.json')
+        snapshot = os.stat(os.path.join(self.data_path, SNAPSHOT_NAME))
+        with open(path, 'w') as fp:
+            fp.write('{"status_code": 200, "data": {"Regions": []}}')
+        os.utime(path, ns=(snapshot.st_atime_ns,
+                           snapshot.st_mtime_ns + 1000000000))
+        pill = self._pill()
+        pill.playback()
+        self.assertIsNone(pill._snapshot)
+        _, data = pill.load_response('ec2', 'DescribeRegions')
+        self.assertEqual(data, {'Regions': []})
+
+    def test_sqlite(self):
+        self._record(record_format=Format.SQLITE).compile()
+        pill = self._pill()
+        pill.playback()
+        self.assertEqual(len(pill._snapshot), 2)
+        _, data = pill.load_response('sts', 'GetCallerIdentity')
+        self.assertEqual(data, identity)
+
+    def test_sidecar(self):
+        content = b'x' * 4096
+        pill = self._pill(sidecar_threshold=1024)
+        pill.save_response('s3', 'GetObject', {
+            'Body': StreamingBody(BytesIO(content), len(content))})
+        pill.compile()
+        pill = self._pill()
+        pill.playback()
+        self.assertEqual(len(pill._snapshot), 1)
+        _, data = pill.load_response('s3', 'GetObject')
+        self.assertEqual(data['Body'].read(), content)
+
+    def test_old_version(self):
+        pill = self._record()
+        with open(os.path.join(self.data_path, SNAPSHOT_NAME), 'wb') as fp:
+            pickle.dump({'version': 1, 'entries': {}}, fp)
+        pill.playback()
+        self.assertIsNone(pill._snapshot)
+        _, data = pill.load_response('ec2', 'DescribeRegions')
+        self.assertEqual(data, regions)
+
+    def test_shared(self):
+        self._record()
+        compiled = []
+        compile = Pill.compile
+
+        def counting_compile(pill):
+            compiled.append(pill)
+            return compile(pill)
+
+        pills = [self._pill() for _ in range(8)]
+        with mock.patch.object(Pill, 'compile', counting_compile):
+            threads = [threading.Thread(target=pill.playback,
+                                        kwargs={'shared': True})
+                       for pill in pills]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        self.assertEqual(len(compiled), 1)
+        for pill in pills:
+            self.assertIsInstance(pill._snapshot, MappedSnapshot)
+            with mock.patch.object(pill, '_read_response') as read:
+                _, data = pill.load_response('ec2', 'DescribeRegions')
+                self.assertEqual(data, regions)
+                self.assertFalse(read.called)
+            pill.stop()
+
+    def test_main(self):
+        data_path = os.path.join(self.data_path, 'TestOne.test_one')
+        os.mkdir(data_path)
+        pill = Pill()
+        pill.attach(mock.Mock(), data_path)
+        pill.save_response('sts', 'GetCallerIdentity', identity)
+        os.mkdir(os.path.join(self.data_path, 'empty'))
+        with mock.patch('sys.stdout') as stdout:
+            self.assertEqual(main(['-r', self.data_path]), 0)
+        stdout.write.assert_called_once_with(
+            '{0}: 1 responses\n'.format(data_path))
+        self.assertEqual(sorted(os.listdir(data_path)),
+                         ['placebo.snapshot', 'sts.GetCallerIdentity_1.json'])
+        self.assertEqual(os.listdir(os.path.join(self.data_path, 'empty')),
+                         [])
+
+
+class TestPreload(PillTestCase):
+
+    def setUp(self):
+        super(TestPreload, self).setUp()
+        pill = self._pill()
+        for i in range(10):
+            pill.save_response('ec2', 'DescribeRegions', regions)
+        pill.save_response('sts', 'GetCallerIdentity', identity)
+
+    def test_preload(self):
+        pill = self._pill()
+        pill.playback(preload=True, preload_workers=4)
+        info = pill.preload_info
+        self.assertEqual(info['responses'], 11)
+        self.assertTrue(info['complete'])
+        self.assertGreater(info['bytes'], 0)
+        with mock.patch.object(pill, '_read_response') as read:
+            for _ in range(10):
+                _, data = pill.load_response('ec2', 'DescribeRegions')
+                self.assertEqual(data, regions)
+                data['Regions'].pop()
+            _, data = pill.load_response('sts', 'GetCallerIdentity')
+            self.assertEqual(data, identity)
+            self.assertFalse(read.called)
+        # The preloaded responses are dropped when playback stops
+        pill.stop()
+        self.assertIsNone(pill._snapshot)
+
+    def test_budget(self):
+        pill = self._pill()
+        pill.playback(preload=True)
+        budget = pill.preload_info['bytes'] // 2
+        pill.stop()
+        pill.playback(preload=True, preload_bytes=budget)
+        info = pill.preload_info
+        self.assertLessEqual(info['bytes'], budget)
+        self.assertIn(info['responses'], range(1, 11))
+        self.assertFalse(info['complete'])
+        # The rest are read when they are played back
+        for _ in range(10):
+            _, data = pill.load_response('ec2', 'DescribeRegions')
+            self.assertEqual(data, regions)
+        _, data = pill.load_response('sts', 'GetCallerIdentity')
+        self.assertEqual(data, identity)
+
+    def test_budget_reads(self):
+        pill = self._pill()
+        for i in range(100):
+            pill.save_response('ec2', 'DescribeRegions', regions)
+        read_response = pill._read_response
+
+        def slow_first(base_name, index, *args):
+            # Gives the other workers time to read ahead
+            if (base_name, index) == ('ec2.DescribeRegions', 1):
+                time.sleep(0.2)
+            return read_response(base_name, index, *args)
+
+        read = mock.Mock(side_effect=slow_first)
+        with mock.patch.object(pill, '_read_response', read):
+            pill.playback(preload=True, preload_workers=2,
+                          preload_bytes=1)
+        self.assertEqual(pill.preload_info['responses'], 0)
+        # Reading stops once the budget is spent, apart from the
+        # responses already being read ahead.
+        self.assertLessEqual(read.call_count, 2)
+
+    def test_compiled(self):
+        self._pill().compile()
+        pill = self._pill()
+        pill.playback(preload=True)
+        self.assertIsNone(pill.preload_info)
+        self.assertEqual(len(pill._snapshot), 11)
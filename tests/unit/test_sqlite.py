@@ -0,0 +1,118 @@
+# Copyright (c) 2015-2019 Mitch Garnaat
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+import os
+import shutil
+import tempfile
+
+import boto3
+
+try:
+    import mock
+except ImportError:
+    import unittest.mock as mock
+
+import placebo
+from placebo.serializer import Format
+from placebo.sqlite import SQLiteStore, DATABASE_NAME
+
+
+addresses_result_one = {
+    "Addresses": [
+        {
+            "InstanceId": "",
+            "PublicIp": "192.168.0.1",
+            "Domain": "standard"
+        }
+    ]
+}
+
+addresses_result_two = {
+    "Addresses": [
+        {
+            "InstanceId": "",
+            "PublicIp": "192.168.0.2",
+            "Domain": "standard"
+        }
+    ]
+}
+
+
+class TestSQLiteStore(unittest.TestCase):
+
+    def setUp(self):
+        self.data_path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.data_path)
+
+    def test_allocation(self):
+        store_one = SQLiteStore(self.data_path)
+        store_two = SQLiteStore(self.data_path)
+        self.assertFalse(store_one.exists())
+        self.assertEqual(store_one.keys(), [])
+        self.assertEqual(store_one.append(None, 'ec2', 'DescribeRegions',
+                                          {'Regions': []}), 1)
+        self.assertEqual(store_two.append(None, 'ec2', 'DescribeRegions',
+                                          {'Regions': [1]}), 2)
+        self.assertEqual(store_one.append('foo', 'ec2', 'DescribeRegions',
+                                          {'Regions': [2]}), 1)
+        self.assertEqual(sorted(store_two.keys()),
+                         [('ec2.DescribeRegions', 1),
+                          ('ec2.DescribeRegions', 2),
+                          ('foo.ec2.DescribeRegions', 1)])
+        self.assertEqual(store_two.read(None, 'ec2', 'DescribeRegions', 2),
+                         {'Regions': [1]})
+        self.assertRaises(IOError, store_two.read,
+                          None, 'ec2', 'DescribeRegions', 3)
+        store_one.close()
+        store_two.close()
+
+
+class TestSQLiteFormat(unittest.TestCase):
+
+    def setUp(self):
+        self.environ = {}
+        self.environ_patch = mock.patch('os.environ', self.environ)
+        self.environ_patch.start()
+        credential_path = os.path.join(os.path.dirname(__file__), 'cfg',
+                                       'aws_credentials')
+        self.environ['AWS_SHARED_CREDENTIALS_FILE'] = credential_path
+        self.data_path = tempfile.mkdtemp()
+        self.session = boto3.Session(profile_name='foobar',
+                                     region_name='us-west-2')
+        self.pill = placebo.attach(self.session, self.data_path,
+                                   record_format=Format.SQLITE)
+
+    def tearDown(self):
+        self.pill.stop()
+        self.environ_patch.stop()
+        shutil.rmtree(self.data_path)
+
+    def test_save_and_playback(self):
+        self.pill.save_response(
+            'ec2', 'DescribeAddresses', addresses_result_one)
+        self.pill.save_response(
+            'ec2', 'DescribeAddresses', addresses_result_two)
+        self.assertTrue(os.path.exists(
+            os.path.join(self.data_path, DATABASE_NAME)))
+        self.pill.playback()
+        ec2_client = self.session.client('ec2')
+        result = ec2_client.describe_addresses()
+        self.assertEqual(result['Addresses'][0]['PublicIp'], '192.168.0.1')
+        result = ec2_client.describe_addresses()
+        self.assertEqual(result['Addresses'][0]['PublicIp'], '192.168.0.2')
+        result = ec2_client.describe_addresses()
+        self.assertEqual(result['Addresses'][0]['PublicIp'], '192.168.0.1')
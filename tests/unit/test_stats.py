@@ -0,0 +1,75 @@
+# Copyright (c) 2015-2019 Mitch Garnaat
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+try:
+    import mock
+except ImportError:
+    import unittest.mock as mock
+
+from placebo.serializer import Format
+
+from tests.unit import PillTestCase, regions
+
+
+class TestStats(PillTestCase):
+
+    def test_disabled(self):
+        pill = self._pill()
+        pill.save_response('ec2', 'DescribeRegions', regions)
+        pill.playback()
+        pill.load_response('ec2', 'DescribeRegions')
+        self.assertEqual(pill.stats(), {})
+
+    def test_record_and_playback(self):
+        pill = self._pill(collect_stats=True)
+        pill.save_response('ec2', 'DescribeRegions', regions)
+        pill.save_response('ec2', 'DescribeRegions', regions)
+        pill.playback()
+        for _ in range(5):
+            pill.load_response('ec2', 'DescribeRegions')
+        stats = pill.stats()
+        self.assertEqual(list(stats), [('ec2', 'DescribeRegions')])
+        stats = stats[('ec2', 'DescribeRegions')]
+        self.assertEqual(stats['records'], 2)
+        self.assertEqual(stats['playbacks'], 5)
+        self.assertEqual(stats['bytes_read'], stats['bytes_written'] * 5 / 2)
+        self.assertGreater(stats['bytes_written'], 0)
+        # 1, 2, 1, 2, 1
+        self.assertEqual(stats['wraparounds'], 2)
+        for name in ('path_seconds', 'io_seconds', 'serialize_seconds',
+                     'deserialize_seconds'):
+            self.assertGreater(stats[name], 0)
+
+    def test_container(self):
+        pill = self._pill(collect_stats=True, record_format=Format.BUNDLE)
+        pill.save_response('ec2', 'DescribeRegions', regions)
+        pill.playback()
+        pill.load_response('ec2', 'DescribeRegions')
+        stats = pill.stats()[('ec2', 'DescribeRegions')]
+        self.assertEqual(stats['records'], 1)
+        self.assertEqual(stats['playbacks'], 1)
+        self.assertGreater(stats['io_seconds'], 0)
+
+    def test_async(self):
+        pill = self._pill(collect_stats=True, async_record=True)
+        pill.record()
+        model = mock.Mock()
+        model.service_model.endpoint_prefix = 'ec2'
+        model.name = 'DescribeRegions'
+        pill._record_data(mock.Mock(status_code=200), regions, model)
+        pill.flush()
+        pill.stop()
+        stats = pill.stats()[('ec2', 'DescribeRegions')]
+        self.assertEqual(stats['records'], 1)
+        self.assertGreater(stats['path_seconds'], 0)
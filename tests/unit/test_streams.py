@@ -0,0 +1,91 @@
+# Copyright (c) 2015-2019 Mitch Garnaat
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import base64
+import io
+import pickle
+import unittest
+import os
+import shutil
+import tempfile
+
+from placebo.streams import Base64Body, FileBody
+
+content = bytes(range(256)) * 40 + b'tail'
+
+
+class TestBase64Body(unittest.TestCase):
+
+    def test_lengths(self):
+        for n in range(8):
+            body = Base64Body(base64.b64encode(content[:n]).decode('ascii'))
+            self.assertEqual(len(body), n)
+            self.assertEqual(body.read(), content[:n])
+
+    def test_partial_reads(self):
+        body = Base64Body(base64.b64encode(content))
+        chunks = []
+        for size in (1, 2, 5, 7, 1000, 4096):
+            chunks.append(body.read(size))
+        chunks.append(body.read())
+        self.assertEqual(b''.join(chunks), content)
+        self.assertEqual(body.read(), b'')
+
+    def test_seek(self):
+        body = Base64Body(base64.b64encode(content))
+        body.seek(1001)
+        self.assertEqual(body.read(10), content[1001:1011])
+        body.seek(-4, io.SEEK_END)
+        self.assertEqual(body.read(), b'tail')
+        self.assertEqual(body.tell(), len(content))
+        self.assertEqual(body.getvalue(), content)
+
+
+class TestFileBody(unittest.TestCase):
+
+    def setUp(self):
+        self.data_path = tempfile.mkdtemp()
+        self.path = os.path.join(self.data_path, 'body')
+        with open(self.path, 'wb') as fp:
+            fp.write(content)
+
+    def tearDown(self):
+        shutil.rmtree(self.data_path)
+
+    def test_lazy_read(self):
+        body = FileBody(self.path, len(content))
+        self.assertEqual(body._mmap, None)
+        self.assertEqual(body.read(3), content[:3])
+        self.assertNotEqual(body._mmap, None)
+        body.seek(100)
+        self.assertEqual(body.read(), content[100:])
+        body.close()
+        self.assertEqual(body._mmap, None)
+
+    def test_pickle(self):
+        body = FileBody(self.path)
+        body.read(10)
+        copy = pickle.loads(pickle.dumps(body))
+        self.assertEqual(copy.read(5), content[10:15])
+        copy.close()
+        body.close()
+
+    def test_empty(self):
+        path = os.path.join(self.data_path, 'empty')
+        open(path, 'wb').close()
+        body = FileBody(path)
+        self.assertEqual(body.getvalue(), b'')
+        self.assertEqual(body.read(), b'')
+        self.assertEqual(body.read(10), b'')
+        body.close()
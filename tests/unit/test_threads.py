@@ -0,0 +1,92 @@
+# Copyright (c) 2015-2019 Mitch Garnaat
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+import os
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import mock
+except ImportError:
+    import unittest.mock as mock
+
+from placebo.pill import Pill
+from placebo.serializer import Format
+
+OPERATIONS = ['DescribeRegions', 'DescribeInstances', 'DescribeVolumes']
+THREADS = 16
+CALLS = 40
+
+
+class TestThreadSafety(unittest.TestCase):
+
+    def setUp(self):
+        self.data_path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.data_path)
+
+    def _stress(self, record_format):
+        pill = Pill(record_format=record_format, cache_size=16)
+        pill.attach(mock.Mock(), self.data_path)
+
+        def record(worker):
+            for i in range(CALLS):
+                operation = OPERATIONS[i % len(OPERATIONS)]
+                pill.save_response('ec2', operation, {'id': (worker, i)})
+
+        with ThreadPoolExecutor(THREADS) as executor:
+            list(executor.map(record, range(THREADS)))
+
+        pill.playback()
+        expected = {}
+        for worker in range(THREADS):
+            for i in range(CALLS):
+                operation = OPERATIONS[i % len(OPERATIONS)]
+                expected.setdefault(operation, set()).add((worker, i))
+        for operation, ids in expected.items():
+            base_name = 'ec2.{0}'.format(operation)
+            for index in range(1, len(ids) + 1):
+                self.assertNotEqual(
+                    pill._dir_index.lookup(base_name, index), (None, None))
+            self.assertEqual(
+                pill._dir_index.lookup(base_name, len(ids) + 1),
+                (None, None))
+
+        def play(operation):
+            _, data = pill.load_response('ec2', operation)
+            return operation, tuple(data['id'])
+
+        calls = [operation for operation, ids in expected.items()
+                 for _ in ids]
+        with ThreadPoolExecutor(THREADS) as executor:
+            results = list(executor.map(play, calls))
+        played = {}
+        for operation, id in results:
+            self.assertNotIn(id, played.setdefault(operation, set()))
+            played[operation].add(id)
+        self.assertEqual(played, expected)
+        pill.stop()
+
+    def test_json(self):
+        self._stress(Format.JSON)
+        self.assertEqual(len(os.listdir(self.data_path)), THREADS * CALLS)
+
+    def test_bundle(self):
+        self._stress(Format.BUNDLE)
+
+    def test_sqlite(self):
+        self._stress(Format.SQLITE)
@@ -0,0 +1,102 @@
+# Copyright (c) 2015-2019 Mitch Garnaat
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import os
+import threading
+
+try:
+    import mock
+except ImportError:
+    import unittest.mock as mock
+
+from placebo.trace import Tracer, TraceFormat
+
+from tests.unit import PillTestCase, regions
+
+
+class TestTrace(PillTestCase):
+
+    def setUp(self):
+        super(TestTrace, self).setUp()
+        self.trace_path = os.path.join(self.data_path, 'trace.out')
+        self.model = mock.Mock()
+        self.model.service_model.endpoint_prefix = 'ec2'
+        self.model.name = 'DescribeRegions'
+
+    def _pill(self, **kwargs):
+        return super(TestTrace, self)._pill(trace_path=self.trace_path,
+                                            **kwargs)
+
+    def _read_jsonl(self):
+        with open(self.trace_path) as fp:
+            return [json.loads(line) for line in fp]
+
+    def test_jsonl(self):
+        pill = self._pill()
+        pill._record_data(mock.Mock(status_code=200), regions, self.model)
+        pill.playback()
+        pill._mock_request(model=self.model)
+        # Spans are buffered until they are flushed
+        self.assertFalse(os.path.exists(self.trace_path))
+        pill.stop()
+        record, playback = self._read_jsonl()
+        path = os.path.join(self.data_path, 'ec2.DescribeRegions_1.json')
+        for span in (record, playback):
+            self.assertEqual(span['service'], 'ec2')
+            self.assertEqual(span['operation'], 'DescribeRegions')
+            self.assertEqual(span['index'], 1)
+            self.assertEqual(span['path'], path)
+            self.assertEqual(span['thread'], threading.get_ident())
+            self.assertGreaterEqual(span['duration'], span['io_seconds'])
+            self.assertGreater(span['path_seconds'], 0)
+        self.assertEqual(record['name'], 'record')
+        self.assertGreater(record['serialize_seconds'], 0)
+        self.assertEqual(playback['name'], 'playback')
+        self.assertGreater(playback['deserialize_seconds'], 0)
+        self.assertEqual(pill.stats(), {})
+
+    def test_async(self):
+        pill = self._pill(async_record=True)
+        pill.record()
+        pill._record_data(mock.Mock(status_code=200), regions, self.model)
+        pill.stop()
+        record, write = self._read_jsonl()
+        self.assertEqual(record['name'], 'record')
+        self.assertNotIn('io_seconds', record)
+        self.assertEqual(write['name'], 'write')
+        self.assertEqual(write['index'], 1)
+        self.assertGreater(write['io_seconds'], 0)
+        self.assertNotEqual(write['thread'], record['thread'])
+
+    def test_chrome(self):
+        tracer = Tracer(self.trace_path, TraceFormat.CHROME, buffer_size=2)
+        for i in range(3):
+            tracer.span('playback', 'ec2', 'DescribeRegions', i, i + 0.5,
+                        {'index': i + 1})
+        # The first two spans were written when the buffer filled up
+        with open(self.trace_path) as fp:
+            self.assertEqual(len(fp.read().splitlines()), 3)
+        tracer.close()
+        with open(self.trace_path) as fp:
+            contents = fp.read()
+        events = json.loads(contents.rstrip().rstrip(',') + ']')
+        self.assertEqual(len(events), 3)
+        self.assertEqual(events[2]['name'], 'playback ec2.DescribeRegions')
+        self.assertEqual(events[2]['ph'], 'X')
+        self.assertEqual(events[2]['dur'], 500000)
+        self.assertEqual(events[2]['args']['index'], 3)
+
+    def test_format(self):
+        self.assertRaises(ValueError, Tracer, self.trace_path, 'xml')
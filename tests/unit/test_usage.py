@@ -0,0 +1,169 @@
+# Copyright (c) 2015-2019 Mitch Garnaat
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import shutil
+import tempfile
+from io import BytesIO
+
+from botocore.response import StreamingBody
+
+try:
+    import mock
+except ImportError:
+    import unittest.mock as mock
+
+from placebo.params import PARAMS_INDEX_NAME
+from placebo.usage import (USAGE_NAME, load_usage, main,
+                           prune_content_store, prune_data_path)
+
+from tests.unit import PillTestCase
+
+
+def _regions(i):
+    return {'Regions': [{'RegionName': 'region-{0}'.format(i)}]}
+
+
+class TestUsage(PillTestCase):
+
+    def setUp(self):
+        super(TestUsage, self).setUp()
+        pill = self._pill()
+        for i in range(1, 5):
+            pill.save_response('ec2', 'DescribeRegions', _regions(i))
+        pill.save_response('sts', 'GetCallerIdentity', {'Account': '1'})
+
+    def _use(self, count):
+        pill = self._pill(track_usage=True)
+        pill.playback()
+        for _ in range(count):
+            pill.load_response('ec2', 'DescribeRegions')
+        pill.stop()
+
+    def test_track(self):
+        self.assertIsNone(load_usage(self.data_path))
+        self._use(2)
+        self._use(1)
+        self.assertEqual(load_usage(self.data_path),
+                         set([('ec2.DescribeRegions', 1),
+                              ('ec2.DescribeRegions', 2)]))
+
+    def test_prune(self):
+        with open(os.path.join(self.data_path, USAGE_NAME), 'w') as fp:
+            fp.write('ec2.DescribeRegions\t2\nec2.DescribeRegions\t4\n')
+        with open(os.path.join(self.data_path, PARAMS_INDEX_NAME),
+                  'w') as fp:
+            fp.write('ec2.DescribeRegions\t1\taaa\n'
+                     'ec2.DescribeRegions\t4\tbbb\n')
+        self._pill().compile()
+        self.assertEqual(prune_data_path(self.data_path), (3, 2, 0))
+        self.assertEqual(sorted(os.listdir(self.data_path)),
+                         ['ec2.DescribeRegions_1.json',
+                          'ec2.DescribeRegions_2.json', PARAMS_INDEX_NAME,
+                          USAGE_NAME])
+        pill = self._pill(match_params=True)
+        pill.playback()
+        for i in [2, 4]:
+            _, data = pill.load_response('ec2', 'DescribeRegions')
+            self.assertEqual(data, _regions(i))
+        self.assertEqual(pill._params.next_index('ec2.DescribeRegions',
+                                                 'bbb'), 2)
+        self.assertIsNone(pill._params.next_index('ec2.DescribeRegions',
+                                                  'aaa'))
+        # Pruning again changes nothing
+        self.assertEqual(prune_data_path(self.data_path), (0, 2, 0))
+        self.assertEqual(load_usage(self.data_path),
+                         set([('ec2.DescribeRegions', 1),
+                              ('ec2.DescribeRegions', 2)]))
+
+    def test_untracked(self):
+        self.assertIsNone(prune_data_path(self.data_path))
+        self.assertEqual(len(os.listdir(self.data_path)), 5)
+
+    def test_main(self):
+        self._use(1)
+        with mock.patch('sys.stdout') as stdout:
+            self.assertEqual(main(['-r', '-n', self.data_path]), 0)
+        stdout.write.assert_called_once_with(
+            '{0}: removed 4 of 5 responses and 0 sidecar files\n'.format(
+                self.data_path))
+        self.assertEqual(len(os.listdir(self.data_path)), 6)
+        with mock.patch('sys.stdout'):
+            main(['-j', '2', self.data_path])
+        self.assertEqual(sorted(os.listdir(self.data_path)),
+                         ['ec2.DescribeRegions_1.json', USAGE_NAME])
+
+    def test_duplicate_formats(self):
+        shutil.copy(
+            os.path.join(self.data_path, 'ec2.DescribeRegions_3.json'),
+            os.path.join(self.data_path, 'ec2.DescribeRegions_3.pickle'))
+        shutil.copy(
+            os.path.join(self.data_path, 'ec2.DescribeRegions_4.json'),
+            os.path.join(self.data_path, 'ec2.DescribeRegions_4.pickle'))
+        with open(os.path.join(self.data_path, USAGE_NAME), 'w') as fp:
+            fp.write('ec2.DescribeRegions\t4\n')
+        self.assertEqual(prune_data_path(self.data_path), (4, 1, 0))
+        self.assertEqual(sorted(os.listdir(self.data_path)),
+                         ['ec2.DescribeRegions_1.json',
+                          'ec2.DescribeRegions_1.pickle', USAGE_NAME])
+
+    def _save_bodies(self, pill, *bodies):
+        for body in bodies:
+            pill.save_response('s3', 'GetObject', {
+                'Body': StreamingBody(BytesIO(body), len(body)),
+                'ContentLength': len(body)})
+
+    def test_prune_sidecars(self):
+        self._save_bodies(self._pill(sidecar_threshold=0),
+                          b'foo', b'bar', b'foo')
+        self.assertEqual(len(os.listdir(self.data_path)), 10)
+        with open(os.path.join(self.data_path, USAGE_NAME), 'w') as fp:
+            fp.write('s3.GetObject\t2\ns3.GetObject\t3\n')
+        self.assertEqual(prune_data_path(self.data_path), (6, 2, 0))
+        with open(os.path.join(self.data_path, USAGE_NAME), 'w') as fp:
+            fp.write('s3.GetObject\t1\n')
+        self.assertEqual(prune_data_path(self.data_path, dry_run=True),
+                         (1, 1, 1))
+        self.assertEqual(prune_data_path(self.data_path), (1, 1, 1))
+        pill = self._pill()
+        pill.playback()
+        _, data = pill.load_response('s3', 'GetObject')
+        self.assertEqual(data['Body'].read(), b'bar')
+        self.assertEqual(len(os.listdir(self.data_path)), 3)
+
+    def test_prune_content_store(self):
+        store_path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, store_path)
+        pill = self._pill(sidecar_threshold=0, content_store=store_path)
+        self._save_bodies(pill, b'foo', b'bar')
+        with open(os.path.join(self.data_path, USAGE_NAME), 'w') as fp:
+            fp.write('s3.GetObject\t2\n')
+        references = set()
+        self.assertEqual(
+            prune_data_path(self.data_path, references=references),
+            (6, 1, 0))
+        self.assertEqual(prune_content_store(store_path, references),
+                         (2, 2))
+        pill = self._pill()
+        pill.playback()
+        _, data = pill.load_response('s3', 'GetObject')
+        self.assertEqual(data['Body'].read(), b'bar')
+        # Nothing is removed unless every response could be read
+        with open(os.path.join(self.data_path,
+                               's3.GetObject_1.ref'), 'w') as fp:
+            fp.write('garbage')
+        references = set()
+        prune_data_path(self.data_path, references=references)
+        self.assertEqual(prune_content_store(store_path, references),
+                         (0, 0))
@@ -0,0 +1,139 @@
+# Copyright (c) 2015-2019 Mitch Garnaat
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+import gc
+import os
+import shutil
+import tempfile
+import threading
+import weakref
+from io import BytesIO
+
+from botocore.response import StreamingBody
+
+try:
+    import mock
+except ImportError:
+    import unittest.mock as mock
+
+from placebo.pill import Pill
+from placebo.writer import Backpressure, BackgroundWriter, snapshot
+
+
+class TestBackgroundWriter(unittest.TestCase):
+
+    def test_flush(self):
+        written = []
+        writer = BackgroundWriter(written.append, max_size=2)
+        for i in range(10):
+            self.assertTrue(writer.admit())
+            writer.put(i)
+        writer.flush()
+        self.assertEqual(written, list(range(10)))
+        writer.close()
+
+    def test_drop(self):
+        started = threading.Event()
+        release = threading.Event()
+
+        def write(item):
+            started.set()
+            release.wait()
+
+        writer = BackgroundWriter(write, max_size=1,
+                                  backpressure=Backpressure.DROP)
+        writer.put(1)
+        started.wait()
+        self.assertTrue(writer.admit())
+        writer.put(2)
+        self.assertFalse(writer.admit())
+        self.assertEqual(writer.dropped, 1)
+        release.set()
+        writer.close()
+
+    def test_bad_backpressure(self):
+        self.assertRaises(ValueError, BackgroundWriter, print,
+                          backpressure='sometimes')
+
+    def test_snapshot(self):
+        body = StreamingBody(BytesIO(b'foobar'), 6)
+        parsed = {'Body': body, 'Items': [{'Name': 'foo'}]}
+        copy = snapshot(parsed)
+        parsed['Items'].append({'Name': 'bar'})
+        self.assertEqual(copy['Items'], [{'Name': 'foo'}])
+        self.assertEqual(body.read(), b'foobar')
+        self.assertEqual(copy['Body'].read(), b'foobar')
+
+
+class TestAsyncRecord(unittest.TestCase):
+
+    def setUp(self):
+        self.data_path = tempfile.mkdtemp()
+        self.pill = Pill(async_record=True)
+        self.pill.attach(mock.Mock(), self.data_path)
+
+    def tearDown(self):
+        self.pill.stop()
+        shutil.rmtree(self.data_path)
+
+    def test_stopped_pills_released(self):
+        threads = threading.active_count()
+        refs = []
+        for _ in range(20):
+            pill = Pill(async_record=True, track_usage=True,
+                        trace_path=os.path.join(self.data_path, 'trace'))
+            pill.open(self.data_path)
+            pill.record()
+            pill.stop()
+            refs.append(weakref.ref(pill))
+        del pill
+        gc.collect()
+        self.assertEqual(threading.active_count(), threads)
+        self.assertEqual([ref for ref in refs if ref() is not None], [])
+
+    def test_record_order(self):
+        self.pill.record()
+        model = mock.Mock()
+        model.service_model.endpoint_prefix = 'ec2'
+        model.name = 'DescribeKeyPairs'
+        http_response = mock.Mock(status_code=200)
+        for i in range(20):
+            self.pill._record_data(http_response, {'Count': i}, model)
+        self.pill.stop()
+        self.assertEqual(len(os.listdir(self.data_path)), 20)
+        self.pill.playback()
+        for i in range(20):
+            _, data = self.pill.load_response('ec2', 'DescribeKeyPairs')
+            self.assertEqual(data, {'Count': i})
+
+    def test_failed_write(self):
+        self.pill.record()
+        model = mock.Mock()
+        model.service_model.endpoint_prefix = 'ec2'
+        model.name = 'DescribeKeyPairs'
+        http_response = mock.Mock(status_code=200)
+        self.pill._record_data(http_response, {'Count': object()}, model)
+        self.pill._record_data(http_response, {'Count': 1}, model)
+        self.pill.flush()
+        self.assertEqual(self.pill._writer.errors, 1)
+        self.pill.stop()
+        # The file claimed for the response that failed is removed
+        self.assertEqual(os.listdir(self.data_path),
+                         ['ec2.DescribeKeyPairs_2.json'])
+        # and playback skips the gap it leaves
+        self.pill.playback()
+        for _ in range(2):
+            _, data = self.pill.load_response('ec2', 'DescribeKeyPairs')
+            self.assertEqual(data, {'Count': 1})